@@ -1,62 +1,192 @@
 from __future__ import annotations
 
 import asyncio
-from typing import AsyncGenerator
+import json
+import time
+import uuid
+from typing import Any, AsyncGenerator, AsyncIterator, Dict, Iterator, List, Literal, Mapping, Optional, Sequence, Tuple
 
-from fastapi import APIRouter, UploadFile, File, HTTPException, Query, Depends
-from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi import APIRouter, UploadFile, File, HTTPException, Query, Depends, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 
-from backend.core.deps import get_app_settings, get_memory_manager, get_rating_store
+from backend.core.deps import (
+	get_answer_cache,
+	get_app_settings,
+	get_coalescer,
+	get_corpus_registry,
+	get_heal_jobs,
+	get_ingest_queue,
+	get_memory_manager,
+	get_rating_store,
+	get_response_store,
+	get_warmup,
+)
+from backend.core.log import get_logger
 from backend.core.settings import Settings
-from backend.models import IngestResponse, QueryRequest, QueryResponse, FeedbackRequest
+from backend.models import IngestJob, QueryBatchRequest, QueryRequest, QueryResponse, FeedbackRequest
 from backend.services.memory import MemoryManager
 from backend.services.feedback import RatingStore
-from backend.services.retrieval import load_pdf_and_chunk
-import pickle
-from backend.services.rag_chain import build_query_chain, build_stream_chain
+from backend.services.cache import AnswerCache
+from backend.services.coalesce import Coalescer
+from backend.services.corpus import CorpusRegistry, CorpusGeneration
+from backend.services.batch import BatchQuery, answer_batch
+from backend.services.healing import HealJob, HealJobs, heal_events
+from backend.services.jobs import IngestJobQueue
+from backend.services.admission import Overloaded, RetrievalTimeout, get_admission_controller
+from backend.services.partitions import normalize_filters, parse_filter_params, preferred_partitions
+from backend.services.responses import ResponseRecord, ResponseStore, new_response_id
+from backend.services.metrics import STAGE_SECONDS, STREAM_DISCONNECTS, render as render_metrics, timed
 from backend.services.utils import heal_query
 
 router = APIRouter()
+log = get_logger(__name__)
+
+UPLOAD_CHUNK_BYTES = 1 << 20
+
+
+async def _generation(registry: CorpusRegistry) -> CorpusGeneration:
+	try:
+		return await asyncio.to_thread(registry.current)
+	except RuntimeError as exc:
+		raise HTTPException(status_code=400, detail=f"{exc} Please ingest at least one PDF via /ingest or UI first.")
+
+
+def _filters(raw: Optional[Mapping[str, Any]]) -> Dict[str, Tuple[str, ...]]:
+	try:
+		return normalize_filters(raw)
+	except ValueError as exc:
+		raise HTTPException(status_code=400, detail=str(exc))
+
+
+def _chain_input(query: str, history, case_type: Optional[str], filters: Mapping[str, Sequence[str]]) -> Dict[str, Any]:
+	return {"query": query, "history": history, "filters": filters or None, "prefer": preferred_partitions(query, case_type) or None}
+
+
+async def _answer(
+	query: str,
+	user_id: str,
+	history,
+	gen: CorpusGeneration,
+	settings: Settings,
+	memory: MemoryManager,
+	cache: AnswerCache,
+	coalescer: Coalescer,
+	responses: ResponseStore,
+	filters: Optional[Mapping[str, Sequence[str]]] = None,
+) -> Tuple[str, List[Dict[str, Any]], str, str]:
+	"""Returns ``(answer, sources, cache, response_id)`` where cache is ``hit``, ``miss`` or ``coalesced``."""
+	case_type = await asyncio.to_thread(memory.get_user_pref, user_id, "case_type")
+	key = cache.key(query, case_type, settings.ollama_model, gen.number, filters)
+
+	async def compute() -> Dict[str, Any]:
+		with timed("chain.query"):
+			result = await gen.query_chain.ainvoke(_chain_input(query, history, case_type, filters or {}))
+		value = {"answer": result["answer"], "sources": [h.to_source() for h in result["hits"]], "context": result["context"]}
+		await asyncio.to_thread(cache.set, key, gen.number, value)
+		return value
+
+	cached = await asyncio.to_thread(cache.get, key, gen.number)
+	if cached is not None:
+		value, cache_status = cached, "hit"
+	else:
+		value, leader = await coalescer.run(key, compute)
+		cache_status = "miss" if leader else "coalesced"
+
+	sources = value.get("sources", [])
+	response_id = new_response_id()
+	chunk_ids = [s["chunk_id"] for s in sources]
+	responses.put(ResponseRecord(response_id, query, user_id, gen.number, chunk_ids, value.get("context"), value["answer"]))
+	return value["answer"], sources, cache_status, response_id
+
+
+def _corpus_status() -> Dict[str, Any]:
+	registry = get_corpus_registry()
+	return {"generation": registry.generation, "chunks": registry.store.read_manifest()["count"]}
+
+
+def _status(warmup_state: str, corpus: Mapping[str, Any]) -> str:
+	if warmup_state in ("pending", "running"):
+		return "warming"
+	if warmup_state == "degraded":
+		return "degraded"
+	return "ok" if corpus["chunks"] else "empty"
+
+
+@router.get("/health/live")
+def health_live():
+	return {"status": "alive"}
+
+
+@router.get("/health/ready")
+def health_ready():
+	warmup = get_warmup()
+	corpus = _corpus_status()
+	body = {"ready": warmup.ready, "status": _status(warmup.state, corpus), "warmup": warmup.stats(), "corpus": corpus}
+	return JSONResponse(body, status_code=200 if warmup.ready else 503)
 
 
 @router.get("/health")
 def health(settings: Settings = Depends(get_app_settings)):
-	return {"status": "ok", "data_dir": str(settings.data_dir.resolve())}
+	from backend.services.llm import get_embedder
 
+	warmup = get_warmup()
+	corpus = _corpus_status()
+	return {
+		"status": _status(warmup.state, corpus),
+		"data_dir": str(settings.data_dir.resolve()),
+		"warmup": warmup.stats(),
+		"corpus": corpus,
+		"embedding_cache": get_embedder(settings).stats(),
+		"answer_cache": get_answer_cache().stats(),
+		"admission": get_admission_controller(settings).stats(),
+		"coalescing": get_coalescer().stats(),
+		"responses": get_response_store().stats(),
+		"heals": get_heal_jobs().stats(),
+		"memory": get_memory_manager().stats(),
+	}
 
-@router.post("/ingest", response_model=IngestResponse)
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+	return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@router.post("/ingest", response_model=IngestJob, status_code=202)
 async def ingest(
 	file: UploadFile = File(...),
 	settings: Settings = Depends(get_app_settings),
+	jobs: IngestJobQueue = Depends(get_ingest_queue),
 ):
 	if not file.filename.lower().endswith(".pdf"):
 		raise HTTPException(status_code=400, detail="Please upload a PDF.")
 
-	tmp_path = settings.data_dir / f"upload_{file.filename}"
-	with open(tmp_path, "wb") as f:
-		f.write(await file.read())
+	job_id = uuid.uuid4().hex
+	tmp_path = settings.data_dir / f"upload_{job_id[:8]}_{file.filename}"
+	with open(tmp_path, "wb") as out:
+		while chunk := await file.read(UPLOAD_CHUNK_BYTES):
+			await asyncio.to_thread(out.write, chunk)
 
-	try:
-		new_docs = load_pdf_and_chunk(str(tmp_path))
-	except Exception as exc:
-		raise HTTPException(status_code=400, detail=f"PDF parsing failed: {exc}")
+	await asyncio.to_thread(jobs.submit, file.filename, tmp_path, job_id)
+	return IngestJob(**await asyncio.to_thread(jobs.get, job_id))
 
-	bm25_pickle = settings.data_dir / "bm25_docs.pkl"
-	try:
-		if bm25_pickle.exists():
-			with open(bm25_pickle, "rb") as f:
-				existing_docs = pickle.load(f)
-		else:
-			existing_docs = []
-		combined_docs = existing_docs + new_docs
-		with open(bm25_pickle, "wb") as f:
-			pickle.dump(combined_docs, f)
-		num_docs = len(combined_docs)
-	except Exception as exc:
-		raise HTTPException(status_code=500, detail=f"Failed to update BM25 docs: {exc}")
 
-	vector_saved = True
-	return IngestResponse(chunks=len(new_docs), vectordb_saved=vector_saved, bm25_docs=num_docs)
+@router.get("/ingest/{job_id}", response_model=IngestJob)
+async def ingest_status(job_id: str, jobs: IngestJobQueue = Depends(get_ingest_queue)):
+	job = await asyncio.to_thread(jobs.get, job_id)
+	if job is None:
+		raise HTTPException(status_code=404, detail=f"Unknown ingest job {job_id}")
+	return IngestJob(**job)
+
+
+@router.post("/ingest/{job_id}/retry", response_model=IngestJob, status_code=202)
+async def ingest_retry(job_id: str, jobs: IngestJobQueue = Depends(get_ingest_queue)):
+	try:
+		job = await asyncio.to_thread(jobs.retry, job_id)
+	except ValueError as exc:
+		raise HTTPException(status_code=409, detail=str(exc))
+	if job is None:
+		raise HTTPException(status_code=404, detail=f"Unknown ingest job {job_id}")
+	return IngestJob(**job)
 
 
 @router.post("/query", response_model=QueryResponse)
@@ -64,12 +194,20 @@ async def query(
 	payload: QueryRequest,
 	settings: Settings = Depends(get_app_settings),
 	memory: MemoryManager = Depends(get_memory_manager),
+	registry: CorpusRegistry = Depends(get_corpus_registry),
+	cache: AnswerCache = Depends(get_answer_cache),
+	coalescer: Coalescer = Depends(get_coalescer),
+	responses: ResponseStore = Depends(get_response_store),
 ):
 	user_id = payload.user_id or "default_user"
-	history = memory.build_history(user_id, payload.query)
-	chain = build_query_chain(settings, settings.data_dir)
-	answer = await chain.ainvoke({"query": payload.query, "history": history})
-	return QueryResponse(answer=answer, sources=[], meta={"healed": False})
+	filters = _filters(payload.filter)
+	history = await asyncio.to_thread(memory.build_history, user_id, payload.query)
+	with timed("request.query"):
+		gen = await _generation(registry)
+		answer, sources, cache_status, response_id = await _answer(
+			payload.query, user_id, history, gen, settings, memory, cache, coalescer, responses, filters
+		)
+	return QueryResponse(answer=answer, response_id=response_id, sources=sources, meta={"healed": False, "generation": gen.number, "cache": cache_status})
 
 
 @router.post("/summary", response_model=QueryResponse)
@@ -77,54 +215,275 @@ async def summary(
 	payload: QueryRequest,
 	settings: Settings = Depends(get_app_settings),
 	memory: MemoryManager = Depends(get_memory_manager),
+	registry: CorpusRegistry = Depends(get_corpus_registry),
+	cache: AnswerCache = Depends(get_answer_cache),
+	coalescer: Coalescer = Depends(get_coalescer),
+	responses: ResponseStore = Depends(get_response_store),
 ):
 	user_id = payload.user_id or "default_user"
-	history = memory.build_history(user_id, payload.query)
-	chain = build_query_chain(settings, settings.data_dir)
-	answer = await chain.ainvoke({"query": payload.query, "history": history})
-	return QueryResponse(answer=answer, sources=[], meta={"alias": "summary", "healed": False})
+	filters = _filters(payload.filter)
+	history = await asyncio.to_thread(memory.build_history, user_id, payload.query)
+	with timed("request.summary"):
+		gen = await _generation(registry)
+		answer, sources, cache_status, response_id = await _answer(
+			payload.query, user_id, history, gen, settings, memory, cache, coalescer, responses, filters
+		)
+	return QueryResponse(answer=answer, response_id=response_id, sources=sources, meta={"alias": "summary", "healed": False, "generation": gen.number, "cache": cache_status})
+
+
+STREAM_MEDIA_TYPES = {
+	"text": "text/plain; charset=utf-8",
+	"sse": "text/event-stream",
+	"ndjson": "application/x-ndjson",
+}
+
+
+def _stream_events(chunk: Dict[str, Any], response_id: str) -> Iterator[Tuple[str, Dict[str, Any]]]:
+	"""Maps stream-chain chunks to ``(event, payload)``: ``sources`` once, then ``token`` deltas."""
+	if "hits" in chunk:
+		yield "sources", {"sources": [h.to_source() for h in chunk["hits"]], "response_id": response_id}
+	text = getattr(chunk.get("answer"), "content", "")
+	if text:
+		yield "token", {"text": text}
+
+
+def _encode_event(fmt: str, event: str, payload: Dict[str, Any]) -> bytes:
+	if fmt == "sse":
+		return f"event: {event}\ndata: {json.dumps(payload)}\n\n".encode("utf-8")
+	if fmt == "ndjson":
+		return (json.dumps({"event": event, **payload}) + "\n").encode("utf-8")
+	# Plain text keeps the original protocol: raw tokens and an inline error marker.
+	if event == "token":
+		return payload["text"].encode("utf-8")
+	if event == "error":
+		return f"\n[stream-error] {payload['error']}".encode("utf-8")
+	return b""
+
+
+class _UntilDisconnect:
+	"""Pulls chunks from ``stream`` until it ends or the client goes away.
+
+	Each wait for the next chunk races a poll of ``request.is_disconnected()``, so a
+	client that leaves during retrieval or a long prefill is noticed without waiting
+	for a write to fail. Closing the subscription lets the coalescer cancel the
+	upstream Ollama call once nobody else is listening.
+	"""
+
+	def __init__(self, request: Request, stream: AsyncIterator[Any], interval: float):
+		self.request = request
+		self.stream = stream
+		self.interval = interval
+		self.disconnected = False
+		self._watcher: Optional[asyncio.Task] = None
+		self._pending: Optional[asyncio.Future] = None
+
+	async def _watch(self) -> None:
+		while not await self.request.is_disconnected():
+			await asyncio.sleep(self.interval)
+
+	async def next(self) -> Any:
+		"""Returns the next chunk, or None at the end of the stream or on disconnect."""
+		if self.disconnected:
+			return None
+		if self._watcher is None:
+			self._watcher = asyncio.create_task(self._watch())
+		pending = self._pending = asyncio.ensure_future(anext(self.stream, None))
+		done, _ = await asyncio.wait({pending, self._watcher}, return_when=asyncio.FIRST_COMPLETED)
+		if pending in done:
+			self._pending = None
+			return pending.result()
+		pending.cancel()
+		await asyncio.gather(pending, return_exceptions=True)
+		self._pending = None
+		self.mark_disconnected()
+		return None
+
+	def mark_disconnected(self) -> None:
+		self.disconnected = True
+		STREAM_DISCONNECTS.inc()
+		log.info("query_stream.client_disconnected")
+
+	async def aclose(self) -> None:
+		if self._watcher is not None:
+			self._watcher.cancel()
+		if self._pending is not None and not self._pending.done():
+			# Cancelled mid-read (the server noticed the disconnect first): unwinding the read closes the subscription.
+			self._pending.cancel()
+			return
+		await self.stream.aclose()
 
 
 @router.get("/query_stream")
 async def query_stream(
+	request: Request,
 	query: str = Query(...),
 	user_id: str = "default_user",
+	fmt: Literal["text", "sse", "ndjson"] = Query("text", alias="format"),
+	filter_params: List[str] = Query([], alias="filter", description="Partition filter as key:value, repeatable (e.g. filter=court:delhi high court)"),
 	settings: Settings = Depends(get_app_settings),
 	memory: MemoryManager = Depends(get_memory_manager),
+	registry: CorpusRegistry = Depends(get_corpus_registry),
+	cache: AnswerCache = Depends(get_answer_cache),
+	coalescer: Coalescer = Depends(get_coalescer),
+	responses: ResponseStore = Depends(get_response_store),
 ):
+	"""Streams the answer as raw text (``format=text``) or as ``sources``, ``token``... and ``stats``
+	events over SSE (``format=sse``) or NDJSON (``format=ndjson``); failures mid-stream become an
+	``error`` event."""
+	try:
+		filters = normalize_filters(parse_filter_params(filter_params))
+	except ValueError as exc:
+		return JSONResponse({"error": str(exc)}, status_code=400)
 	try:
-		history = memory.build_history(user_id, query)
+		history = await asyncio.to_thread(memory.build_history, user_id, query)
 	except Exception as exc:
 		return JSONResponse({"error": f"Memory build failed: {exc}"}, status_code=500)
 
 	try:
-		chain = build_stream_chain(settings, settings.data_dir, history)
-		print(f"Chain built successfully: {chain}")
+		gen = await asyncio.to_thread(registry.current)
+		chain = gen.stream_chain
+		log.debug("query_stream.generation", generation=gen.number)
 	except RuntimeError as exc:
-		print(f"RuntimeError in chain build: {str(exc)}")
+		log.warning("query_stream.no_corpus", error=str(exc))
 		return JSONResponse({"error": str(exc), "hint": "Please ingest at least one PDF via /ingest or UI first."}, status_code=400)
 	except Exception as exc:
-		print(f"Exception in chain build: {str(exc)}")
+		log.exception("query_stream.chain_failed")
 		return JSONResponse({"error": f"Chain build failed: {exc}", "type": type(exc).__name__}, status_code=500)
 
+	started = time.perf_counter()
+	case_type = await asyncio.to_thread(memory.get_user_pref, user_id, "case_type")
+	key = "stream:" + cache.key(query, case_type, settings.ollama_model, gen.number, filters)
+	subscription, leader = coalescer.stream(key, lambda: chain.astream(_chain_input(query, history, case_type, filters)))
+	stream = _UntilDisconnect(request, subscription, settings.stream_disconnect_poll)
+	# Hold the response until the first token, so admission shedding and retrieval timeouts still become 429/503/504.
+	head: List[Dict[str, Any]] = []
 	try:
-		stream = chain.astream({"query": query, "history": history})
-		print("Stream initialized successfully")
+		while True:
+			chunk = await stream.next()
+			if chunk is None:
+				break
+			head.append(chunk)
+			if getattr(chunk.get("answer"), "content", ""):
+				break
+	except (Overloaded, RetrievalTimeout):
+		await stream.aclose()
+		raise
 	except Exception as exc:
-		print(f"Exception in stream init: {str(exc)}")
+		log.exception("query_stream.init_failed")
+		await stream.aclose()
 		return JSONResponse({"error": f"Stream initialization failed: {exc}", "type": type(exc).__name__}, status_code=500)
 
-	async def token_gen() -> AsyncGenerator[bytes, None]:
+	response_id = new_response_id()
+
+	async def event_gen() -> AsyncGenerator[bytes, None]:
+		first_token: Optional[float] = None
+		parts: List[str] = []
 		try:
-			async for chunk in stream:
-				text = getattr(chunk, "content", "")
-				if text:
-					yield text.encode("utf-8")
-					await asyncio.sleep(0)
+			chunk = head.pop(0) if head else await stream.next()
+			while chunk is not None:
+				if "hits" in chunk:
+					chunk_ids = [h.chunk_id for h in chunk["hits"]]
+					responses.put(ResponseRecord(response_id, query, user_id, gen.number, chunk_ids, chunk.get("context")))
+				for event, payload in _stream_events(chunk, response_id):
+					if event == "token":
+						first_token = first_token or time.perf_counter()
+						parts.append(payload["text"])
+					yield _encode_event(fmt, event, payload)
+				chunk = head.pop(0) if head else await stream.next()
+			responses.set_answer(response_id, "".join(parts))
+			if stream.disconnected:
+				return
+			tokens = len(parts)
+			now = time.perf_counter()
+			yield _encode_event(fmt, "stats", {
+				"ttft_ms": None if first_token is None else round((first_token - started) * 1000, 1),
+				"total_ms": round((now - started) * 1000, 1),
+				"tokens": tokens,
+				"tokens_per_second": round((tokens - 1) / (now - first_token), 2) if first_token and tokens > 1 and now > first_token else None,
+				"cache": "miss" if leader else "coalesced",
+				"generation": gen.number,
+				"response_id": response_id,
+			})
+		except asyncio.CancelledError:
+			stream.mark_disconnected()
+			raise
 		except Exception as exc:
-			yield f"\n[stream-error] {exc}".encode("utf-8")
+			log.warning("query_stream.failed", error=str(exc))
+			payload: Dict[str, Any] = {"error": str(exc), "type": type(exc).__name__}
+			if isinstance(exc, Overloaded):
+				payload.update(status=exc.status_code, retry_after=exc.retry_after)
+			yield _encode_event(fmt, "error", payload)
+		finally:
+			await stream.aclose()
+			STAGE_SECONDS.observe(time.perf_counter() - started, stage="request.query_stream")
+
+	headers = {"X-Response-Id": response_id}
+	if fmt == "sse":
+		headers.update({"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+	return StreamingResponse(event_gen(), media_type=STREAM_MEDIA_TYPES[fmt], headers=headers)
+
+
+@router.post("/query_batch")
+async def query_batch(
+	request: Request,
+	payload: QueryBatchRequest,
+	settings: Settings = Depends(get_app_settings),
+	memory: MemoryManager = Depends(get_memory_manager),
+	registry: CorpusRegistry = Depends(get_corpus_registry),
+	cache: AnswerCache = Depends(get_answer_cache),
+	responses: ResponseStore = Depends(get_response_store),
+):
+	"""Answers many queries in one request, streamed as NDJSON: a ``result`` event (answer, sources,
+	``response_id``) or an ``error`` event per query, in completion order, then ``stats``.
+	Results carry the query's ``index`` in the request and its ``id`` if one was given."""
+	if len(payload.queries) > settings.query_batch_max:
+		raise HTTPException(status_code=413, detail=f"At most {settings.query_batch_max} queries per batch (QUERY_BATCH_MAX)")
+	user_id = payload.user_id or "default_user"
+	base = _filters(payload.filter)
+	items = [
+		BatchQuery(i, q, base) if isinstance(q, str) else BatchQuery(i, q.query, {**base, **_filters(q.filter)}, q.id)
+		for i, q in enumerate(payload.queries)
+	]
+	# The user's stored case type applies as in /query, but batch queries do not update it.
+	case_type = await asyncio.to_thread(memory.get_user_pref, user_id, "case_type")
+	history = memory.history(case_type)
+	gen = await _generation(registry)
+	events = answer_batch(
+		gen,
+		items,
+		model=settings.ollama_model,
+		user_id=user_id,
+		case_type=case_type,
+		history=history,
+		cache=cache,
+		responses=responses,
+		batch_size=settings.query_batch_size,
+		concurrency=min(payload.concurrency or settings.query_batch_concurrency, settings.query_batch_concurrency),
+	)
+	stream = _UntilDisconnect(request, events, settings.stream_disconnect_poll)
 
-	return StreamingResponse(token_gen(), headers={"Content-Type": "text/plain; charset=utf-8"})
+	async def event_gen() -> AsyncGenerator[bytes, None]:
+		try:
+			with timed("request.query_batch"):
+				item = await stream.next()
+				while item is not None:
+					yield _encode_event("ndjson", *item)
+					item = await stream.next()
+		except asyncio.CancelledError:
+			stream.mark_disconnected()
+			raise
+		finally:
+			await stream.aclose()
+
+	return StreamingResponse(event_gen(), media_type=STREAM_MEDIA_TYPES["ndjson"])
+
+
+@router.get("/partitions")
+async def partitions(registry: CorpusRegistry = Depends(get_corpus_registry)):
+	"""Filterable partition values with their chunk counts, by key."""
+	gen = await _generation(registry)
+	index = gen.retriever.partitions
+	return index.values() if index is not None else {}
 
 
 @router.post("/feedback")
@@ -133,17 +492,74 @@ async def feedback(
 	settings: Settings = Depends(get_app_settings),
 	memory: MemoryManager = Depends(get_memory_manager),
 	ratings: RatingStore = Depends(get_rating_store),
+	registry: CorpusRegistry = Depends(get_corpus_registry),
+	responses: ResponseStore = Depends(get_response_store),
+	heals: HealJobs = Depends(get_heal_jobs),
 ):
+	"""A rating below 3 starts a background heal and answers 202 with its id; poll
+	``/feedback/heal/{id}`` or follow ``/feedback/heal/{id}/stream`` for the result."""
 	case_key = "default"
 	ratings.record(case_key, payload.rating)
 
 	if payload.rating < 3:
-		healed_q = heal_query(payload.query)
-		history = memory.build_history(payload.user_id or "default_user", healed_q)
-		chain = build_query_chain(settings, settings.data_dir)
-		answer = await chain.ainvoke({"query": healed_q, "history": history})
-		return JSONResponse({"healed": True, "answer": answer})
+		user_id = payload.user_id or "default_user"
+		record = responses.get(payload.response_id) if payload.response_id else None
+		healed_q = heal_query(record.query if record is not None else payload.query)
+		history = await asyncio.to_thread(memory.build_history, user_id, healed_q)
+		gen = await _generation(registry)
+		job = HealJob(healed_q, user_id, payload.response_id, mode="cached" if record is not None else "retrieved")
+		heals.start(job, heal_events(job, record, gen, history, settings, responses))
+		log.info("heal.started", heal_id=job.id, mode=job.mode, response_id=payload.response_id)
+		return JSONResponse(
+			{
+				"healed": True,
+				"heal_id": job.id,
+				"status": job.status,
+				"mode": job.mode,
+				"poll": f"/feedback/heal/{job.id}",
+				"stream": f"/feedback/heal/{job.id}/stream",
+			},
+			status_code=202,
+		)
 
 	return JSONResponse({"healed": False, "message": "Thanks for your feedback"})
 
 
+def _heal_job(heals: HealJobs, heal_id: str) -> HealJob:
+	job = heals.get(heal_id)
+	if job is None:
+		raise HTTPException(status_code=404, detail=f"Unknown heal job {heal_id}")
+	return job
+
+
+@router.get("/feedback/heal/{heal_id}")
+async def heal_status(heal_id: str, heals: HealJobs = Depends(get_heal_jobs)):
+	return _heal_job(heals, heal_id).to_dict()
+
+
+@router.get("/feedback/heal/{heal_id}/stream")
+async def heal_stream(
+	request: Request,
+	heal_id: str,
+	fmt: Literal["text", "sse", "ndjson"] = Query("ndjson", alias="format"),
+	settings: Settings = Depends(get_app_settings),
+	heals: HealJobs = Depends(get_heal_jobs),
+):
+	"""Replays the heal job's events so far (``sources``, ``token``...) and follows it to ``done`` or ``error``."""
+	job = _heal_job(heals, heal_id)
+	stream = _UntilDisconnect(request, job.broadcast.subscribe(), settings.stream_disconnect_poll)
+
+	async def event_gen() -> AsyncGenerator[bytes, None]:
+		try:
+			item = await stream.next()
+			while item is not None:
+				yield _encode_event(fmt, *item)
+				item = await stream.next()
+		except asyncio.CancelledError:
+			stream.mark_disconnected()
+			raise
+		finally:
+			await stream.aclose()
+
+	headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"} if fmt == "sse" else None
+	return StreamingResponse(event_gen(), media_type=STREAM_MEDIA_TYPES[fmt], headers=headers)
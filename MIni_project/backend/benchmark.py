@@ -0,0 +1,343 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import textwrap
+import time
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Sequence
+
+import httpx
+import numpy as np
+
+from backend.fake_ollama import create_fake_ollama, serve_in_thread
+
+
+PARTIES = [
+	"Sharma", "Union of India", "State of Maharashtra", "Mehta", "Reliance Industries", "Kapoor", "Gupta",
+	"Tata Steel", "Municipal Corporation of Delhi", "Iyer", "Bharat Petroleum", "Singh", "Rao", "Nair",
+]
+COURTS = ["Supreme Court", "Bombay High Court", "Delhi High Court", "Madras High Court", "district court", "arbitral tribunal"]
+DOCTRINES = [
+	"doctrine of frustration", "liquidated damages clause", "specific performance", "adverse possession",
+	"promissory estoppel", "res judicata", "limitation period", "indemnity obligation", "force majeure clause",
+	"implied term", "quantum meruit claim", "breach of warranty", "title to the disputed land", "easement by prescription",
+]
+VERBS = ["applied to", "did not extend to", "was enforceable against", "barred", "required proof of", "superseded"]
+OBJECTS = [
+	"the lessee", "the contractor", "the purchaser", "the mortgagee", "the trust", "the respondent's counterclaim",
+	"the sale deed", "the tender award", "the partnership deed", "the compromise decree",
+]
+ACTS = ["Indian Contract Act", "Specific Relief Act", "Transfer of Property Act", "Limitation Act", "Arbitration and Conciliation Act"]
+
+
+def _case(rng: np.random.Generator) -> str:
+	a, b = rng.choice(len(PARTIES), size=2, replace=False)
+	return f"{PARTIES[a]} v. {PARTIES[b]}"
+
+
+def _pick(rng: np.random.Generator, options: Sequence[str]) -> str:
+	return options[int(rng.integers(len(options)))]
+
+
+def synthetic_page(rng: np.random.Generator, sentences: int = 14) -> str:
+	return " ".join(
+		f"In {_case(rng)} ({int(rng.integers(1950, 2024))}) the {_pick(rng, COURTS)} held that the "
+		f"{_pick(rng, DOCTRINES)} {_pick(rng, VERBS)} {_pick(rng, OBJECTS)} under Section "
+		f"{int(rng.integers(1, 200))} of the {_pick(rng, ACTS)}."
+		for _ in range(sentences)
+	)
+
+
+def synthetic_query(rng: np.random.Generator) -> str:
+	return f"What did the {_pick(rng, COURTS)} hold about the {_pick(rng, DOCTRINES)} in {_case(rng)}?"
+
+
+def _pdf_escape(text: str) -> str:
+	return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def write_pdf(path: Path, pages: Sequence[str], line_chars: int = 95) -> None:
+	"""Write a minimal text-only PDF (Helvetica, one content stream per page) that pypdf can extract."""
+	objects: List[bytes] = [
+		b"<< /Type /Catalog /Pages 2 0 R >>",
+		f"<< /Type /Pages /Kids [{' '.join(f'{4 + 2 * i} 0 R' for i in range(len(pages)))}] /Count {len(pages)} >>".encode(),
+		b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+	]
+	for i, text in enumerate(pages):
+		lines = " ".join(f"({_pdf_escape(line)}) '" for line in textwrap.wrap(text, line_chars))
+		stream = f"BT /F1 9 Tf 11 TL 40 810 Td {lines} ET".encode("latin-1")
+		objects.append(
+			f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] /Resources << /Font << /F1 3 0 R >> >> /Contents {5 + 2 * i} 0 R >>".encode()
+		)
+		objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+
+	out = bytearray(b"%PDF-1.4\n")
+	offsets = []
+	for number, obj in enumerate(objects, 1):
+		offsets.append(len(out))
+		out += b"%d 0 obj\n" % number + obj + b"\nendobj\n"
+	xref = len(out)
+	out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+	for offset in offsets:
+		out += b"%010d 00000 n \n" % offset
+	out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+	path.write_bytes(bytes(out))
+
+
+def summarize(samples: Sequence[float], elapsed: float = 0.0, errors: int = 0) -> Dict[str, Any]:
+	"""Latency percentiles in milliseconds for ``samples`` given in seconds."""
+	out: Dict[str, Any] = {"count": len(samples), "errors": errors}
+	if samples:
+		ms = np.asarray(samples) * 1000
+		p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+		out.update(
+			mean_ms=round(float(ms.mean()), 2),
+			p50_ms=round(float(p50), 2),
+			p95_ms=round(float(p95), 2),
+			p99_ms=round(float(p99), 2),
+			max_ms=round(float(ms.max()), 2),
+		)
+	if elapsed:
+		out["rps"] = round(len(samples) / elapsed, 2)
+	return out
+
+
+async def _drive(requests: int, concurrency: int, call: Callable[[int], Awaitable[Dict[str, float]]]) -> Dict[str, Any]:
+	"""Run ``call(i)`` for ``i < requests`` with at most ``concurrency`` in flight; summarize each timing it returns."""
+	sem = asyncio.Semaphore(concurrency)
+	timings: Dict[str, List[float]] = {}
+	errors = 0
+
+	async def one(i: int) -> None:
+		nonlocal errors
+		async with sem:
+			try:
+				for name, seconds in (await call(i)).items():
+					timings.setdefault(name, []).append(seconds)
+			except Exception:
+				errors += 1
+
+	started = time.perf_counter()
+	await asyncio.gather(*(one(i) for i in range(requests)))
+	elapsed = time.perf_counter() - started
+	return {name: summarize(samples, elapsed, errors) for name, samples in timings.items()} or {"latency": summarize([], elapsed, errors)}
+
+
+def import_time(module: str, runs: int, budget_ms: float) -> Dict[str, Any]:
+	"""Cold ``import module`` in fresh interpreters: median wall time against ``budget_ms`` and,
+	from ``-X importtime`` of the last run, the modules with the largest self time."""
+	code = f"import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+	samples: List[float] = []
+	slowest: List[Dict[str, Any]] = []
+	for _ in range(max(1, runs)):
+		proc = subprocess.run(
+			[sys.executable, "-X", "importtime", "-c", code],
+			cwd=Path(__file__).resolve().parents[1],
+			capture_output=True,
+			text=True,
+			check=True,
+		)
+		samples.append(float(proc.stdout.strip().splitlines()[-1]))
+		rows = []
+		for line in proc.stderr.splitlines():
+			parts = line.removeprefix("import time:").split("|")
+			if len(parts) == 3 and parts[0].strip().isdigit():
+				rows.append((int(parts[0]), parts[2].strip()))
+		slowest = [{"module": name, "self_ms": round(us / 1000, 1)} for us, name in sorted(rows, reverse=True)[:8]]
+	median_ms = round(float(np.median(samples)) * 1000, 1)
+	return {
+		"module": module,
+		"runs": len(samples),
+		"median_ms": median_ms,
+		"budget_ms": budget_ms,
+		"within_budget": median_ms <= budget_ms,
+		"slowest": slowest,
+	}
+
+
+def _ready(client: httpx.Client, started: float, timeout: float = 120.0) -> Dict[str, Any]:
+	while True:
+		resp = client.get("/health/ready")
+		if resp.status_code == 200 or time.perf_counter() - started > timeout:
+			body = resp.json()
+			return {"seconds": round(time.perf_counter() - started, 3), "ready": body["ready"], "warmup": body["warmup"]}
+		time.sleep(0.02)
+
+
+def _ingest(client: httpx.Client, corpus: Path, pages: int, pages_per_pdf: int, seed: int) -> Dict[str, Any]:
+	rng = np.random.default_rng(seed)
+	paths = []
+	for i, start in enumerate(range(0, pages, pages_per_pdf)):
+		path = corpus / f"case_{i:04d}.pdf"
+		write_pdf(path, [synthetic_page(rng) for _ in range(min(pages_per_pdf, pages - start))])
+		paths.append(path)
+
+	started = time.perf_counter()
+	job_ids = []
+	for path in paths:
+		with open(path, "rb") as f:
+			resp = client.post("/ingest", files={"file": (path.name, f, "application/pdf")})
+		resp.raise_for_status()
+		job_ids.append(resp.json()["id"])
+	jobs: List[Dict[str, Any]] = []
+	while True:
+		jobs = [client.get(f"/ingest/{job_id}").json() for job_id in job_ids]
+		if all(j["status"] in ("done", "failed") for j in jobs):
+			break
+		time.sleep(0.05)
+	elapsed = time.perf_counter() - started
+	chunks = sum(j["chunks"] for j in jobs)
+	return {
+		"pdfs": len(paths),
+		"pages": pages,
+		"chunks": chunks,
+		"failed_jobs": sum(j["status"] == "failed" for j in jobs),
+		"seconds": round(elapsed, 3),
+		"pages_per_s": round(pages / elapsed, 2),
+		"chunks_per_s": round(chunks / elapsed, 2),
+	}
+
+
+def _retrieval(queries: Sequence[str]) -> Dict[str, Any]:
+	from backend.core.deps import get_corpus_registry
+
+	registry = get_corpus_registry()
+	started = time.perf_counter()
+	gen = registry.rebuild()
+	build_s = time.perf_counter() - started
+	samples = []
+	for q in queries:
+		started = time.perf_counter()
+		gen.retriever.search(q)
+		samples.append(time.perf_counter() - started)
+	return {"generation": gen.number, "build_seconds": round(build_s, 3), "search": summarize(samples)}
+
+
+async def _load(base_url: str, concurrency: int, requests: int, seed: int) -> Dict[str, Any]:
+	rng = np.random.default_rng(seed)
+	queries = [synthetic_query(rng) + f" (#{i})" for i in range(requests)]
+	async with httpx.AsyncClient(base_url=base_url, timeout=300, limits=httpx.Limits(max_connections=concurrency)) as client:
+
+		async def query(i: int) -> Dict[str, float]:
+			started = time.perf_counter()
+			resp = await client.post("/query", json={"query": queries[i], "user_id": f"bench-{i}"})
+			resp.raise_for_status()
+			return {"latency": time.perf_counter() - started}
+
+		async def stream(i: int) -> Dict[str, float]:
+			started = time.perf_counter()
+			first = None
+			async with client.stream("GET", "/query_stream", params={"query": queries[i], "user_id": f"bench-{i}"}) as resp:
+				resp.raise_for_status()
+				async for chunk in resp.aiter_bytes():
+					if chunk and first is None:
+						first = time.perf_counter() - started
+			return {"ttft": first if first is not None else time.perf_counter() - started, "latency": time.perf_counter() - started}
+
+		return {
+			"concurrency": concurrency,
+			"query": await _drive(requests, concurrency, query),
+			"query_stream": await _drive(requests, concurrency, stream),
+		}
+
+
+def run_size(pages: int, args: argparse.Namespace) -> Dict[str, Any]:
+	"""One corpus size, in a process whose environment already points at a fresh data dir and the fake Ollama."""
+	from backend.core.settings import get_settings
+	from backend.main import create_app
+
+	settings = get_settings()
+	corpus = settings.data_dir / "corpus"
+	corpus.mkdir(parents=True, exist_ok=True)
+	started = time.perf_counter()
+	server, base_url = serve_in_thread(create_app())
+	try:
+		with httpx.Client(base_url=base_url, timeout=300) as client:
+			startup = _ready(client, started)
+			ingest = _ingest(client, corpus, pages, args.pages_per_pdf, args.seed)
+		rng = np.random.default_rng(args.seed + 1)
+		retrieval = _retrieval([synthetic_query(rng) for _ in range(args.retrieval_queries)])
+		load = [asyncio.run(_load(base_url, c, args.requests, args.seed + 2 + c)) for c in args.concurrency]
+	finally:
+		server.should_exit = True
+	return {"pages": pages, "startup": startup, "ingest": ingest, "retrieval": retrieval, "load": load}
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser(description="Offline end-to-end benchmark against a deterministic fake Ollama.")
+	parser.add_argument("--sizes", type=int, nargs="+", default=[40, 160, 640], help="Corpus sizes in pages")
+	parser.add_argument("--pages-per-pdf", type=int, default=20)
+	parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8])
+	parser.add_argument("--requests", type=int, default=32, help="Requests per endpoint per concurrency level")
+	parser.add_argument("--retrieval-queries", type=int, default=200)
+	parser.add_argument("--dim", type=int, default=256, help="Fake embedding dimension")
+	parser.add_argument("--tokens", type=int, default=64, help="Tokens per fake chat reply")
+	parser.add_argument("--token-latency", type=float, default=0.01, help="Seconds between fake chat tokens")
+	parser.add_argument("--embed-latency", type=float, default=0.0, help="Seconds per fake embedding request")
+	parser.add_argument("--answer-cache", action="store_true", help="Keep the answer cache on (off by default)")
+	parser.add_argument("--seed", type=int, default=0)
+	parser.add_argument("--import-runs", type=int, default=5, help="Fresh interpreters timing the import of backend.main")
+	parser.add_argument("--import-budget-ms", type=float, default=1000.0, help="Budget for the median import of backend.main")
+	parser.add_argument("--output", type=Path, default=None, help="Write results JSON here as well as to stdout")
+	parser.add_argument("--run-size", type=int, default=None, help=argparse.SUPPRESS)
+	parser.add_argument("--result", type=Path, default=None, help=argparse.SUPPRESS)
+	args = parser.parse_args()
+
+	if args.run_size is not None:
+		args.result.write_text(json.dumps(run_size(args.run_size, args)), encoding="utf-8")
+		return
+
+	startup = import_time("backend.main", args.import_runs, args.import_budget_ms)
+	print(f"[import] backend.main {startup['median_ms']} ms (budget {startup['budget_ms']} ms)", file=sys.stderr)
+	fake, ollama_url = serve_in_thread(create_fake_ollama(args.dim, args.tokens, args.token_latency, args.embed_latency))
+	runs = []
+	try:
+		for pages in args.sizes:
+			with tempfile.TemporaryDirectory(prefix="rag-bench-") as tmp:
+				env = {
+					**os.environ,
+					"DATA_DIR": str(Path(tmp) / "data"),
+					"OLLAMA_BASE_URL": ollama_url,
+					"EMBED_CACHE_PATH": str(Path(tmp) / "embed_cache.sqlite"),
+					"REDIS_HOST": "127.0.0.1",
+					"REDIS_PORT": "1",
+				}
+				if not args.answer_cache:
+					env["ANSWER_CACHE_SIZE"] = "0"
+				result = Path(tmp) / "result.json"
+				# Each size runs in a fresh process so settings and process-wide caches start empty.
+				subprocess.run(
+					[sys.executable, "-m", "backend.benchmark", *sys.argv[1:], "--run-size", str(pages), "--result", str(result)],
+					cwd=Path(__file__).resolve().parents[1],
+					env=env,
+					check=True,
+					stdout=subprocess.DEVNULL,
+				)
+				runs.append(json.loads(result.read_text(encoding="utf-8")))
+				print(f"[{pages} pages] ingest {runs[-1]['ingest']['pages_per_s']} pages/s, "
+					f"search p50 {runs[-1]['retrieval']['search'].get('p50_ms')} ms", file=sys.stderr)
+	finally:
+		fake.should_exit = True
+
+	report = {
+		"started_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+		"python": platform.python_version(),
+		"config": {k: v for k, v in vars(args).items() if k not in ("run_size", "result", "output")},
+		"import": startup,
+		"runs": runs,
+	}
+	text = json.dumps(report, indent=2, default=str)
+	if args.output:
+		args.output.write_text(text, encoding="utf-8")
+	print(text)
+
+
+if __name__ == "__main__":
+	main()
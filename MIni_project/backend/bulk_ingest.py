@@ -0,0 +1,150 @@
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from langchain_core.documents import Document
+
+from backend.core.settings import get_settings
+from backend.services.retrieval import commit_chunks, count_pdf_pages, embed_documents, get_chunk_store, load_pdf_and_chunk
+
+
+def _parse(path: str) -> Tuple[str, List[Document], int]:
+	docs = load_pdf_and_chunk(path)
+	# Every page is counted, including blank or image-only ones that produce no chunks.
+	return path, docs, docs[0].metadata["total_pages"] if docs else count_pdf_pages(path)
+
+
+def _file_key(path: Path) -> str:
+	st = path.stat()
+	return f"{path.resolve()}|{st.st_size}|{int(st.st_mtime)}"
+
+
+def _load_checkpoint(path: Path) -> Dict[str, dict]:
+	done: Dict[str, dict] = {}
+	if path.exists():
+		with open(path, "r", encoding="utf-8") as f:
+			for line in f:
+				if line.strip():
+					record = json.loads(line)
+					done[record["key"]] = record
+	return done
+
+
+class BulkIngest:
+	def __init__(self, root: Path, checkpoint: Path, batch_chunks: int, processes: int, embed: bool):
+		self.settings = get_settings()
+		self.root = root
+		self.checkpoint = checkpoint
+		self.mark_key = f"bulk_ingest:{checkpoint.resolve()}"
+		self.batch_chunks = batch_chunks
+		self.processes = processes
+		self.embed = embed
+		self.pages = 0
+		self.chunks = 0
+		self.embedded = 0
+		self.embed_seconds = 0.0
+		self.files = 0
+		self.failed = 0
+		self._batch: List[Document] = []
+		self._batch_files: List[dict] = []
+
+	def _checkpoint(self, records: List[dict]) -> None:
+		with open(self.checkpoint, "a", encoding="utf-8") as f:
+			for record in records:
+				f.write(json.dumps(record) + "\n")
+
+	def _flush(self) -> None:
+		if not self._batch_files:
+			return
+		if self._batch:
+			vectors = None
+			if self.embed:
+				started = time.perf_counter()
+				vectors = embed_documents(self._batch, self.settings)
+				self.embed_seconds += time.perf_counter() - started
+				self.embedded += len(vectors)
+			# The batch's records go into the chunk manifest with the chunks; see _recover.
+			commit_chunks(self._batch, self.settings, self.settings.data_dir, vectors, marks={self.mark_key: self._batch_files})
+		self._checkpoint(self._batch_files)
+		self._batch = []
+		self._batch_files = []
+
+	def _recover(self, done: Dict[str, dict]) -> None:
+		"""Checkpoints the last committed batch if the run stopped before writing it to the log."""
+		missing = [r for r in get_chunk_store(self.settings.data_dir).marks().get(self.mark_key, []) if r["key"] not in done]
+		if missing:
+			self._checkpoint(missing)
+			done.update((r["key"], r) for r in missing)
+			print(f"Recovered {len(missing)} committed files missing from the checkpoint")
+
+	def run(self) -> None:
+		done = _load_checkpoint(self.checkpoint)
+		self._recover(done)
+		todo = [p for p in sorted(self.root.rglob("*")) if p.suffix.lower() == ".pdf" and _file_key(p) not in done]
+		print(f"{len(todo)} PDFs to ingest under {self.root} ({len(done)} already checkpointed)")
+
+		started = time.perf_counter()
+		keys = {str(p): _file_key(p) for p in todo}
+		pending = iter(todo)
+		with ProcessPoolExecutor(max_workers=self.processes) as pool:
+			inflight = set()
+			for path in pending:
+				inflight.add(pool.submit(_parse, str(path)))
+				if len(inflight) >= self.processes * 2:
+					break
+			while inflight:
+				finished, inflight = wait(inflight, return_when=FIRST_COMPLETED)
+				for future in finished:
+					nxt = next(pending, None)
+					if nxt is not None:
+						inflight.add(pool.submit(_parse, str(nxt)))
+					try:
+						path, docs, pages = future.result()
+					except Exception as exc:
+						self.failed += 1
+						print(f"Failed to parse: {exc}")
+						continue
+					self.files += 1
+					self.pages += pages
+					self.chunks += len(docs)
+					self._batch.extend(docs)
+					self._batch_files.append({"key": keys[path], "path": path, "pages": pages, "chunks": len(docs)})
+					if len(self._batch) >= self.batch_chunks:
+						self._flush()
+						self._report(started)
+		self._flush()
+		self._report(started, final=True)
+
+	def _report(self, started: float, final: bool = False) -> None:
+		elapsed = max(time.perf_counter() - started, 1e-9)
+		label = "done" if final else "progress"
+		embed_rate = self.embedded / self.embed_seconds if self.embed_seconds else 0.0
+		print(
+			f"[{label}] files={self.files} failed={self.failed} pages={self.pages} chunks={self.chunks} "
+			f"elapsed={elapsed:.1f}s pages/s={self.pages / elapsed:.1f} chunks/s={self.chunks / elapsed:.1f} "
+			f"embeddings/s={embed_rate:.1f}"
+		)
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser(description="Bulk-ingest a directory tree of PDFs into the local corpus.")
+	parser.add_argument("root", type=Path, help="Directory searched recursively for *.pdf")
+	parser.add_argument("--checkpoint", type=Path, default=None, help="Per-file checkpoint log (default: <data_dir>/bulk_ingest.jsonl)")
+	parser.add_argument("--batch-chunks", type=int, default=2048, help="Chunks embedded and committed per batch")
+	parser.add_argument("--processes", type=int, default=os.cpu_count() or 1, help="PDF parsing processes")
+	parser.add_argument("--skip-embeddings", action="store_true", help="Index BM25 only; vectors are backfilled by the server")
+	args = parser.parse_args()
+
+	settings = get_settings()
+	checkpoint = args.checkpoint or settings.data_dir / "bulk_ingest.jsonl"
+	BulkIngest(args.root, checkpoint, args.batch_chunks, args.processes, not args.skip_embeddings).run()
+
+
+if __name__ == "__main__":
+	main()
@@ -5,11 +5,19 @@ from functools import lru_cache
 from backend.core.settings import get_settings, Settings
 from backend.services.memory import MemoryManager
 from backend.services.feedback import RatingStore
+from backend.services.cache import AnswerCache
+from backend.services.coalesce import Coalescer
+from backend.services.corpus import CorpusRegistry
+from backend.services.healing import HealJobs
+from backend.services.jobs import IngestJobQueue
+from backend.services.metrics import INGEST_QUEUE_DEPTH
+from backend.services.responses import ResponseStore
+from backend.services.warmup import Warmup
 
 
 @lru_cache
 def get_memory_manager() -> MemoryManager:
-	return MemoryManager()
+	return MemoryManager(get_settings())
 
 
 @lru_cache
@@ -17,6 +25,44 @@ def get_rating_store() -> RatingStore:
 	return RatingStore(get_settings())
 
 
+@lru_cache
+def get_answer_cache() -> AnswerCache:
+	return AnswerCache(get_settings())
+
+
+@lru_cache
+def get_coalescer() -> Coalescer:
+	return Coalescer()
+
+
+@lru_cache
+def get_response_store() -> ResponseStore:
+	settings = get_settings()
+	return ResponseStore(settings.response_store_size, settings.response_ttl)
+
+
+@lru_cache
+def get_heal_jobs() -> HealJobs:
+	return HealJobs(get_settings().response_store_size)
+
+
+@lru_cache
+def get_corpus_registry() -> CorpusRegistry:
+	return CorpusRegistry(get_settings())
+
+
+@lru_cache
+def get_ingest_queue() -> IngestJobQueue:
+	queue = IngestJobQueue(get_settings(), on_commit=get_corpus_registry().refresh_in_background)
+	INGEST_QUEUE_DEPTH.set_function(queue.depth)
+	return queue
+
+
+@lru_cache
+def get_warmup() -> Warmup:
+	return Warmup(get_settings(), get_corpus_registry())
+
+
 def get_app_settings() -> Settings:
 	return get_settings()
 
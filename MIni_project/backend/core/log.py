@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+import json
+import logging
+import sys
+import time
+from typing import Any, Dict
+
+
+_ROOT = "backend"
+
+
+class JsonFormatter(logging.Formatter):
+	def format(self, record: logging.LogRecord) -> str:
+		payload: Dict[str, Any] = {
+			"ts": round(record.created, 3),
+			"level": record.levelname.lower(),
+			"logger": record.name,
+			"event": record.getMessage(),
+			**getattr(record, "fields", {}),
+		}
+		if record.exc_info:
+			payload["exc"] = self.formatException(record.exc_info)
+		return json.dumps(payload, default=str)
+
+
+class KeyValueFormatter(logging.Formatter):
+	def format(self, record: logging.LogRecord) -> str:
+		stamp = time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(record.created))
+		fields = " ".join(f"{k}={v}" for k, v in getattr(record, "fields", {}).items())
+		line = f"{stamp} {record.levelname:<7} {record.name} {record.getMessage()} {fields}".rstrip()
+		if record.exc_info:
+			line += "\n" + self.formatException(record.exc_info)
+		return line
+
+
+class StructuredLogger:
+	"""``logger.info("event.name", key=value, ...)``; disabled levels return before any record is built."""
+
+	__slots__ = ("_logger",)
+
+	def __init__(self, logger: logging.Logger):
+		self._logger = logger
+
+	def isEnabledFor(self, level: int) -> bool:
+		return self._logger.isEnabledFor(level)
+
+	def _log(self, level: int, event: str, fields: Dict[str, Any], exc_info: bool = False) -> None:
+		self._logger.log(level, event, extra={"fields": fields}, exc_info=exc_info, stacklevel=3)
+
+	def debug(self, event: str, **fields: Any) -> None:
+		if self._logger.isEnabledFor(logging.DEBUG):
+			self._log(logging.DEBUG, event, fields)
+
+	def info(self, event: str, **fields: Any) -> None:
+		if self._logger.isEnabledFor(logging.INFO):
+			self._log(logging.INFO, event, fields)
+
+	def warning(self, event: str, **fields: Any) -> None:
+		if self._logger.isEnabledFor(logging.WARNING):
+			self._log(logging.WARNING, event, fields)
+
+	def error(self, event: str, **fields: Any) -> None:
+		if self._logger.isEnabledFor(logging.ERROR):
+			self._log(logging.ERROR, event, fields)
+
+	def exception(self, event: str, **fields: Any) -> None:
+		if self._logger.isEnabledFor(logging.ERROR):
+			self._log(logging.ERROR, event, fields, exc_info=True)
+
+
+def get_logger(name: str) -> StructuredLogger:
+	return StructuredLogger(logging.getLogger(name))
+
+
+def configure_logging(level: str = "INFO", fmt: str = "json") -> None:
+	"""Route every ``backend.*`` logger to one stderr handler; calling it again only updates level and format."""
+	root = logging.getLogger(_ROOT)
+	handler = next((h for h in root.handlers if getattr(h, "_backend_handler", False)), None)
+	if handler is None:
+		handler = logging.StreamHandler(sys.stderr)
+		handler._backend_handler = True  # type: ignore[attr-defined]
+		root.addHandler(handler)
+	handler.setFormatter(JsonFormatter() if fmt == "json" else KeyValueFormatter())
+	root.setLevel(level.upper())
+	root.propagate = False
@@ -1,5 +1,6 @@
 from functools import lru_cache
 from pathlib import Path
+from typing import Optional
 from pydantic import Field
 from pydantic_settings import BaseSettings
 
@@ -9,6 +10,73 @@ class Settings(BaseSettings):
 	ollama_model: str = Field("mistral:7b", alias="OLLAMA_MODEL")
 	ollama_embed_model: str = Field("nomic-embed-text", alias="OLLAMA_EMBED_MODEL")
 	ollama_base_url: str = Field("http://localhost:11434", alias="OLLAMA_BASE_URL")
+	ollama_base_urls: Optional[str] = Field(None, alias="OLLAMA_BASE_URLS")
+	ollama_pool_size: int = Field(32, alias="OLLAMA_POOL_SIZE")
+	ollama_keepalive_expiry: float = Field(60.0, alias="OLLAMA_KEEPALIVE_EXPIRY")
+	ollama_timeout: float = Field(300.0, alias="OLLAMA_TIMEOUT")
+	ollama_keep_alive: int = Field(-1, alias="OLLAMA_KEEP_ALIVE")
+	warmup: bool = Field(True, alias="WARMUP")
+	warmup_retry: float = Field(2.0, alias="WARMUP_RETRY")
+	warmup_retry_max: float = Field(60.0, alias="WARMUP_RETRY_MAX")
+
+	llm_max_concurrency: int = Field(4, alias="LLM_MAX_CONCURRENCY")
+	embed_max_concurrency: int = Field(8, alias="EMBED_MAX_CONCURRENCY")
+	admission_queue_size: int = Field(64, alias="ADMISSION_QUEUE_SIZE")
+	admission_timeout: float = Field(30.0, alias="ADMISSION_TIMEOUT")
+
+	embed_batch_size: int = Field(64, alias="EMBED_BATCH_SIZE")
+	embed_concurrency: int = Field(4, alias="EMBED_CONCURRENCY")
+	embed_cache_path: Optional[Path] = Field(None, alias="EMBED_CACHE_PATH")
+	embed_query_cache_size: int = Field(1024, alias="EMBED_QUERY_CACHE_SIZE")
+
+	retrieval_k: int = Field(10, alias="RETRIEVAL_K")
+	hybrid_candidates: int = Field(50, alias="HYBRID_CANDIDATES")
+	hybrid_fusion: str = Field("rrf", alias="HYBRID_FUSION")
+	hybrid_vector_weight: float = Field(0.55, alias="HYBRID_VECTOR_WEIGHT")
+	hybrid_bm25_weight: float = Field(0.45, alias="HYBRID_BM25_WEIGHT")
+	partition_routing: str = Field("boost", alias="PARTITION_ROUTING")
+	partition_boost: float = Field(0.1, alias="PARTITION_BOOST")
+	partition_evidence: float = Field(0.75, alias="PARTITION_EVIDENCE")
+
+	retrieval_threads: int = Field(4, alias="RETRIEVAL_THREADS")
+	retrieval_embed_timeout: float = Field(10.0, alias="RETRIEVAL_EMBED_TIMEOUT")
+	retrieval_search_timeout: float = Field(5.0, alias="RETRIEVAL_SEARCH_TIMEOUT")
+	context_token_budget: int = Field(1500, alias="CONTEXT_TOKEN_BUDGET")
+	context_chars_per_token: float = Field(4.0, alias="CONTEXT_CHARS_PER_TOKEN")
+	context_mmr_lambda: float = Field(0.7, alias="CONTEXT_MMR_LAMBDA")
+	context_dedup_threshold: float = Field(0.8, alias="CONTEXT_DEDUP_THRESHOLD")
+	stream_disconnect_poll: float = Field(0.25, alias="STREAM_DISCONNECT_POLL")
+	query_batch_size: int = Field(64, alias="QUERY_BATCH_SIZE")
+	query_batch_concurrency: int = Field(4, alias="QUERY_BATCH_CONCURRENCY")
+	query_batch_memory_mb: int = Field(64, alias="QUERY_BATCH_MEMORY_MB")
+	query_batch_max: int = Field(10000, alias="QUERY_BATCH_MAX")
+
+	vector_nprobe: int = Field(0, alias="VECTOR_NPROBE")
+	ivf_nlist: int = Field(0, alias="IVF_NLIST")
+	ivf_min_rows: int = Field(20000, alias="IVF_MIN_ROWS")
+	vector_storage: str = Field("float32", alias="VECTOR_STORAGE")
+	vector_rescore: int = Field(4, alias="VECTOR_RESCORE")
+
+	answer_cache_size: int = Field(1024, alias="ANSWER_CACHE_SIZE")
+	answer_cache_ttl: int = Field(3600, alias="ANSWER_CACHE_TTL")
+	answer_cache_redis_timeout: float = Field(0.5, alias="ANSWER_CACHE_REDIS_TIMEOUT")
+	response_store_size: int = Field(1000, alias="RESPONSE_STORE_SIZE")
+	response_ttl: int = Field(3600, alias="RESPONSE_TTL")
+	heal_k: int = Field(12, alias="HEAL_K")
+	heal_neighbours: int = Field(1, alias="HEAL_NEIGHBOURS")
+	memory_cache_size: int = Field(10000, alias="MEMORY_CACHE_SIZE")
+	memory_local_ttl: int = Field(30, alias="MEMORY_LOCAL_TTL")
+	memory_ttl: int = Field(30 * 24 * 3600, alias="MEMORY_TTL")
+	memory_redis_timeout: float = Field(0.5, alias="MEMORY_REDIS_TIMEOUT")
+	case_types: str = Field("contract,tort,criminal,constitutional,property,tax", alias="CASE_TYPES")
+
+	ingest_workers: int = Field(2, alias="INGEST_WORKERS")
+	ingest_processes: int = Field(2, alias="INGEST_PROCESSES")
+	corpus_refresh_interval: float = Field(5.0, alias="CORPUS_REFRESH_INTERVAL")
+	ingest_failed_ttl: int = Field(7 * 24 * 3600, alias="INGEST_FAILED_TTL")
+
+	log_level: str = Field("INFO", alias="LOG_LEVEL")
+	log_format: str = Field("json", alias="LOG_FORMAT")
 
 	data_dir: Path = Field(Path("data"), alias="DATA_DIR")
 	redis_host: str = Field("localhost", alias="REDIS_HOST")
@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import hashlib
+import json
+import re
+import socket
+import threading
+import time
+from typing import List, Optional
+
+import numpy as np
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+
+_TOKEN_RE = re.compile(r"\w+")
+_CREATED_AT = "2024-01-01T00:00:00Z"
+
+
+def hash_embedding(text: str, dim: int) -> List[float]:
+	"""Deterministic feature-hashed bag of words, so texts sharing terms score a higher cosine."""
+	vec = np.zeros(dim, dtype=np.float32)
+	for token in _TOKEN_RE.findall(text.lower()):
+		h = int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "little")
+		vec[h % dim] += 1.0 if (h >> 63) else -1.0
+	norm = float(np.linalg.norm(vec))
+	return (vec / norm if norm else vec).tolist()
+
+
+def _answer_tokens(prompt: str, tokens: int) -> List[str]:
+	seed = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+	words = _TOKEN_RE.findall(prompt) or ["answer"]
+	rng = np.random.default_rng(int(seed[:16], 16))
+	return [f"{words[i]} " for i in rng.integers(0, len(words), size=max(1, tokens))]
+
+
+def create_fake_ollama(dim: int = 256, tokens: int = 64, token_latency: float = 0.01, embed_latency: float = 0.0) -> FastAPI:
+	"""Minimal Ollama HTTP API: ``/api/embed``, ``/api/embeddings``, ``/api/chat``, ``/api/generate``
+	(model load only), ``/api/version`` and ``/api/tags``.
+
+	Embeddings are ``hash_embedding`` vectors; chat replies are ``tokens`` words
+	drawn deterministically from the prompt and streamed ``token_latency``
+	seconds apart.
+	"""
+	app = FastAPI(title="fake-ollama")
+
+	@app.get("/api/tags")
+	async def tags():
+		return {"models": []}
+
+	@app.get("/api/version")
+	async def version():
+		return {"version": "0.0.0-fake"}
+
+	@app.post("/api/generate")
+	async def generate(request: Request):
+		body = await request.json()
+		return {"model": body["model"], "created_at": _CREATED_AT, "response": "", "done": True, "done_reason": "load"}
+
+	@app.post("/api/embed")
+	async def embed(request: Request):
+		body = await request.json()
+		texts = body["input"] if isinstance(body["input"], list) else [body["input"]]
+		if embed_latency:
+			await asyncio.sleep(embed_latency)
+		return {"model": body["model"], "embeddings": [hash_embedding(t, dim) for t in texts]}
+
+	@app.post("/api/embeddings")
+	async def embeddings(request: Request):
+		body = await request.json()
+		if embed_latency:
+			await asyncio.sleep(embed_latency)
+		return {"embedding": hash_embedding(body["prompt"], dim)}
+
+	@app.post("/api/chat")
+	async def chat(request: Request):
+		body = await request.json()
+		words = _answer_tokens(body["messages"][-1]["content"], tokens)
+		done = {
+			"model": body["model"],
+			"created_at": _CREATED_AT,
+			"message": {"role": "assistant", "content": ""},
+			"done": True,
+			"done_reason": "stop",
+			"total_duration": 0,
+			"load_duration": 0,
+			"prompt_eval_count": 0,
+			"prompt_eval_duration": 0,
+			"eval_count": len(words),
+			"eval_duration": 0,
+		}
+		if not body.get("stream", True):
+			await asyncio.sleep(token_latency * len(words))
+			return {**done, "message": {"role": "assistant", "content": "".join(words)}}
+
+		async def stream():
+			for word in words:
+				await asyncio.sleep(token_latency)
+				chunk = {"model": body["model"], "created_at": _CREATED_AT, "message": {"role": "assistant", "content": word}, "done": False}
+				yield json.dumps(chunk) + "\n"
+			yield json.dumps(done) + "\n"
+
+		return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+	return app
+
+
+def free_port() -> int:
+	with socket.socket() as s:
+		s.bind(("127.0.0.1", 0))
+		return s.getsockname()[1]
+
+
+def serve_in_thread(app: FastAPI, port: Optional[int] = None) -> tuple:
+	"""Run ``app`` under uvicorn on a daemon thread; returns ``(server, base_url)`` once it accepts connections."""
+	port = port or free_port()
+	server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", lifespan="on"))
+	threading.Thread(target=server.run, name=f"uvicorn-{port}", daemon=True).start()
+	deadline = time.monotonic() + 30
+	while not server.started:
+		if time.monotonic() > deadline:
+			raise RuntimeError(f"Server on port {port} did not start")
+		time.sleep(0.02)
+	return server, f"http://127.0.0.1:{port}"
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser(description="Serve a deterministic stand-in for the Ollama API.")
+	parser.add_argument("--port", type=int, default=11434)
+	parser.add_argument("--dim", type=int, default=256)
+	parser.add_argument("--tokens", type=int, default=64)
+	parser.add_argument("--token-latency", type=float, default=0.01)
+	parser.add_argument("--embed-latency", type=float, default=0.0)
+	args = parser.parse_args()
+	app = create_fake_ollama(args.dim, args.tokens, args.token_latency, args.embed_latency)
+	uvicorn.run(app, host="127.0.0.1", port=args.port)
+
+
+if __name__ == "__main__":
+	main()
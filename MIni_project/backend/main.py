@@ -1,15 +1,40 @@
 from __future__ import annotations
 
-from fastapi import FastAPI
+import asyncio
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 
 from backend.api.routes import router as api_router
+from backend.core.deps import get_ingest_queue, get_warmup
+from backend.core.log import configure_logging
 from backend.core.settings import get_settings
+from backend.services.admission import Overloaded, RetrievalTimeout
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+	queue = get_ingest_queue()
+	queue.start()
+	warmup = get_warmup()
+	# Startup returns at once so /health/live answers; /health/ready turns 200 when the warm-up finishes.
+	task = asyncio.create_task(warmup.run()) if get_settings().warmup else None
+	if task is None:
+		warmup.skip()
+	try:
+		yield
+	finally:
+		if task is not None:
+			task.cancel()
+		queue.stop()
 
 
 def create_app() -> FastAPI:
 	settings = get_settings()
-	app = FastAPI(title=settings.app_name)
+	configure_logging(settings.log_level, settings.log_format)
+	app = FastAPI(title=settings.app_name, lifespan=lifespan)
 	app.add_middleware(
 		CORSMiddleware,
 		allow_origins=["*"],
@@ -18,6 +43,18 @@ def create_app() -> FastAPI:
 		allow_headers=["*"],
 	)
 
+	@app.exception_handler(Overloaded)
+	async def overloaded(request: Request, exc: Overloaded):
+		return JSONResponse(
+			{"error": str(exc), "kind": exc.kind, "reason": exc.reason},
+			status_code=exc.status_code,
+			headers={"Retry-After": str(exc.retry_after)},
+		)
+
+	@app.exception_handler(RetrievalTimeout)
+	async def retrieval_timeout(request: Request, exc: RetrievalTimeout):
+		return JSONResponse({"error": str(exc)}, status_code=504)
+
 	@app.get("/")
 	def root():
 		excluded = {"/openapi.json", "/docs", "/docs/oauth2-redirect", "/redoc"}
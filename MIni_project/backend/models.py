@@ -1,18 +1,40 @@
 from __future__ import annotations
 
 from pydantic import BaseModel, Field
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Union
 
 
 class QueryRequest(BaseModel):
 	query: str = Field(..., description="User query")
 	user_id: Optional[str] = Field(default="default_user")
+	filter: Optional[Dict[str, Union[str, int, List[Union[str, int]]]]] = Field(
+		default=None,
+		description='Metadata partitions to search, e.g. {"court": "delhi high court", "year": [2019, 2020]}; keys: case_type, court, year, source',
+	)
+
+
+class BatchQueryItem(BaseModel):
+	query: str
+	id: Optional[str] = Field(default=None, description="Caller's id, echoed in the result")
+	filter: Optional[Dict[str, Union[str, int, List[Union[str, int]]]]] = Field(
+		default=None, description="Partitions for this query, merged over the batch filter"
+	)
+
+
+class QueryBatchRequest(BaseModel):
+	queries: List[Union[str, BatchQueryItem]] = Field(..., description="Questions, as strings or {query, id, filter}")
+	user_id: Optional[str] = Field(default="default_user")
+	filter: Optional[Dict[str, Union[str, int, List[Union[str, int]]]]] = Field(
+		default=None, description="Partitions for every query; same form as QueryRequest.filter"
+	)
+	concurrency: Optional[int] = Field(default=None, ge=1, description="Generations in flight, at most QUERY_BATCH_CONCURRENCY")
 
 
 class FeedbackRequest(BaseModel):
 	query: str
 	rating: int = Field(ge=1, le=5)
 	user_id: Optional[str] = Field(default="default_user")
+	response_id: Optional[str] = Field(default=None, description="response_id of the answer being rated")
 	extra: Optional[Dict[str, Any]] = None
 
 
@@ -22,8 +44,23 @@ class IngestResponse(BaseModel):
 	bm25_docs: int
 
 
+class IngestJob(BaseModel):
+	id: str
+	filename: str
+	status: str = Field(..., description="queued | running | done | failed")
+	pages_total: int = 0
+	pages_parsed: int = 0
+	chunks: int = 0
+	chunks_embedded: int = 0
+	result: Optional[IngestResponse] = None
+	error: Optional[str] = None
+	created_at: float
+	updated_at: float
+
+
 class QueryResponse(BaseModel):
 	answer: str
+	response_id: Optional[str] = None
 	sources: List[Dict[str, Any]] = []
 	meta: Dict[str, Any] = {}
 
@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import sys
+from pathlib import Path
+from typing import List, Optional
+
+from backend.core.deps import get_answer_cache, get_corpus_registry, get_memory_manager, get_response_store
+from backend.core.log import configure_logging
+from backend.core.settings import get_settings
+from backend.services.batch import BatchQuery, answer_batch
+from backend.services.partitions import normalize_filters
+
+
+def _read(path: Path, base: dict) -> List[BatchQuery]:
+	"""One query per line; a line that is a JSON object may carry ``query``, ``id`` and ``filter``."""
+	items: List[BatchQuery] = []
+	with open(path, "r", encoding="utf-8") as f:
+		for line in f:
+			line = line.strip()
+			if not line:
+				continue
+			if line.startswith("{"):
+				record = json.loads(line)
+				filters = {**base, **normalize_filters(record.get("filter"))}
+				items.append(BatchQuery(len(items), record["query"], filters, record.get("id")))
+			else:
+				items.append(BatchQuery(len(items), line, base))
+	return items
+
+
+async def _run(items: List[BatchQuery], user_id: str, concurrency: Optional[int], out) -> dict:
+	settings = get_settings()
+	memory = get_memory_manager()
+	case_type = memory.get_user_pref(user_id, "case_type")
+	gen = await asyncio.to_thread(get_corpus_registry().current)
+	stats: dict = {}
+	async for event, payload in answer_batch(
+		gen,
+		items,
+		model=settings.ollama_model,
+		user_id=user_id,
+		case_type=case_type,
+		history=memory.history(case_type),
+		cache=get_answer_cache(),
+		responses=get_response_store(),
+		batch_size=settings.query_batch_size,
+		concurrency=concurrency or settings.query_batch_concurrency,
+	):
+		if event == "stats":
+			stats = payload
+		else:
+			out.write(json.dumps({"event": event, **payload}) + "\n")
+			out.flush()
+	return stats
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser(description="Answer a file of queries against the data dir's corpus, writing NDJSON.")
+	parser.add_argument("path", type=Path, help="Text file with one query per line, or JSONL of {query, id, filter}")
+	parser.add_argument("--out", type=Path, default=None, help="Output NDJSON file (default: stdout)")
+	parser.add_argument("--user-id", default="default_user")
+	parser.add_argument("--filter", default=None, help='JSON filter for every query, e.g. \'{"court": "Delhi High Court"}\'')
+	parser.add_argument("--concurrency", type=int, default=None, help="Answers generated at once (default: QUERY_BATCH_CONCURRENCY)")
+	args = parser.parse_args()
+
+	settings = get_settings()
+	configure_logging(settings.log_level, settings.log_format)
+
+	items = _read(args.path, normalize_filters(json.loads(args.filter) if args.filter else None))
+	if args.out:
+		with open(args.out, "w", encoding="utf-8") as out:
+			stats = asyncio.run(_run(items, args.user_id, args.concurrency, out))
+	else:
+		stats = asyncio.run(_run(items, args.user_id, args.concurrency, sys.stdout))
+	print(json.dumps(stats, indent=2), file=sys.stderr if not args.out else sys.stdout)
+
+
+if __name__ == "__main__":
+	main()
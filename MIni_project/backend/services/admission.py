@@ -0,0 +1,219 @@
+from __future__ import annotations
+
+import asyncio
+import math
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from functools import lru_cache
+from typing import Any, AsyncIterator, Deque, Dict, Iterator, Optional, Sequence, Tuple
+
+from backend.core.settings import Settings
+from backend.services.metrics import Counter, Gauge
+
+
+GENERATE = "generate"
+EMBED = "embed"
+
+ADMISSION_QUEUED = Gauge("rag_admission_queued", "Calls waiting for an Ollama slot.", ["kind"])
+ADMISSION_SHED = Counter("rag_admission_shed_total", "Calls rejected by the admission controller.", ["kind", "reason"])
+BACKEND_IN_FLIGHT = Gauge("rag_backend_in_flight", "Calls running per Ollama backend.", ["kind", "backend"])
+
+
+class Overloaded(Exception):
+	"""Raised when a call is shed; the API turns it into ``status_code`` with a ``Retry-After`` header."""
+
+	def __init__(self, kind: str, status_code: int, retry_after: int, reason: str):
+		super().__init__(f"Ollama {kind} capacity exhausted ({reason}); retry in {retry_after}s")
+		self.kind = kind
+		self.status_code = status_code
+		self.retry_after = retry_after
+		self.reason = reason
+
+
+class RetrievalTimeout(TimeoutError):
+	pass
+
+
+class Backend:
+	def __init__(self, url: str, kinds: Sequence[str]):
+		self.url = url
+		self.in_flight: Dict[str, int] = {k: 0 for k in kinds}
+
+
+class _Waiter:
+	__slots__ = ("backend", "event", "future", "loop")
+
+	def __init__(self, future: Optional[asyncio.Future] = None, loop: Optional[asyncio.AbstractEventLoop] = None):
+		self.backend: Optional[Backend] = None
+		self.event = threading.Event() if future is None else None
+		self.future = future
+		self.loop = loop
+
+	def grant(self, backend: Backend) -> None:
+		self.backend = backend
+		if self.event is not None:
+			self.event.set()
+		else:
+			self.loop.call_soon_threadsafe(_resolve, self.future, backend)
+
+
+def _resolve(future: asyncio.Future, value: Any) -> None:
+	if not future.done():
+		future.set_result(value)
+
+
+class AdmissionController:
+	"""Bounds concurrent Ollama calls per backend and per kind (generation vs. embedding).
+
+	A call takes a slot on the least-loaded backend with room; otherwise it waits
+	in a FIFO queue of at most ``queue_size`` for up to ``timeout`` seconds. A
+	full queue sheds with 429, a wait that times out sheds with 503, and both
+	carry a ``retry_after`` estimated from how long slots are currently held.
+	Works from threads (``slot``) and from the event loop (``aslot``).
+	"""
+
+	def __init__(self, urls: Sequence[str], limits: Dict[str, int], queue_size: int, timeout: float):
+		self.backends = [Backend(u, list(limits)) for u in urls]
+		self.limits = {k: max(1, v) for k, v in limits.items()}
+		self.queue_size = max(0, queue_size)
+		self.timeout = timeout
+		self._lock = threading.Lock()
+		self._queues: Dict[str, Deque[_Waiter]] = {k: deque() for k in limits}
+		self._hold: Dict[str, float] = {k: 1.0 for k in limits}
+		for backend in self.backends:
+			for kind in limits:
+				BACKEND_IN_FLIGHT.set(0, kind=kind, backend=backend.url)
+
+	def _pick(self, kind: str) -> Optional[Backend]:
+		limit = self.limits[kind]
+		free = [b for b in self.backends if b.in_flight[kind] < limit]
+		return min(free, key=lambda b: (b.in_flight[kind], sum(b.in_flight.values())), default=None)
+
+	def _take(self, kind: str, backend: Backend) -> Backend:
+		backend.in_flight[kind] += 1
+		BACKEND_IN_FLIGHT.set(backend.in_flight[kind], kind=kind, backend=backend.url)
+		return backend
+
+	def _retry_after(self, kind: str) -> int:
+		capacity = self.limits[kind] * len(self.backends)
+		return max(1, math.ceil(self._hold[kind] * (len(self._queues[kind]) + 1) / capacity))
+
+	def _shed(self, kind: str, status_code: int, reason: str) -> Overloaded:
+		ADMISSION_SHED.inc(kind=kind, reason=reason)
+		return Overloaded(kind, status_code, self._retry_after(kind), reason)
+
+	def _enter(self, kind: str, waiter: _Waiter) -> Optional[Backend]:
+		with self._lock:
+			queue = self._queues[kind]
+			if not queue:
+				backend = self._pick(kind)
+				if backend is not None:
+					return self._take(kind, backend)
+			if len(queue) >= self.queue_size:
+				raise self._shed(kind, 429, "queue_full")
+			queue.append(waiter)
+			ADMISSION_QUEUED.set(len(queue), kind=kind)
+			return None
+
+	def _abandon(self, kind: str, waiter: _Waiter) -> Optional[Backend]:
+		"""Leave the queue after a timeout; returns the slot if it was granted in the meantime."""
+		with self._lock:
+			queue = self._queues[kind]
+			if waiter in queue:
+				queue.remove(waiter)
+				ADMISSION_QUEUED.set(len(queue), kind=kind)
+				return None
+			return waiter.backend
+
+	def release(self, kind: str, backend: Backend, held: float = 0.0) -> None:
+		with self._lock:
+			if held > 0:
+				self._hold[kind] = 0.8 * self._hold[kind] + 0.2 * held
+			queue = self._queues[kind]
+			if queue:
+				# Hand the slot straight to the oldest waiter; the backend's count is unchanged.
+				waiter = queue.popleft()
+				ADMISSION_QUEUED.set(len(queue), kind=kind)
+				waiter.grant(backend)
+				return
+			backend.in_flight[kind] -= 1
+			BACKEND_IN_FLIGHT.set(backend.in_flight[kind], kind=kind, backend=backend.url)
+
+	def acquire(self, kind: str) -> Backend:
+		waiter = _Waiter()
+		backend = self._enter(kind, waiter)
+		if backend is not None:
+			return backend
+		if waiter.event.wait(self.timeout):
+			return waiter.backend
+		backend = self._abandon(kind, waiter)
+		if backend is not None:
+			return backend
+		raise self._shed(kind, 503, "queue_timeout")
+
+	async def aacquire(self, kind: str) -> Backend:
+		loop = asyncio.get_running_loop()
+		waiter = _Waiter(loop.create_future(), loop)
+		backend = self._enter(kind, waiter)
+		if backend is not None:
+			return backend
+		try:
+			return await asyncio.wait_for(asyncio.shield(waiter.future), self.timeout)
+		except asyncio.TimeoutError:
+			backend = self._abandon(kind, waiter)
+			if backend is not None:
+				return backend
+			raise self._shed(kind, 503, "queue_timeout")
+		except asyncio.CancelledError:
+			backend = self._abandon(kind, waiter)
+			if backend is not None:
+				self.release(kind, backend)
+			raise
+
+	@contextmanager
+	def slot(self, kind: str) -> Iterator[Backend]:
+		backend = self.acquire(kind)
+		started = time.perf_counter()
+		try:
+			yield backend
+		finally:
+			self.release(kind, backend, time.perf_counter() - started)
+
+	@asynccontextmanager
+	async def aslot(self, kind: str) -> AsyncIterator[Backend]:
+		backend = await self.aacquire(kind)
+		started = time.perf_counter()
+		try:
+			yield backend
+		finally:
+			self.release(kind, backend, time.perf_counter() - started)
+
+	def stats(self) -> Dict[str, Any]:
+		with self._lock:
+			return {
+				"limits": dict(self.limits),
+				"queued": {k: len(q) for k, q in self._queues.items()},
+				"backends": [{"url": b.url, "in_flight": dict(b.in_flight)} for b in self.backends],
+			}
+
+
+def ollama_urls(settings: Settings) -> Tuple[str, ...]:
+	urls = [u.strip().rstrip("/") for u in (settings.ollama_base_urls or "").split(",") if u.strip()]
+	return tuple(urls or [settings.ollama_base_url.rstrip("/")])
+
+
+@lru_cache
+def _controller(urls: Tuple[str, ...], generate: int, embed: int, queue_size: int, timeout: float) -> AdmissionController:
+	return AdmissionController(urls, {GENERATE: generate, EMBED: embed}, queue_size, timeout)
+
+
+def get_admission_controller(settings: Settings) -> AdmissionController:
+	return _controller(
+		ollama_urls(settings),
+		settings.llm_max_concurrency,
+		settings.embed_max_concurrency,
+		settings.admission_queue_size,
+		settings.admission_timeout,
+	)
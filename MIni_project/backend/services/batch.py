@@ -0,0 +1,156 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Dict, List, Mapping, Optional, Sequence, Set, Tuple
+
+from backend.core.log import get_logger
+from backend.services.cache import AnswerCache
+from backend.services.metrics import Counter, timed
+from backend.services.partitions import preferred_partitions
+from backend.services.responses import ResponseRecord, ResponseStore, new_response_id
+
+
+log = get_logger(__name__)
+
+BATCH_QUERIES = Counter("rag_batch_queries_total", "Batch queries by outcome.", ["outcome"])
+
+Event = Tuple[str, Dict[str, Any]]
+
+
+@dataclass(frozen=True)
+class BatchQuery:
+	index: int
+	query: str
+	filters: Mapping[str, Tuple[str, ...]] = field(default_factory=dict)
+	id: Optional[str] = None
+
+
+def _ms(started: float) -> float:
+	return round((time.perf_counter() - started) * 1000, 1)
+
+
+async def answer_batch(
+	gen: Any,
+	queries: Sequence[BatchQuery],
+	*,
+	model: str,
+	user_id: str = "default_user",
+	case_type: Optional[str] = None,
+	history: Optional[List[Any]] = None,
+	cache: Optional[AnswerCache] = None,
+	responses: Optional[ResponseStore] = None,
+	batch_size: int = 64,
+	concurrency: int = 4,
+) -> AsyncIterator[Event]:
+	"""Answers ``queries`` on one corpus generation; yields a ``result`` or ``error`` event per
+	query in completion order, then ``stats``.
+
+	Queries are retrieved ``batch_size`` at a time with ``asearch_batch`` and answered with
+	at most ``concurrency`` generations in flight. Retrieval of the next batch waits for
+	a free slot, so it never runs far ahead of generation. Answer-cache hits (same keys
+	as ``/query``) skip both. A failed query becomes an ``error`` event and the rest go on.
+	"""
+	started = time.perf_counter()
+	queue: "asyncio.Queue[Event]" = asyncio.Queue()
+	slots = asyncio.Semaphore(max(1, concurrency))
+	tasks: Set[asyncio.Task] = set()
+	counts = {"ok": 0, "error": 0, "cache_hit": 0}
+
+	def key(item: BatchQuery) -> str:
+		return cache.key(item.query, case_type, model, gen.number, item.filters or None)
+
+	def result(item: BatchQuery, value: Dict[str, Any], cache_status: str, since: float) -> None:
+		response_id = new_response_id()
+		if responses is not None:
+			chunk_ids = [s["chunk_id"] for s in value["sources"]]
+			responses.put(ResponseRecord(response_id, item.query, user_id, gen.number, chunk_ids, value.get("context"), value["answer"]))
+		counts["ok"] += 1
+		counts["cache_hit"] += cache_status == "hit"
+		BATCH_QUERIES.inc(outcome="cache_hit" if cache_status == "hit" else "ok")
+		queue.put_nowait(("result", {
+			"index": item.index,
+			"id": item.id,
+			"query": item.query,
+			"answer": value["answer"],
+			"sources": value["sources"],
+			"response_id": response_id,
+			"cache": cache_status,
+			"ms": _ms(since),
+		}))
+
+	def failed(item: BatchQuery, exc: BaseException) -> None:
+		counts["error"] += 1
+		BATCH_QUERIES.inc(outcome="error")
+		queue.put_nowait(("error", {"index": item.index, "id": item.id, "query": item.query, "error": str(exc), "type": type(exc).__name__}))
+
+	async def generate(item: BatchQuery, hits: List[Any], since: float) -> None:
+		try:
+			value: Dict[str, Any] = {"sources": [], "context": None}
+			parts: List[str] = []
+			with timed("chain.batch_answer"):
+				async for chunk in gen.answer_chain.astream({"hits": hits, "query": item.query, "history": history or []}):
+					if "hits" in chunk:
+						value = {"sources": [h.to_source() for h in chunk["hits"]], "context": chunk["context"]}
+					if chunk.get("answer"):
+						parts.append(chunk["answer"])
+			value["answer"] = "".join(parts)
+			if cache is not None:
+				await asyncio.to_thread(cache.set, key(item), gen.number, value)
+			result(item, value, "miss", since)
+		except Exception as exc:
+			log.warning("query_batch.answer_failed", index=item.index, error=str(exc))
+			failed(item, exc)
+		finally:
+			slots.release()
+
+	async def produce() -> None:
+		for start in range(0, len(queries), batch_size):
+			part = queries[start:start + batch_size]
+			since = time.perf_counter()
+			# Queries of this part not yet reported or handed to a generation task.
+			left = {item.index: item for item in part}
+			try:
+				for item in part:
+					cached = await asyncio.to_thread(cache.get, key(item), gen.number) if cache is not None else None
+					if cached is not None:
+						result(left.pop(item.index), cached, "hit", since)
+				todo = list(left.values())
+				if not todo:
+					continue
+				found = await gen.retriever.asearch_batch(
+					[item.query for item in todo],
+					filters=[item.filters or None for item in todo],
+					prefers=[preferred_partitions(item.query, case_type) or None for item in todo],
+					batch_size=batch_size,
+				)
+				for item, hits in zip(todo, found):
+					await slots.acquire()
+					task = asyncio.create_task(generate(left.pop(item.index), hits, since))
+					tasks.add(task)
+					task.add_done_callback(tasks.discard)
+			except Exception as exc:
+				log.warning("query_batch.retrieval_failed", start=start, error=str(exc))
+				for item in left.values():
+					failed(item, exc)
+
+	producer = asyncio.create_task(produce())
+	try:
+		for _ in range(len(queries)):
+			yield await queue.get()
+	finally:
+		producer.cancel()
+		for task in list(tasks):
+			task.cancel()
+		await asyncio.gather(producer, *tasks, return_exceptions=True)
+	elapsed = time.perf_counter() - started
+	yield "stats", {
+		"queries": len(queries),
+		"answered": counts["ok"],
+		"errors": counts["error"],
+		"cache_hits": counts["cache_hit"],
+		"generation": gen.number,
+		"total_ms": round(elapsed * 1000, 1),
+		"queries_per_second": round(len(queries) / elapsed, 2) if elapsed else None,
+	}
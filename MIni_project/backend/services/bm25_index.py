@@ -0,0 +1,285 @@
+from __future__ import annotations
+
+import json
+import os
+import re
+import shutil
+import threading
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+TOKEN_RE = re.compile(r"\w+")
+MAX_TERM_LEN = 48
+
+_write_lock = threading.Lock()
+
+
+def tokenize(text: str) -> List[str]:
+	return [t for t in TOKEN_RE.findall(text.lower()) if len(t) <= MAX_TERM_LEN]
+
+
+class _Segment:
+	"""One immutable CSR block of postings for global doc ids ``start..start+docs``."""
+
+	def __init__(self, path: Path, start: int):
+		self.path = path
+		self.start = start
+		self.terms = np.load(path / "terms.npy", mmap_mode="r")
+		self.offsets = np.load(path / "offsets.npy", mmap_mode="r")
+		self.doc_ids = np.load(path / "doc_ids.npy", mmap_mode="r")
+		self.tfs = np.load(path / "tfs.npy", mmap_mode="r")
+		self.doc_len = np.load(path / "doc_len.npy", mmap_mode="r")
+
+	def postings(self, term: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+		i = int(np.searchsorted(self.terms, term))
+		if i >= len(self.terms) or self.terms[i] != term:
+			return None
+		a, b = int(self.offsets[i]), int(self.offsets[i + 1])
+		return self.doc_ids[a:b], self.tfs[a:b]
+
+
+def _write_segment(path: Path, terms: np.ndarray, offsets: np.ndarray, doc_ids: np.ndarray, tfs: np.ndarray, doc_len: np.ndarray) -> None:
+	tmp = path.with_name(path.name + ".tmp")
+	shutil.rmtree(tmp, ignore_errors=True)
+	tmp.mkdir(parents=True)
+	np.save(tmp / "terms.npy", terms)
+	np.save(tmp / "offsets.npy", offsets.astype(np.int64))
+	np.save(tmp / "doc_ids.npy", doc_ids.astype(np.int32))
+	np.save(tmp / "tfs.npy", tfs.astype(np.float32))
+	np.save(tmp / "doc_len.npy", doc_len.astype(np.int32))
+	os.replace(tmp, path)
+
+
+def _csr_from_triples(terms: np.ndarray, docs: np.ndarray, tfs: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+	if not len(terms):
+		return np.asarray([], dtype="<U1"), np.zeros(1, dtype=np.int64), docs, tfs
+	order = np.lexsort((docs, terms))
+	terms, docs, tfs = terms[order], docs[order], tfs[order]
+	uniq, first = np.unique(terms, return_index=True)
+	offsets = np.append(first, len(terms))
+	return uniq, offsets, docs, tfs
+
+
+def _match(ids: np.ndarray, seg: _Segment, doc_ids: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+	"""``(positions in ids, positions in doc_ids)`` of the docs both hold; both are ascending.
+
+	The shorter list is binary-searched in the longer one, so a small scope costs
+	O(scope log postings) however common the term is.
+	"""
+	lo, hi = np.searchsorted(ids, (seg.start, seg.start + len(seg.doc_len)))
+	local = ids[lo:hi] - seg.start
+	if not len(local):
+		return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+	if len(local) < len(doc_ids):
+		j = np.minimum(np.searchsorted(doc_ids, local), len(doc_ids) - 1)
+		hit = np.asarray(doc_ids[j]) == local
+		return lo + np.flatnonzero(hit), j[hit]
+	p = np.minimum(np.searchsorted(local, doc_ids), len(local) - 1)
+	hit = local[p] == doc_ids
+	return lo + p[hit], np.flatnonzero(hit)
+
+
+class BM25Index:
+	"""Append-only BM25 index stored as memory-mapped CSR segments.
+
+	Each ``add`` writes a new segment; collection statistics (N, avgdl, df) are
+	summed over segments at query time, so appends never rewrite old postings.
+	"""
+
+	def __init__(self, root: Path, k1: float = 1.5, b: float = 0.75):
+		self.root = root
+		self.k1 = k1
+		self.b = b
+		self.manifest_path = root / "manifest.json"
+		self.root.mkdir(parents=True, exist_ok=True)
+		self._load()
+
+	def _load(self) -> None:
+		# A writer in another process may merge and retire segments between reading the manifest and
+		# opening them; a missing segment means a newer manifest exists, so read it again.
+		for attempt in range(3):
+			manifest = self._read_manifest()
+			try:
+				segments = [_Segment(self.root / s["name"], s["start"]) for s in manifest["segments"]]
+				break
+			except FileNotFoundError:
+				if attempt == 2 or self._read_manifest() == manifest:
+					raise
+		self.manifest, self.segments = manifest, segments
+		if self.segments:
+			self.doc_len = np.concatenate([np.asarray(s.doc_len, dtype=np.float32) for s in self.segments])
+		else:
+			self.doc_len = np.zeros(0, dtype=np.float32)
+		self.avgdl = float(self.doc_len.mean()) if len(self.doc_len) else 0.0
+
+	def _read_manifest(self) -> Dict:
+		if not self.manifest_path.exists():
+			return {"segments": [], "count": 0, "next_segment": 1, "retired": []}
+		with open(self.manifest_path, "r", encoding="utf-8") as f:
+			return json.load(f)
+
+	def _write_manifest(self, manifest: Dict) -> None:
+		tmp = self.manifest_path.with_suffix(".json.tmp")
+		with open(tmp, "w", encoding="utf-8") as f:
+			json.dump(manifest, f)
+			f.flush()
+			os.fsync(f.fileno())
+		os.replace(tmp, self.manifest_path)
+
+	@property
+	def count(self) -> int:
+		return int(self.manifest["count"])
+
+	def add(self, texts: Sequence[str], start: int) -> int:
+		with _write_lock:
+			manifest = self._read_manifest()
+			skip = max(0, manifest["count"] - start)
+			texts = list(texts)[skip:]
+			if not texts:
+				return manifest["count"]
+			if start + skip != manifest["count"]:
+				raise ValueError(f"BM25 index holds {manifest['count']} docs, cannot append at {start + skip}")
+			self._collect(manifest)
+
+			terms: List[str] = []
+			docs: List[int] = []
+			tfs: List[int] = []
+			doc_len = np.zeros(len(texts), dtype=np.int32)
+			for local, text in enumerate(texts):
+				tokens = tokenize(text)
+				doc_len[local] = len(tokens)
+				for term, tf in Counter(tokens).items():
+					terms.append(term)
+					docs.append(local)
+					tfs.append(tf)
+			csr = _csr_from_triples(np.asarray(terms), np.asarray(docs, dtype=np.int32), np.asarray(tfs, dtype=np.float32))
+
+			name = f"seg-{manifest['next_segment']:06d}"
+			_write_segment(self.root / name, *csr, doc_len)
+			manifest["segments"].append({"name": name, "start": manifest["count"], "docs": len(texts)})
+			manifest["count"] += len(texts)
+			manifest["next_segment"] += 1
+			self._write_manifest(manifest)
+			# Binary-counter merging: fold the newest segment into its predecessor while it is at least as
+			# large, so sizes strictly decrease, there are O(log N) segments and postings are rewritten O(log N) times.
+			segments = manifest["segments"]
+			while len(segments) > 1 and segments[-1]["docs"] >= segments[-2]["docs"]:
+				self._merge_tail(manifest, 2)
+				segments = manifest["segments"]
+		self._load()
+		return self.count
+
+	def _merge_tail(self, manifest: Dict, n: int) -> None:
+		tail = manifest["segments"][-n:]
+		base = tail[0]["start"]
+		segments = [_Segment(self.root / s["name"], s["start"]) for s in tail]
+		terms = np.concatenate([np.repeat(np.asarray(s.terms), np.diff(s.offsets)) for s in segments])
+		docs = np.concatenate([np.asarray(s.doc_ids, dtype=np.int64) + (s.start - base) for s in segments])
+		tfs = np.concatenate([np.asarray(s.tfs) for s in segments])
+		doc_len = np.concatenate([np.asarray(s.doc_len) for s in segments])
+		csr = _csr_from_triples(terms, docs, tfs)
+		del segments
+
+		name = f"seg-{manifest['next_segment']:06d}"
+		_write_segment(self.root / name, *csr, doc_len)
+		merged = {"name": name, "start": base, "docs": sum(s["docs"] for s in tail)}
+		manifest["segments"] = manifest["segments"][:-n] + [merged]
+		manifest.setdefault("retired", []).extend(s["name"] for s in tail)
+		manifest["next_segment"] += 1
+		self._write_manifest(manifest)
+
+	def _collect(self, manifest: Dict) -> None:
+		"""Deletes segments retired by earlier ``add`` calls.
+
+		Merged segments stay on disk until the next ``add``, so a reader holding the
+		previous manifest can still open them; one that is later still (or on Windows,
+		where a mapped file cannot be removed) re-reads the manifest in ``_load``.
+		"""
+		keep = {s["name"] for s in manifest["segments"]}
+		retired = manifest.get("retired", [])
+		for path in self.root.glob("seg-*"):
+			if path.name not in keep:
+				shutil.rmtree(path, ignore_errors=True)
+		manifest["retired"] = [name for name in retired if (self.root / name).exists()]
+
+	def _weights(self, seg: _Segment, doc_ids: np.ndarray, tf: np.ndarray, idf: float, ids: Optional[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+		"""``(positions, weights)`` of one segment's postings of a term: positions are global doc
+		ids, or indexes into ``ids`` keeping only the postings of docs in ``ids``."""
+		if ids is None:
+			docs = np.asarray(doc_ids, dtype=np.int64) + seg.start
+			pos = docs
+		else:
+			pos, sel = _match(ids, seg, doc_ids)
+			docs = np.asarray(doc_ids[sel], dtype=np.int64) + seg.start
+			tf = tf[sel]
+		norm = self.k1 * (1.0 - self.b + self.b * self.doc_len[docs] / self.avgdl)
+		return pos, idf * tf * (self.k1 + 1.0) / (tf + norm)
+
+	def scores(self, query: str, ids: Optional[np.ndarray] = None) -> np.ndarray:
+		"""BM25 of every doc, or of the docs in ``ids`` (ascending global ids) aligned with ``ids``.
+
+		Scoped scores equal the corpus scores at those ids (N, avgdl and df stay corpus-wide)
+		but only the postings of docs in ``ids`` are weighed.
+		"""
+		n = len(self.doc_len)
+		scores = np.zeros(n if ids is None else len(ids), dtype=np.float32)
+		if not n or not len(scores):
+			return scores
+		# Sorted, so every process (and ``scores_batch``) adds the terms in the same order and rounds alike.
+		for term in sorted(set(tokenize(query))):
+			hits = [(seg, p) for seg in self.segments if (p := seg.postings(term)) is not None]
+			df = sum(len(p[0]) for _, p in hits)
+			if not df:
+				continue
+			idf = np.log1p((n - df + 0.5) / (df + 0.5))
+			for seg, (doc_ids, tf) in hits:
+				pos, weight = self._weights(seg, doc_ids, tf, idf, ids)
+				scores[pos] += weight
+		return scores
+
+	def scores_batch(self, queries: Sequence[str], ids: Optional[np.ndarray] = None) -> np.ndarray:
+		"""``scores`` for every query as a ``(len(queries), n or len(ids))`` matrix; postings and term
+		weights are read once per distinct term and added to every query row that contains it.
+
+		The matrix is dense, 4 bytes per query and doc, so callers bound ``len(queries)``.
+		"""
+		n = len(self.doc_len)
+		width = n if ids is None else len(ids)
+		scores = np.zeros((len(queries), width), dtype=np.float32)
+		if not n or not width:
+			return scores
+		rows: Dict[str, List[int]] = {}
+		for i, query in enumerate(queries):
+			for term in set(tokenize(query)):
+				rows.setdefault(term, []).append(i)
+		for term, qrows in sorted(rows.items()):
+			hits = [(seg, p) for seg in self.segments if (p := seg.postings(term)) is not None]
+			df = sum(len(p[0]) for _, p in hits)
+			if not df:
+				continue
+			idf = np.log1p((n - df + 0.5) / (df + 0.5))
+			# A common term shared by several queries is cheaper as one dense row added to each of them.
+			dense = np.zeros(width, dtype=np.float64) if len(qrows) > 1 and df * 8 > n else None
+			for seg, (doc_ids, tf) in hits:
+				pos, weight = self._weights(seg, doc_ids, tf, idf, ids)
+				if dense is not None:
+					dense[pos] = weight
+				else:
+					scores[np.asarray(qrows)[:, None], pos] += weight
+			if dense is not None:
+				for i in qrows:
+					scores[i] += dense
+		return scores
+
+	def search(self, query: str, k: int) -> List[Tuple[int, float]]:
+		scores = self.scores(query)
+		if not len(scores):
+			return []
+		k = min(k, len(scores))
+		top = np.argpartition(-scores, k - 1)[:k]
+		top = top[np.argsort(-scores[top])]
+		return [(int(i), float(scores[i])) for i in top if scores[i] > 0]
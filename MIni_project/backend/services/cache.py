@@ -0,0 +1,159 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Mapping, Optional, Sequence, Tuple
+
+try:
+	import redis  # type: ignore
+except Exception:  # pragma: no cover
+	redis = None  # type: ignore
+
+from backend.core.settings import Settings
+from backend.services.metrics import CACHE_REQUESTS
+
+
+_SPACE_RE = re.compile(r"\s+")
+LRU_KEY = "answers:lru"
+
+
+def normalize_query(query: str) -> str:
+	return _SPACE_RE.sub(" ", query).strip().rstrip("?!. ").lower()
+
+
+class AnswerCache:
+	"""LRU + TTL cache of generated answers, on Redis when reachable and in-process otherwise.
+
+	Keys embed the corpus generation, so an ingest makes every older entry
+	unreachable; in-process entries from older generations are also dropped
+	the first time a newer generation is seen. On Redis, the sorted set
+	``answers:lru`` scores each key by its last use; a write evicts the least
+	recently used keys beyond ``ANSWER_CACHE_SIZE``, shared by every process.
+	"""
+
+	def __init__(self, settings: Settings):
+		self.settings = settings
+		self.max_entries = settings.answer_cache_size
+		self.ttl = settings.answer_cache_ttl
+		self.client = self._init_client()
+		self.memory_store: "OrderedDict[str, Tuple[float, int, Dict[str, Any]]]" = OrderedDict()
+		self._lock = threading.Lock()
+		self._generation = 0
+		self.hits = 0
+		self.misses = 0
+
+	def _init_client(self):
+		if redis is None or self.settings.answer_cache_size <= 0:
+			return None
+		try:
+			client = redis.Redis(
+				host=self.settings.redis_host,
+				port=self.settings.redis_port,
+				db=0,
+				decode_responses=True,
+				socket_timeout=self.settings.answer_cache_redis_timeout,
+				socket_connect_timeout=self.settings.answer_cache_redis_timeout,
+			)
+			client.ping()
+			return client
+		except Exception:
+			return None
+
+	def key(
+		self,
+		query: str,
+		case_type: Optional[str],
+		model: str,
+		generation: int,
+		filters: Optional[Mapping[str, Sequence[str]]] = None,
+	) -> str:
+		parts = [normalize_query(query), case_type or "", model]
+		if filters:
+			parts.append(sorted((key, list(values)) for key, values in filters.items()))
+		raw = json.dumps(parts)
+		return f"answers:{generation}:{hashlib.sha256(raw.encode('utf-8')).hexdigest()}"
+
+	def _observe(self, generation: int) -> None:
+		if generation <= self._generation:
+			return
+		self._generation = generation
+		stale = [k for k, (_, gen, _) in self.memory_store.items() if gen < generation]
+		for k in stale:
+			del self.memory_store[k]
+
+	def get(self, key: str, generation: int) -> Optional[Dict[str, Any]]:
+		if self.max_entries <= 0:
+			return None
+		value: Optional[Dict[str, Any]] = None
+		if self.client:
+			try:
+				pipe = self.client.pipeline(transaction=False)
+				pipe.get(key)
+				pipe.zadd(LRU_KEY, {key: time.time()}, xx=True)
+				raw = pipe.execute()[0]
+				value = json.loads(raw) if raw else None
+			except Exception:
+				value = None
+		else:
+			with self._lock:
+				self._observe(generation)
+				entry = self.memory_store.get(key)
+				if entry is not None:
+					expires, _, stored = entry
+					if expires < time.monotonic():
+						del self.memory_store[key]
+					else:
+						self.memory_store.move_to_end(key)
+						value = stored
+		with self._lock:
+			if value is None:
+				self.misses += 1
+			else:
+				self.hits += 1
+		CACHE_REQUESTS.inc(cache="answer", result="miss" if value is None else "hit")
+		return value
+
+	def set(self, key: str, generation: int, value: Dict[str, Any]) -> None:
+		if self.max_entries <= 0:
+			return
+		if self.client:
+			try:
+				self._redis_set(key, value)
+				return
+			except Exception:
+				pass
+		with self._lock:
+			self._observe(generation)
+			if generation < self._generation:
+				return
+			self.memory_store[key] = (time.monotonic() + self.ttl, generation, value)
+			self.memory_store.move_to_end(key)
+			while len(self.memory_store) > self.max_entries:
+				self.memory_store.popitem(last=False)
+
+	def _redis_set(self, key: str, value: Dict[str, Any]) -> None:
+		now = time.time()
+		pipe = self.client.pipeline(transaction=False)
+		pipe.set(key, json.dumps(value), ex=self.ttl)
+		pipe.zadd(LRU_KEY, {key: now})
+		# Keys unused for a TTL have expired; drop them from the index too.
+		pipe.zremrangebyscore(LRU_KEY, "-inf", now - self.ttl)
+		pipe.zcard(LRU_KEY)
+		size = pipe.execute()[-1]
+		if size > self.max_entries:
+			evicted = [k for k, _ in self.client.zpopmin(LRU_KEY, size - self.max_entries)]
+			if evicted:
+				self.client.delete(*evicted)
+
+	def stats(self) -> Dict[str, Any]:
+		with self._lock:
+			return {
+				"backend": "redis" if self.client else "memory",
+				"entries": len(self.memory_store),
+				"hits": self.hits,
+				"misses": self.misses,
+			}
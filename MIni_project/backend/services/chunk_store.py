@@ -0,0 +1,319 @@
+from __future__ import annotations
+
+import bisect
+import json
+import mmap
+import os
+import pickle
+import shutil
+import threading
+import time
+from collections.abc import Sequence
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+try:
+	import fcntl  # type: ignore
+except ImportError:  # pragma: no cover - Windows
+	fcntl = None  # type: ignore
+	import msvcrt  # type: ignore
+
+
+class WriterLock:
+	"""Exclusive, re-entrant (per thread) lock shared by every process on the data dir."""
+
+	def __init__(self, path: Path):
+		self.path = path
+		self._thread_lock = threading.RLock()
+		self._depth = 0
+		self._fh = None
+
+	def _acquire_file(self) -> None:
+		self._fh = open(self.path, "a+b")
+		if fcntl is not None:
+			fcntl.flock(self._fh.fileno(), fcntl.LOCK_EX)
+			return
+		while True:
+			try:
+				self._fh.seek(0)
+				msvcrt.locking(self._fh.fileno(), msvcrt.LK_LOCK, 1)
+				return
+			except OSError:
+				time.sleep(0.05)
+
+	def _release_file(self) -> None:
+		if fcntl is not None:
+			fcntl.flock(self._fh.fileno(), fcntl.LOCK_UN)
+		else:
+			self._fh.seek(0)
+			msvcrt.locking(self._fh.fileno(), msvcrt.LK_UNLCK, 1)
+		self._fh.close()
+		self._fh = None
+
+	def __enter__(self) -> "WriterLock":
+		self._thread_lock.acquire()
+		if self._depth == 0:
+			try:
+				self._acquire_file()
+			except BaseException:
+				self._thread_lock.release()
+				raise
+		self._depth += 1
+		return self
+
+	def __exit__(self, *exc) -> None:
+		self._depth -= 1
+		if self._depth == 0:
+			self._release_file()
+		self._thread_lock.release()
+
+
+_locks: Dict[Path, WriterLock] = {}
+_locks_guard = threading.Lock()
+
+
+def _writer_lock(path: Path) -> WriterLock:
+	with _locks_guard:
+		lock = _locks.get(path)
+		if lock is None:
+			lock = _locks[path] = WriterLock(path)
+		return lock
+
+
+def _line_offsets(data: Any) -> np.ndarray:
+	"""Start offset of every line plus the end offset, found with one vectorised scan for ``\\n``."""
+	newlines = np.flatnonzero(np.frombuffer(data, dtype=np.uint8) == ord("\n"))
+	return np.concatenate([[0], newlines + 1]).astype(np.int64)
+
+
+def _segment_offsets(path: Path, data: Any = None) -> np.ndarray:
+	index = path.with_name(path.name + ".idx.npy")
+	if index.exists():
+		return np.load(index, mmap_mode="r")
+	# Segments written before offset sidecars existed.
+	if data is not None:
+		return _line_offsets(data)
+	with open(path, "rb") as f:
+		return _line_offsets(f.read())
+
+
+class _MappedSegment:
+	"""A segment file mapped read-only, with the byte offsets of its records."""
+
+	def __init__(self, path: Path, start: int, docs: int):
+		self.start = start
+		self.docs = docs
+		with open(path, "rb") as f:
+			self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+		self.offsets = _segment_offsets(path, self.data)
+		if len(self.offsets) < docs + 1:
+			raise ValueError(f"{path.name} holds {len(self.offsets) - 1} records, manifest expects {docs}")
+
+	def record(self, i: int) -> Dict[str, Any]:
+		return json.loads(self.data[int(self.offsets[i]):int(self.offsets[i + 1])])
+
+
+class ChunkView(Sequence):
+	"""Read-only ``Sequence[Document]`` over the segments listed in one manifest.
+
+	Segment files are memory-mapped, so every worker on a node shares the same
+	page cache instead of holding its own copy of the corpus; a ``Document`` is
+	only decoded when it is indexed.
+	"""
+
+	def __init__(self, root: Path, manifest: Dict[str, Any]):
+		self.manifest = manifest
+		self.segments = [_MappedSegment(root / s["name"], s["start"], s["docs"]) for s in manifest["segments"]]
+		self._starts = [seg.start for seg in self.segments]
+		self._count = int(manifest["count"])
+
+	@property
+	def generation(self) -> int:
+		return int(self.manifest["generation"])
+
+	def __len__(self) -> int:
+		return self._count
+
+	def __getitem__(self, i):
+		if isinstance(i, slice):
+			return [self[j] for j in range(*i.indices(self._count))]
+		i = int(i)
+		if i < 0:
+			i += self._count
+		if not 0 <= i < self._count:
+			raise IndexError(f"chunk {i} out of range for {self._count} chunks")
+		seg = self.segments[bisect.bisect_right(self._starts, i) - 1]
+		record = seg.record(i - seg.start)
+		return Document(page_content=record["text"], metadata=record["metadata"])
+
+
+class ChunkStore:
+	"""Chunk text + metadata as immutable JSONL segments listed in ``manifest.json``.
+
+	Segments are fully written under a temporary name and renamed into place
+	before the manifest is atomically replaced, so readers only ever see
+	complete segments. Writers serialise on ``writer()``. Segments are merged
+	like BM25 segments (the newest into its predecessor while it is at least as
+	large), so a view maps O(log N) files however many commits there were.
+	"""
+
+	def __init__(self, root: Path, legacy_pickle: Optional[Path] = None):
+		self.root = root
+		self.manifest_path = root / "manifest.json"
+		self.root.mkdir(parents=True, exist_ok=True)
+		self._lock = _writer_lock((root / ".writer.lock").resolve())
+		self._stat_cache: Tuple[Optional[Tuple[int, int, int]], Dict[str, Any]] = (None, {})
+		if legacy_pickle is not None and not self.manifest_path.exists() and legacy_pickle.exists():
+			self._import_legacy(legacy_pickle)
+
+	def _import_legacy(self, path: Path) -> None:
+		with self.writer():
+			if self.manifest_path.exists():
+				return
+			with open(path, "rb") as f:
+				docs = pickle.load(f)
+			self.append(docs)
+
+	def read_manifest(self) -> Dict[str, Any]:
+		try:
+			with open(self.manifest_path, "r", encoding="utf-8") as f:
+				return json.load(f)
+		except FileNotFoundError:
+			return {"generation": 0, "count": 0, "next_segment": 1, "segments": []}
+
+	def _write_manifest(self, manifest: Dict[str, Any]) -> None:
+		tmp = self.manifest_path.with_suffix(".json.tmp")
+		with open(tmp, "w", encoding="utf-8") as f:
+			json.dump(manifest, f)
+			f.flush()
+			os.fsync(f.fileno())
+		os.replace(tmp, self.manifest_path)
+
+	@property
+	def count(self) -> int:
+		return int(self.read_manifest()["count"])
+
+	@property
+	def generation(self) -> int:
+		"""Live generation; the manifest is only re-read when its inode, size or mtime changed."""
+		try:
+			st = os.stat(self.manifest_path)
+		except FileNotFoundError:
+			return 0
+		signature = (st.st_ino, st.st_size, st.st_mtime_ns)
+		cached_signature, manifest = self._stat_cache
+		if signature != cached_signature:
+			manifest = self.read_manifest()
+			self._stat_cache = (signature, manifest)
+		return int(manifest["generation"])
+
+	def writer(self) -> WriterLock:
+		return self._lock
+
+	def append(self, docs: List[Document], marks: Optional[Dict[str, Any]] = None) -> int:
+		"""Write ``docs`` as a new segment and return the global id of the first one.
+
+		``marks`` are stored in the same manifest write, so a caller can record what
+		it committed (e.g. an ingest job's page range) atomically with the chunks.
+		"""
+		with self.writer():
+			manifest = self.read_manifest()
+			start = manifest["count"]
+			if not docs:
+				return start
+			self._collect(manifest)
+			name = f"seg-{manifest['next_segment']:06d}.jsonl"
+			records = (json.dumps({"text": d.page_content, "metadata": d.metadata}, default=str).encode("utf-8") + b"\n" for d in docs)
+			self._write_segment(name, records, [])
+
+			manifest["segments"].append({"name": name, "start": start, "docs": len(docs)})
+			manifest["count"] = start + len(docs)
+			manifest["next_segment"] += 1
+			manifest["generation"] += 1
+			segments = manifest["segments"]
+			while len(segments) > 1 and segments[-1]["docs"] >= segments[-2]["docs"]:
+				self._merge_tail(manifest, 2)
+				segments = manifest["segments"]
+			if marks:
+				manifest.setdefault("marks", {}).update(marks)
+			self._write_manifest(manifest)
+			return start
+
+	def _write_segment(self, name: str, records: Iterator[bytes], sources: List[Path]) -> None:
+		"""Writes ``records`` (or, for a merge, the bytes of ``sources`` back to back) and their offsets sidecar."""
+		tmp = self.root / (name + ".tmp")
+		positions = [0]
+		with open(tmp, "wb") as f:
+			for record in records:
+				f.write(record)
+				positions.append(f.tell())
+			offsets = [np.asarray(positions, dtype=np.int64)]
+			for path in sources:
+				base = f.tell()
+				offsets.append(np.asarray(_segment_offsets(path)[1:], dtype=np.int64) + base)
+				with open(path, "rb") as src:
+					shutil.copyfileobj(src, f, 1 << 20)
+			f.flush()
+			os.fsync(f.fileno())
+		index_tmp = self.root / (name + ".idx.tmp.npy")
+		np.save(index_tmp, np.concatenate(offsets))
+		os.replace(index_tmp, self.root / (name + ".idx.npy"))
+		os.replace(tmp, self.root / name)
+
+	def _merge_tail(self, manifest: Dict[str, Any], n: int) -> None:
+		tail = manifest["segments"][-n:]
+		name = f"seg-{manifest['next_segment']:06d}.jsonl"
+		self._write_segment(name, iter(()), [self.root / s["name"] for s in tail])
+		merged = {"name": name, "start": tail[0]["start"], "docs": sum(s["docs"] for s in tail)}
+		manifest["segments"] = manifest["segments"][:-n] + [merged]
+		manifest.setdefault("retired", []).extend(s["name"] for s in tail)
+		manifest["next_segment"] += 1
+
+	def _collect(self, manifest: Dict[str, Any]) -> None:
+		"""Deletes segments merged by earlier appends; a view opened from an older manifest retries in ``open_view``."""
+		keep = {s["name"] for s in manifest["segments"]}
+		for path in self.root.glob("seg-*"):
+			if path.name.split(".", 1)[0] + ".jsonl" not in keep:
+				try:
+					path.unlink(missing_ok=True)
+				except OSError:
+					pass  # still mapped by a reader on Windows; retried on the next append
+		manifest["retired"] = [name for name in manifest.get("retired", []) if (self.root / name).exists()]
+
+	def marks(self) -> Dict[str, Any]:
+		return self.read_manifest().get("marks", {})
+
+	def clear_marks(self, *keys: str) -> None:
+		with self.writer():
+			manifest = self.read_manifest()
+			marks = manifest.get("marks", {})
+			if any(k in marks for k in keys):
+				for k in keys:
+					marks.pop(k, None)
+				self._write_manifest(manifest)
+
+	def iter_documents(self, manifest: Optional[Dict[str, Any]] = None) -> Iterator[Document]:
+		manifest = manifest or self.read_manifest()
+		for seg in manifest["segments"]:
+			with open(self.root / seg["name"], "r", encoding="utf-8") as f:
+				for line in f:
+					record = json.loads(line)
+					yield Document(page_content=record["text"], metadata=record["metadata"])
+
+	def load_documents(self) -> List[Document]:
+		return list(self.iter_documents())
+
+	def open_view(self, manifest: Optional[Dict[str, Any]] = None) -> ChunkView:
+		manifest = manifest or self.read_manifest()
+		for attempt in range(3):
+			try:
+				return ChunkView(self.root, manifest)
+			except FileNotFoundError:
+				# Merged away since ``manifest`` was read; the current manifest lists the same chunks.
+				latest = self.read_manifest()
+				if attempt == 2 or latest == manifest:
+					raise
+				manifest = latest
@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+import asyncio
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from backend.services.metrics import Counter
+
+
+COALESCED = Counter("rag_coalesced_requests_total", "Requests by coalescing role (leader computes, follower shares).", ["kind", "role"])
+
+
+class Broadcast:
+	"""One upstream async iterator pumped by a task and replayed to any number of subscribers.
+
+	Every chunk is kept until the stream ends, so a subscriber that joins late
+	first receives the prefix already emitted and then follows live. When the
+	last subscriber leaves before the end, the upstream is cancelled unless
+	``cancel_when_idle`` is False.
+	"""
+
+	def __init__(
+		self,
+		source: AsyncIterator[Any],
+		on_close: Callable[["Broadcast"], None] = lambda b: None,
+		cancel_when_idle: bool = True,
+	):
+		self.chunks: List[Any] = []
+		self.done = False
+		self.error: Optional[BaseException] = None
+		self.subscribers = 0
+		self.cancel_when_idle = cancel_when_idle
+		self._on_close = on_close
+		self._wake = asyncio.Event()
+		self._task = asyncio.create_task(self._pump(source))
+
+	def _notify(self) -> None:
+		wake, self._wake = self._wake, asyncio.Event()
+		wake.set()
+
+	async def _pump(self, source: AsyncIterator[Any]) -> None:
+		try:
+			async for chunk in source:
+				self.chunks.append(chunk)
+				self._notify()
+		except asyncio.CancelledError:
+			self.error = RuntimeError("Shared stream was cancelled")
+		except Exception as exc:
+			self.error = exc
+		finally:
+			self.done = True
+			self._on_close(self)
+			self._notify()
+			aclose = getattr(source, "aclose", None)
+			if aclose is not None:
+				await aclose()
+
+	async def subscribe(self) -> AsyncIterator[Any]:
+		self.subscribers += 1
+		i = 0
+		try:
+			while True:
+				wake = self._wake
+				if i < len(self.chunks):
+					yield self.chunks[i]
+					i += 1
+				elif self.done:
+					if self.error is not None:
+						raise self.error
+					return
+				else:
+					await wake.wait()
+		finally:
+			self.subscribers -= 1
+			if not self.subscribers and not self.done and self.cancel_when_idle:
+				self._on_close(self)
+				self._task.cancel()
+
+
+class Coalescer:
+	"""Single-flight execution of identical concurrent requests.
+
+	``run`` shares one awaited result between callers with the same key; the
+	computation runs as its own task, so a caller disconnecting does not cancel
+	it for the others. ``stream`` does the same for token streams via
+	``Broadcast``. Keys are dropped as soon as their computation finishes, so
+	only requests that overlap in time are merged.
+	"""
+
+	def __init__(self):
+		self._flights: Dict[str, asyncio.Task] = {}
+		self._streams: Dict[str, Broadcast] = {}
+
+	async def run(self, key: str, compute: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+		"""Returns ``(result, leader)``; ``leader`` is False when the result came from another request."""
+		task = self._flights.get(key)
+		leader = task is None
+		if leader:
+			task = asyncio.create_task(compute())
+			self._flights[key] = task
+			task.add_done_callback(lambda t: self._flights.pop(key, None) if self._flights.get(key) is t else None)
+		COALESCED.inc(kind="query", role="leader" if leader else "follower")
+		return await asyncio.shield(task), leader
+
+	def stream(self, key: str, start: Callable[[], AsyncIterator[Any]]) -> Tuple[AsyncIterator[Any], bool]:
+		"""Returns ``(subscription, leader)``; ``start`` is only called when no stream with ``key`` is live."""
+		broadcast = self._streams.get(key)
+		leader = broadcast is None
+		if leader:
+			broadcast = Broadcast(start(), lambda b: self._streams.pop(key, None) if self._streams.get(key) is b else None)
+			self._streams[key] = broadcast
+		COALESCED.inc(kind="stream", role="leader" if leader else "follower")
+		return broadcast.subscribe(), leader
+
+	def stats(self) -> Dict[str, int]:
+		return {"queries_in_flight": len(self._flights), "streams_in_flight": len(self._streams)}
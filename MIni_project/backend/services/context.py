@@ -0,0 +1,200 @@
+from __future__ import annotations
+
+import math
+import re
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, FrozenSet, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from backend.core.settings import Settings
+from backend.services.retrieval import Hit
+
+
+_WORD_RE = re.compile(r"\w+")
+MIN_OVERLAP = 20
+
+
+@dataclass(frozen=True)
+class Passage:
+	"""One or more adjacent chunks of the same page, merged into a single span of text."""
+
+	hits: Tuple[Hit, ...]
+	text: str
+
+	@property
+	def score(self) -> float:
+		return max(h.score for h in self.hits)
+
+	@property
+	def source(self) -> str:
+		return str(self.hits[0].document.metadata.get("source") or "")
+
+	@property
+	def page(self) -> Optional[int]:
+		return self.hits[0].document.metadata.get("page")
+
+
+@dataclass(frozen=True)
+class ContextPack:
+	text: str
+	hits: List[Hit]
+	passages: int
+	tokens: int
+
+
+def estimate_tokens(text: str, chars_per_token: float = 4.0) -> int:
+	return math.ceil(len(text) / chars_per_token)
+
+
+def join_overlapping(a: str, b: str) -> str:
+	"""Concatenate two consecutive splitter chunks, dropping the text ``b`` repeats from the end of ``a``."""
+	head = b[:MIN_OVERLAP]
+	pos = a.rfind(head, max(0, len(a) - len(b)))
+	while pos != -1:
+		tail = a[pos:]
+		if b.startswith(tail):
+			return a + b[len(tail):]
+		pos = a.rfind(head, 0, pos)
+	return a + "\n" + b
+
+
+def merge_adjacent(hits: Sequence[Hit]) -> List[Passage]:
+	"""Group hits whose chunk ids are consecutive on the same source page into passages."""
+	ordered = sorted(hits, key=lambda h: (str(h.document.metadata.get("source")), h.document.metadata.get("page") or 0, h.chunk_id))
+	passages: List[Passage] = []
+	run: List[Hit] = []
+	for hit in ordered:
+		prev = run[-1] if run else None
+		same_page = prev is not None and (
+			prev.document.metadata.get("source") == hit.document.metadata.get("source")
+			and prev.document.metadata.get("page") == hit.document.metadata.get("page")
+		)
+		if same_page and hit.chunk_id == prev.chunk_id + 1:
+			run.append(hit)
+			continue
+		if run:
+			passages.append(_passage(run))
+		run = [hit]
+	if run:
+		passages.append(_passage(run))
+	return passages
+
+
+def _passage(run: List[Hit]) -> Passage:
+	text = run[0].document.page_content
+	for hit in run[1:]:
+		text = join_overlapping(text, hit.document.page_content)
+	return Passage(hits=tuple(run), text=text)
+
+
+def _shingles(text: str, size: int = 3) -> FrozenSet[int]:
+	words = _WORD_RE.findall(text.lower())
+	if len(words) < size:
+		return frozenset([hash(tuple(words))])
+	return frozenset(hash(tuple(words[i:i + size])) for i in range(len(words) - size + 1))
+
+
+def _jaccard(a: FrozenSet[int], b: FrozenSet[int]) -> float:
+	if not a or not b:
+		return 0.0
+	return len(a & b) / len(a | b)
+
+
+class ContextPacker:
+	"""Turns ranked hits into a prompt context that fits ``budget`` tokens.
+
+	Adjacent chunks of a page are merged, passages whose word 3-shingles overlap
+	another selected passage by ``dedup_threshold`` (Jaccard) or more are dropped,
+	and the rest are picked by MMR: ``lambda_ * relevance - (1 - lambda_) *
+	max similarity to the passages already picked``. Similarity is the cosine of
+	the mean chunk embeddings when ``vectors`` can provide them, shingle Jaccard
+	otherwise. Passages are added in that order while they fit the budget.
+	"""
+
+	def __init__(
+		self,
+		budget: int,
+		lambda_: float = 0.7,
+		dedup_threshold: float = 0.8,
+		chars_per_token: float = 4.0,
+		vectors: Optional[Callable[[Sequence[int]], Optional[np.ndarray]]] = None,
+	):
+		self.budget = budget
+		self.lambda_ = lambda_
+		self.dedup_threshold = dedup_threshold
+		self.chars_per_token = chars_per_token
+		self.vectors = vectors
+
+	def _similarity(self, passages: List[Passage], shingles: List[FrozenSet[int]]) -> np.ndarray:
+		if self.vectors is not None:
+			rows = self.vectors([h.chunk_id for p in passages for h in p.hits])
+			if rows is not None:
+				means = np.zeros((len(passages), rows.shape[1]), dtype=np.float32)
+				i = 0
+				for j, p in enumerate(passages):
+					means[j] = rows[i:i + len(p.hits)].mean(axis=0)
+					i += len(p.hits)
+				norms = np.linalg.norm(means, axis=1, keepdims=True)
+				means /= np.where(norms == 0, 1.0, norms)
+				return means @ means.T
+		n = len(passages)
+		sim = np.eye(n, dtype=np.float32)
+		for a in range(n):
+			for b in range(a + 1, n):
+				sim[a, b] = sim[b, a] = _jaccard(shingles[a], shingles[b])
+		return sim
+
+	def _render(self, passage: Passage, n: int) -> str:
+		page = passage.page
+		label = f"{Path(passage.source).name}, p. {page + 1}" if page is not None else Path(passage.source).name
+		return f"[{n}] {label}\n{passage.text}"
+
+	def pack(self, hits: Sequence[Hit]) -> ContextPack:
+		passages = merge_adjacent(hits)
+		if not passages:
+			return ContextPack(text="", hits=[], passages=0, tokens=0)
+		shingles = [_shingles(p.text) for p in passages]
+		sim = self._similarity(passages, shingles)
+		scores = np.asarray([p.score for p in passages], dtype=np.float32)
+		span = float(scores.max() - scores.min())
+		relevance = (scores - scores.min()) / span if span else np.ones_like(scores)
+
+		remaining = list(range(len(passages)))
+		chosen: List[int] = []
+		blocks: List[str] = []
+		used = 0
+		while remaining:
+			if chosen:
+				redundancy = sim[np.ix_(remaining, chosen)].max(axis=1)
+			else:
+				redundancy = np.zeros(len(remaining), dtype=np.float32)
+			mmr = self.lambda_ * relevance[remaining] - (1 - self.lambda_) * redundancy
+			best = remaining.pop(int(np.argmax(mmr)))
+			if any(_jaccard(shingles[best], shingles[c]) >= self.dedup_threshold for c in chosen):
+				continue
+			block = self._render(passages[best], len(chosen) + 1)
+			tokens = estimate_tokens(block, self.chars_per_token)
+			if used + tokens > self.budget:
+				if chosen:
+					continue
+				# Never return an empty context: cut the best passage down to the budget.
+				block = block[: int(self.budget * self.chars_per_token)]
+				tokens = estimate_tokens(block, self.chars_per_token)
+			chosen.append(best)
+			blocks.append(block)
+			used += tokens
+
+		kept = [h for i in chosen for h in sorted(passages[i].hits, key=lambda h: -h.score)]
+		return ContextPack(text="\n\n".join(blocks), hits=kept, passages=len(chosen), tokens=used)
+
+
+def get_context_packer(settings: Settings, retriever: Optional[object] = None) -> ContextPacker:
+	return ContextPacker(
+		budget=settings.context_token_budget,
+		lambda_=settings.context_mmr_lambda,
+		dedup_threshold=settings.context_dedup_threshold,
+		chars_per_token=settings.context_chars_per_token,
+		vectors=getattr(retriever, "vectors", None),
+	)
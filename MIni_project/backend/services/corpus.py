@@ -0,0 +1,105 @@
+from __future__ import annotations
+
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Optional
+
+from backend.core.log import get_logger
+from backend.core.settings import Settings
+from backend.services.metrics import CORPUS_GENERATION, timed
+
+
+log = get_logger(__name__)
+
+
+@dataclass(frozen=True)
+class CorpusGeneration:
+	number: int
+	retriever: Any
+	query_chain: Any
+	stream_chain: Any
+	answer_chain: Any
+
+
+class CorpusRegistry:
+	"""Holds the live retriever/chains and swaps in a new generation after ingest.
+
+	Requests grab ``current()`` once and keep that object, so a swap never
+	affects a query that is already running. Rebuilds are debounced: one starts
+	at most every ``CORPUS_REFRESH_INTERVAL`` seconds and picks up every commit
+	made since, so an ingest committing page range after page range rebuilds the
+	retriever (and moves the answer cache to a new generation) once per interval.
+	"""
+
+	def __init__(self, settings: Settings):
+		self.settings = settings
+		self._current: Optional[CorpusGeneration] = None
+		self._build_lock = threading.Lock()
+		self._refresh_lock = threading.Lock()
+		self._refreshing = False
+		self._built_at = 0.0
+		# Retrieval and the chains pull in LangChain; import them when a registry is made, not with the app.
+		from backend.services.retrieval import get_chunk_store
+
+		self.store = get_chunk_store(settings.data_dir)
+
+	def _build(self) -> CorpusGeneration:
+		from backend.services.rag_chain import build_answer_chain, build_query_chain, build_stream_chain
+		from backend.services.retrieval import get_hybrid_retriever
+
+		# Read the number first: if the corpus changes mid-build the generation is already stale.
+		number = self.store.generation
+		retriever = get_hybrid_retriever(self.settings, self.settings.data_dir)
+		return CorpusGeneration(
+			number=number,
+			retriever=retriever,
+			query_chain=build_query_chain(self.settings, self.settings.data_dir, retriever=retriever),
+			stream_chain=build_stream_chain(self.settings, self.settings.data_dir, retriever=retriever),
+			answer_chain=build_answer_chain(self.settings, self.settings.data_dir, retriever=retriever),
+		)
+
+	@property
+	def generation(self) -> int:
+		return self._current.number if self._current else 0
+
+	def current(self) -> CorpusGeneration:
+		gen = self._current
+		if gen is None:
+			with self._build_lock:
+				if self._current is None:
+					with timed("corpus.build"):
+						self._current = self._build()
+					self._built_at = time.monotonic()
+					CORPUS_GENERATION.set(self._current.number)
+				return self._current
+		if gen.number != self.store.generation:
+			self.refresh_in_background()
+		return gen
+
+	def rebuild(self) -> CorpusGeneration:
+		with self._build_lock, timed("corpus.build"):
+			gen = self._build()
+			self._current = gen
+			self._built_at = time.monotonic()
+		CORPUS_GENERATION.set(gen.number)
+		log.info("corpus.swapped", generation=gen.number)
+		return gen
+
+	def refresh_in_background(self) -> None:
+		with self._refresh_lock:
+			if self._refreshing:
+				return
+			self._refreshing = True
+		threading.Thread(target=self._refresh, name="corpus-refresh", daemon=True).start()
+
+	def _refresh(self) -> None:
+		try:
+			while self._current is None or self._current.number != self.store.generation:
+				time.sleep(max(0.0, self._built_at + self.settings.corpus_refresh_interval - time.monotonic()))
+				self.rebuild()
+		except Exception:
+			log.exception("corpus.refresh_failed")
+		finally:
+			with self._refresh_lock:
+				self._refreshing = False
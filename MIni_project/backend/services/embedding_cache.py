@@ -0,0 +1,211 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from backend.services.metrics import CACHE_REQUESTS
+
+
+class EmbeddingCache:
+	"""SQLite table of vectors keyed by (embed model, sha256 of the chunk text)."""
+
+	def __init__(self, path: Path):
+		self.path = path
+		self.path.parent.mkdir(parents=True, exist_ok=True)
+		self._lock = threading.Lock()
+		self._conn = sqlite3.connect(str(path), check_same_thread=False, timeout=30)
+		self._conn.execute("PRAGMA journal_mode=WAL")
+		self._conn.execute("PRAGMA synchronous=NORMAL")
+		self._conn.execute(
+			"CREATE TABLE IF NOT EXISTS embeddings ("
+			"model TEXT NOT NULL, hash BLOB NOT NULL, vec BLOB NOT NULL, "
+			"PRIMARY KEY (model, hash)) WITHOUT ROWID"
+		)
+		self._conn.commit()
+
+	@staticmethod
+	def key(text: str) -> bytes:
+		return hashlib.sha256(text.encode("utf-8")).digest()
+
+	def get_many(self, model: str, keys: Sequence[bytes]) -> Dict[bytes, List[float]]:
+		found: Dict[bytes, List[float]] = {}
+		unique = list(dict.fromkeys(keys))
+		with self._lock:
+			for i in range(0, len(unique), 500):
+				part = unique[i:i + 500]
+				marks = ",".join("?" * len(part))
+				rows = self._conn.execute(
+					f"SELECT hash, vec FROM embeddings WHERE model = ? AND hash IN ({marks})", [model, *part]
+				).fetchall()
+				for h, vec in rows:
+					found[bytes(h)] = np.frombuffer(vec, dtype=np.float32).tolist()
+		return found
+
+	def put_many(self, model: str, items: Dict[bytes, Sequence[float]]) -> None:
+		if not items:
+			return
+		rows = [(model, h, np.asarray(v, dtype=np.float32).tobytes()) for h, v in items.items()]
+		with self._lock:
+			self._conn.executemany("INSERT OR REPLACE INTO embeddings (model, hash, vec) VALUES (?, ?, ?)", rows)
+			self._conn.commit()
+
+
+class CachedEmbeddings(Embeddings):
+	"""Serves repeated texts from ``EmbeddingCache`` and sends only misses to ``inner``.
+
+	Misses are embedded in batches of ``batch_size`` with at most ``concurrency``
+	batches in flight. Queries go to ``inner.embed_query`` (which may embed them
+	differently from documents) through an in-process LRU of ``query_cache_size``
+	entries, so query traffic never writes to the SQLite table.
+	"""
+
+	def __init__(
+		self,
+		inner: Embeddings,
+		model: str,
+		cache: EmbeddingCache,
+		batch_size: int = 64,
+		concurrency: int = 4,
+		query_cache_size: int = 1024,
+	):
+		self.inner = inner
+		self.model = model
+		self.cache = cache
+		self.batch_size = max(1, batch_size)
+		self.concurrency = max(1, concurrency)
+		self.query_cache_size = query_cache_size
+		self._queries: "OrderedDict[str, List[float]]" = OrderedDict()
+		self._query_lock = threading.Lock()
+		self._pool = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="embed")
+		self._stats_lock = threading.Lock()
+		self.hits = 0
+		self.misses = 0
+		self.embed_seconds = 0.0
+
+	def _record(self, hits: int, misses: int, seconds: float) -> None:
+		with self._stats_lock:
+			self.hits += hits
+			self.misses += misses
+			self.embed_seconds += seconds
+		if hits:
+			CACHE_REQUESTS.inc(hits, cache="embedding", result="hit")
+		if misses:
+			CACHE_REQUESTS.inc(misses, cache="embedding", result="miss")
+
+	def stats(self) -> Dict[str, Any]:
+		with self._stats_lock:
+			per_miss = self.embed_seconds / self.misses if self.misses else 0.0
+			return {
+				"model": self.model,
+				"hits": self.hits,
+				"misses": self.misses,
+				"embed_seconds": round(self.embed_seconds, 3),
+				"estimated_saved_seconds": round(self.hits * per_miss, 3),
+			}
+
+	def _split(self, texts: Sequence[str]):
+		keys = [EmbeddingCache.key(t) for t in texts]
+		found = self.cache.get_many(self.model, keys)
+		pending: Dict[bytes, str] = {}
+		for k, t in zip(keys, texts):
+			if k not in found:
+				pending.setdefault(k, t)
+		return keys, found, pending
+
+	def _batches(self, pending: Dict[bytes, str]):
+		items = list(pending.items())
+		return [items[i:i + self.batch_size] for i in range(0, len(items), self.batch_size)]
+
+	def _finish(self, keys: List[bytes], found: Dict[bytes, List[float]], fresh: Dict[bytes, List[float]], seconds: float) -> List[List[float]]:
+		self.cache.put_many(self.model, fresh)
+		found.update(fresh)
+		self._record(len(keys) - len(fresh), len(fresh), seconds)
+		return [found[k] for k in keys]
+
+	def embed_documents(self, texts: List[str]) -> List[List[float]]:
+		keys, found, pending = self._split(texts)
+		fresh: Dict[bytes, List[float]] = {}
+		started = time.perf_counter()
+		batches = self._batches(pending)
+		results = self._pool.map(lambda b: self.inner.embed_documents([t for _, t in b]), batches)
+		for batch, vectors in zip(batches, results):
+			fresh.update({k: v for (k, _), v in zip(batch, vectors)})
+		return self._finish(keys, found, fresh, time.perf_counter() - started if fresh else 0.0)
+
+	def _cached_query(self, text: str) -> Optional[List[float]]:
+		with self._query_lock:
+			vec = self._queries.get(text)
+			if vec is not None:
+				self._queries.move_to_end(text)
+		CACHE_REQUESTS.inc(cache="query_embedding", result="hit" if vec is not None else "miss")
+		return vec
+
+	def _remember_query(self, text: str, vec: List[float]) -> List[float]:
+		if self.query_cache_size > 0:
+			with self._query_lock:
+				self._queries[text] = vec
+				self._queries.move_to_end(text)
+				while len(self._queries) > self.query_cache_size:
+					self._queries.popitem(last=False)
+		return vec
+
+	def embed_query(self, text: str) -> List[float]:
+		vec = self._cached_query(text)
+		return vec if vec is not None else self._remember_query(text, self.inner.embed_query(text))
+
+	async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+		keys, found, pending = await asyncio.to_thread(self._split, texts)
+		fresh: Dict[bytes, List[float]] = {}
+		started = time.perf_counter()
+		sem = asyncio.Semaphore(self.concurrency)
+
+		async def run(batch):
+			async with sem:
+				vectors = await self.inner.aembed_documents([t for _, t in batch])
+			fresh.update({k: v for (k, _), v in zip(batch, vectors)})
+
+		await asyncio.gather(*(run(b) for b in self._batches(pending)))
+		seconds = time.perf_counter() - started if fresh else 0.0
+		return await asyncio.to_thread(self._finish, keys, found, fresh, seconds)
+
+	async def aembed_query(self, text: str) -> List[float]:
+		vec = self._cached_query(text)
+		return vec if vec is not None else self._remember_query(text, await self.inner.aembed_query(text))
+
+	def embed_queries(self, texts: List[str]) -> List[List[float]]:
+		"""``embed_query`` for many texts; misses go to ``inner.embed_queries`` in one call when it has one."""
+		found = {t: v for t in dict.fromkeys(texts) if (v := self._cached_query(t)) is not None}
+		misses = [t for t in dict.fromkeys(texts) if t not in found]
+		if misses:
+			batch = getattr(self.inner, "embed_queries", None)
+			vectors = batch(misses) if batch is not None else list(self._pool.map(self.inner.embed_query, misses))
+			found.update((t, self._remember_query(t, v)) for t, v in zip(misses, vectors))
+		return [found[t] for t in texts]
+
+	async def aembed_queries(self, texts: List[str]) -> List[List[float]]:
+		found = {t: v for t in dict.fromkeys(texts) if (v := self._cached_query(t)) is not None}
+		misses = [t for t in dict.fromkeys(texts) if t not in found]
+		if misses:
+			batch = getattr(self.inner, "aembed_queries", None)
+			if batch is not None:
+				vectors = await batch(misses)
+			else:
+				sem = asyncio.Semaphore(self.concurrency)
+
+				async def run(text: str) -> List[float]:
+					async with sem:
+						return await self.inner.aembed_query(text)
+
+				vectors = await asyncio.gather(*(run(t) for t in misses))
+			found.update((t, self._remember_query(t, v)) for t, v in zip(misses, vectors))
+		return [found[t] for t in texts]
@@ -0,0 +1,161 @@
+from __future__ import annotations
+
+import time
+import uuid
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, AsyncIterator, Dict, List, Optional, Sequence, Tuple
+
+from backend.core.log import get_logger
+from backend.core.settings import Settings
+from backend.services.coalesce import Broadcast
+from backend.services.metrics import Counter, timed
+from backend.services.responses import ResponseRecord, ResponseStore, new_response_id
+
+if TYPE_CHECKING:
+	from langchain_core.documents import Document
+
+
+log = get_logger(__name__)
+
+HEAL_JOBS = Counter("rag_heal_jobs_total", "Feedback heal jobs by candidate source and outcome.", ["mode", "outcome"])
+
+Event = Tuple[str, Dict[str, Any]]
+
+
+def expand_candidates(docs: Sequence[Document], chunk_ids: Sequence[int], radius: int) -> List[int]:
+	"""``chunk_ids`` plus up to ``radius`` neighbouring chunks on each side from the same source file."""
+	out = set()
+	for cid in chunk_ids:
+		if not 0 <= cid < len(docs):
+			continue
+		out.add(cid)
+		source = docs[cid].metadata.get("source")
+		for step in (-1, 1):
+			for d in range(1, radius + 1):
+				n = cid + step * d
+				if not 0 <= n < len(docs) or docs[n].metadata.get("source") != source:
+					break
+				out.add(n)
+	return sorted(out)
+
+
+class HealJob:
+	def __init__(self, query: str, user_id: str, response_id: Optional[str], mode: str = "retrieved"):
+		self.id = uuid.uuid4().hex
+		self.query = query
+		self.user_id = user_id
+		self.response_id = response_id
+		self.mode = mode
+		self.status = "running"
+		self.sources: List[Dict[str, Any]] = []
+		self.parts: List[str] = []
+		self.healed_response_id: Optional[str] = None
+		self.error: Optional[str] = None
+		self.created_at = self.updated_at = time.time()
+		self.broadcast: Optional[Broadcast] = None
+
+	@property
+	def answer(self) -> str:
+		return "".join(self.parts)
+
+	def apply(self, event: str, payload: Dict[str, Any]) -> None:
+		if event == "sources":
+			self.sources = payload["sources"]
+			self.healed_response_id = payload["response_id"]
+		elif event == "token":
+			self.parts.append(payload["text"])
+		elif event == "done":
+			self.status = "done"
+		elif event == "error":
+			self.status = "failed"
+			self.error = payload["error"]
+		self.updated_at = time.time()
+
+	def to_dict(self) -> Dict[str, Any]:
+		return {
+			"id": self.id,
+			"status": self.status,
+			"mode": self.mode,
+			"query": self.query,
+			"response_id": self.response_id,
+			"healed_response_id": self.healed_response_id,
+			"answer": self.answer,
+			"sources": self.sources,
+			"error": self.error,
+			"created_at": self.created_at,
+			"updated_at": self.updated_at,
+		}
+
+
+class HealJobs:
+	"""Feedback heals running in the background on the event loop.
+
+	Each job's events go through a ``Broadcast`` that keeps running with no
+	listeners, so a client can poll ``get`` or follow the stream from the start
+	at any time. The ``max_entries`` most recent jobs are kept.
+	"""
+
+	def __init__(self, max_entries: int):
+		self.max_entries = max(1, max_entries)
+		self._jobs: "OrderedDict[str, HealJob]" = OrderedDict()
+
+	def start(self, job: HealJob, events: AsyncIterator[Event]) -> HealJob:
+		job.broadcast = Broadcast(self._track(job, events), cancel_when_idle=False)
+		self._jobs[job.id] = job
+		while len(self._jobs) > self.max_entries:
+			self._jobs.popitem(last=False)
+		return job
+
+	async def _track(self, job: HealJob, events: AsyncIterator[Event]) -> AsyncIterator[Event]:
+		try:
+			async for event, payload in events:
+				job.apply(event, payload)
+				yield event, payload
+		except Exception as exc:
+			log.exception("heal.failed", heal_id=job.id)
+			payload = {"error": str(exc), "type": type(exc).__name__}
+			job.apply("error", payload)
+			yield "error", payload
+		HEAL_JOBS.inc(mode=job.mode, outcome=job.status)
+
+	def get(self, job_id: str) -> Optional[HealJob]:
+		return self._jobs.get(job_id)
+
+	def stats(self) -> Dict[str, int]:
+		return {"jobs": len(self._jobs), "running": sum(1 for j in self._jobs.values() if j.status == "running")}
+
+
+async def heal_events(
+	job: HealJob,
+	record: Optional[ResponseRecord],
+	gen: Any,
+	history: Any,
+	settings: Settings,
+	responses: ResponseStore,
+) -> AsyncIterator[Event]:
+	"""Answers ``job.query`` again and yields ``sources``, ``token``... and ``done``.
+
+	With the original response's ``record``, its chunks and their neighbours are
+	rescored for the healed query (up to ``HEAL_K`` hits) instead of searching the
+	corpus again; without one, it falls back to a normal retrieval.
+	"""
+	started = time.perf_counter()
+	with timed("heal.retrieval"):
+		if record is not None:
+			ids = expand_candidates(gen.retriever.docs, record.chunk_ids, settings.heal_neighbours)
+			hits = await gen.retriever.arescore(job.query, ids, settings.heal_k)
+		else:
+			hits = await gen.retriever.asearch(job.query, settings.heal_k)
+
+	response_id = new_response_id()
+	parts: List[str] = []
+	async for chunk in gen.answer_chain.astream({"hits": hits, "query": job.query, "history": history}):
+		if "hits" in chunk:
+			chunk_ids = [h.chunk_id for h in chunk["hits"]]
+			responses.put(ResponseRecord(response_id, job.query, job.user_id, gen.number, chunk_ids, chunk["context"]))
+			yield "sources", {"sources": [h.to_source() for h in chunk["hits"]], "response_id": response_id}
+		if chunk.get("answer"):
+			parts.append(chunk["answer"])
+			yield "token", {"text": chunk["answer"]}
+	responses.set_answer(response_id, "".join(parts))
+	yield "done", {"response_id": response_id, "total_ms": round((time.perf_counter() - started) * 1000, 1)}
@@ -0,0 +1,278 @@
+from __future__ import annotations
+
+import json
+import multiprocessing
+import sqlite3
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, TimeoutError as FutureTimeout
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from backend.core.log import get_logger
+from backend.core.settings import Settings
+from backend.services.metrics import INGEST_CHUNKS, INGEST_PAGES, timed
+
+
+LEASE_SECONDS = 120
+HEARTBEAT_SECONDS = 30
+PAGE_BATCH = 16
+SWEEP_SECONDS = 600
+
+log = get_logger(__name__)
+
+_COLUMNS = (
+	"id", "filename", "path", "status", "pages_total", "pages_parsed", "chunks", "chunks_embedded",
+	"result", "error", "created_at", "updated_at",
+)
+
+
+class IngestJobQueue:
+	"""Durable ingest queue in ``jobs.sqlite`` drained by a pool of worker threads.
+
+	Jobs are claimed with a lease that the worker keeps extending; a job whose
+	lease expired (its worker died, or the server restarted) is picked up again
+	from its last committed page. PDFs are parsed in ``PAGE_BATCH`` page ranges
+	on a process pool with a bounded number of ranges in flight, and each range
+	is embedded and committed as soon as it is parsed. Every commit also records
+	the job's progress in the chunk manifest, so a resumed job never commits a
+	range twice. The uploaded file is deleted once the job is done. A failed job
+	keeps its upload for ``INGEST_FAILED_TTL`` seconds, during which ``retry``
+	queues it again from its last committed page; after that the upload is swept.
+	"""
+
+	def __init__(self, settings: Settings, on_commit: Optional[Callable[[], None]] = None):
+		self.settings = settings
+		self.on_commit = on_commit
+		self.path = settings.data_dir.resolve() / "jobs.sqlite"
+		self._lock = threading.Lock()
+		self._conn = sqlite3.connect(str(self.path), check_same_thread=False, timeout=30)
+		self._conn.row_factory = sqlite3.Row
+		self._conn.execute("PRAGMA journal_mode=WAL")
+		self._conn.execute(
+			"CREATE TABLE IF NOT EXISTS jobs ("
+			"id TEXT PRIMARY KEY, filename TEXT, path TEXT, status TEXT, "
+			"pages_parsed INTEGER DEFAULT 0, chunks INTEGER DEFAULT 0, chunks_embedded INTEGER DEFAULT 0, "
+			"result TEXT, error TEXT, created_at REAL, updated_at REAL, lease_until REAL DEFAULT 0)"
+		)
+		for column in ("pages_total", "pages_committed"):
+			try:
+				self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} INTEGER DEFAULT 0")
+			except sqlite3.OperationalError:
+				pass
+		self._conn.commit()
+		self._wake = threading.Event()
+		self._stop = threading.Event()
+		self._threads: List[threading.Thread] = []
+		self._procs: Optional[ProcessPoolExecutor] = None
+		self._swept = 0.0
+
+	def start(self) -> None:
+		if self._threads:
+			return
+		self._stop.clear()
+		# Forking this multithreaded process could copy a lock held by another thread into the child.
+		self._procs = ProcessPoolExecutor(
+			max_workers=max(1, self.settings.ingest_processes), mp_context=multiprocessing.get_context("spawn")
+		)
+		for i in range(max(1, self.settings.ingest_workers)):
+			t = threading.Thread(target=self._run, name=f"ingest-worker-{i}", daemon=True)
+			t.start()
+			self._threads.append(t)
+
+	def stop(self) -> None:
+		self._stop.set()
+		self._wake.set()
+		for t in self._threads:
+			t.join(timeout=5)
+		self._threads = []
+		if self._procs is not None:
+			self._procs.shutdown(wait=False, cancel_futures=True)
+			self._procs = None
+
+	def _execute(self, sql: str, params: tuple = ()) -> sqlite3.Cursor:
+		with self._lock:
+			cur = self._conn.execute(sql, params)
+			self._conn.commit()
+			return cur
+
+	def submit(self, filename: str, path: Path, job_id: Optional[str] = None) -> str:
+		job_id = job_id or uuid.uuid4().hex
+		now = time.time()
+		self._execute(
+			"INSERT INTO jobs (id, filename, path, status, created_at, updated_at) VALUES (?, ?, ?, 'queued', ?, ?)",
+			(job_id, filename, str(path), now, now),
+		)
+		self._wake.set()
+		return job_id
+
+	def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+		with self._lock:
+			row = self._conn.execute(f"SELECT {', '.join(_COLUMNS)} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+		if row is None:
+			return None
+		job = dict(row)
+		job["result"] = json.loads(job["result"]) if job["result"] else None
+		return job
+
+	def retry(self, job_id: str) -> Optional[Dict[str, Any]]:
+		"""Queues a failed job again; it resumes from its last committed page.
+
+		Returns the job, or None when it does not exist. Raises ``ValueError`` when the
+		job has not failed or its upload was already swept.
+		"""
+		job = self.get(job_id)
+		if job is None:
+			return None
+		if job["status"] != "failed":
+			raise ValueError(f"Job {job_id} is {job['status']}, only failed jobs can be retried")
+		if not Path(job["path"]).exists():
+			raise ValueError(f"The upload of job {job_id} has expired; upload the file again")
+		self._execute(
+			"UPDATE jobs SET status = 'queued', error = NULL, updated_at = ? WHERE id = ? AND status = 'failed'",
+			(time.time(), job_id),
+		)
+		self._wake.set()
+		return self.get(job_id)
+
+	def sweep(self) -> int:
+		"""Deletes the uploads of jobs that failed more than ``INGEST_FAILED_TTL`` seconds ago."""
+		cutoff = time.time() - self.settings.ingest_failed_ttl
+		with self._lock:
+			rows = self._conn.execute("SELECT path FROM jobs WHERE status = 'failed' AND updated_at < ?", (cutoff,)).fetchall()
+		swept = 0
+		for row in rows:
+			if row["path"] and Path(row["path"]).exists():
+				self._discard(row["path"])
+				swept += 1
+		if swept:
+			log.info("ingest.uploads_swept", count=swept)
+		return swept
+
+	def depth(self) -> int:
+		with self._lock:
+			return self._conn.execute("SELECT COUNT(*) FROM jobs WHERE status IN ('queued', 'running')").fetchone()[0]
+
+	def _update(self, job_id: str, **fields: Any) -> None:
+		fields["updated_at"] = time.time()
+		if fields.get("status") == "running" or "pages_parsed" in fields:
+			fields["lease_until"] = fields["updated_at"] + LEASE_SECONDS
+		cols = ", ".join(f"{k} = ?" for k in fields)
+		self._execute(f"UPDATE jobs SET {cols} WHERE id = ?", (*fields.values(), job_id))
+
+	def _claim(self) -> Optional[Dict[str, Any]]:
+		now = time.time()
+		with self._lock:
+			row = self._conn.execute(
+				"SELECT id, path, pages_committed, chunks, chunks_embedded, result FROM jobs "
+				"WHERE status = 'queued' OR (status = 'running' AND lease_until < ?) ORDER BY created_at LIMIT 1",
+				(now,),
+			).fetchone()
+			if row is None:
+				return None
+			cur = self._conn.execute(
+				"UPDATE jobs SET status = 'running', lease_until = ?, updated_at = ? "
+				"WHERE id = ? AND (status = 'queued' OR (status = 'running' AND lease_until < ?))",
+				(now + LEASE_SECONDS, now, row["id"], now),
+			)
+			self._conn.commit()
+			return dict(row) if cur.rowcount == 1 else None
+
+	def _run(self) -> None:
+		while not self._stop.is_set():
+			job = self._claim()
+			if job is None:
+				if time.time() - self._swept > SWEEP_SECONDS:
+					self._swept = time.time()
+					self.sweep()
+				self._wake.wait(timeout=2.0)
+				self._wake.clear()
+				continue
+			try:
+				with timed("ingest.job"):
+					self._process(job)
+			except Exception as exc:
+				log.exception("ingest.job_failed", job_id=job["id"])
+				self._update(job["id"], status="failed", error=str(exc))
+				continue
+			self._discard(job["path"])
+
+	def _discard(self, path: str) -> None:
+		try:
+			Path(path).unlink(missing_ok=True)
+		except OSError as exc:
+			log.warning("ingest.upload_not_deleted", path=path, error=str(exc))
+
+	def _wait(self, job_id: str, future: Future) -> Any:
+		while True:
+			try:
+				return future.result(timeout=HEARTBEAT_SECONDS)
+			except FutureTimeout:
+				self._update(job_id, status="running")
+
+	def _process(self, job: Dict[str, Any]) -> None:
+		from backend.services.retrieval import chunk_pdf_pages, commit_chunks, count_pdf_pages, embed_documents, get_chunk_store
+
+		job_id, path = job["id"], job["path"]
+		store = get_chunk_store(self.settings.data_dir)
+		mark_key = f"ingest_job:{job_id}"
+		manifest = store.read_manifest()
+		mark = manifest.get("marks", {}).get(mark_key)
+		if mark and mark["pages_committed"] > job["pages_committed"]:
+			# The last range reached the chunk store but the worker died before recording it here.
+			resumed = {k: mark[k] for k in ("pages_committed", "chunks", "chunks_embedded")}
+			resumed["result"] = json.dumps({"chunks": mark["chunks"], "vectordb_saved": mark["vectordb_saved"], "bm25_docs": manifest["count"]})
+			self._update(job_id, **resumed)
+			job = {**job, **resumed}
+		total_pages = count_pdf_pages(path)
+		self._update(job_id, pages_total=total_pages)
+		ranges = iter([(p, min(p + PAGE_BATCH, total_pages)) for p in range(job["pages_committed"], total_pages, PAGE_BATCH)])
+		inflight: deque = deque()
+
+		def fill() -> None:
+			while len(inflight) < max(1, self.settings.ingest_processes):
+				page_range = next(ranges, None)
+				if page_range is None:
+					return
+				inflight.append((page_range, self._procs.submit(chunk_pdf_pages, path, *page_range)))
+
+		previous = json.loads(job["result"]) if job["result"] else {}
+		# ``chunks`` in the row also counts a range parsed but never committed; ``result`` has the committed count.
+		chunks, embedded = previous.get("chunks", 0), job["chunks_embedded"]
+		vectordb_saved = previous.get("vectordb_saved", True)
+		total = previous.get("bm25_docs", 0)
+		fill()
+		while inflight:
+			(start, stop), future = inflight.popleft()
+			with timed("ingest.parse_wait"):
+				docs = self._wait(job_id, future)
+			fill()
+			self._update(job_id, pages_parsed=stop, chunks=chunks + len(docs))
+
+			vectors: Optional[List[List[float]]] = []
+			try:
+				with timed("ingest.embed"):
+					vectors = embed_documents(docs, self.settings) if docs else []
+			except Exception as exc:
+				log.warning("ingest.embed_failed", job_id=job_id, error=str(exc))
+				vectors = None
+				vectordb_saved = False
+
+			chunks += len(docs)
+			embedded += len(vectors or [])
+			if docs:
+				mark = {"pages_committed": stop, "chunks": chunks, "chunks_embedded": embedded, "vectordb_saved": vectordb_saved}
+				_, total = commit_chunks(docs, self.settings, self.settings.data_dir, vectors, marks={mark_key: mark})
+			INGEST_PAGES.inc(stop - start)
+			INGEST_CHUNKS.inc(len(docs))
+			log.debug("ingest.range_committed", job_id=job_id, pages=f"{start}-{stop}", chunks=len(docs), total=total)
+			partial = {"chunks": chunks, "vectordb_saved": vectordb_saved, "bm25_docs": total}
+			self._update(job_id, pages_committed=stop, chunks_embedded=embedded, result=json.dumps(partial))
+			if docs and self.on_commit is not None:
+				self.on_commit()
+
+		self._update(job_id, status="done", pages_parsed=total_pages)
+		store.clear_marks(mark_key)
+		log.info("ingest.job_done", job_id=job_id, pages=total_pages, chunks=chunks, embedded=embedded)
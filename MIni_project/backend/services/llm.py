@@ -1,24 +1,205 @@
 from __future__ import annotations
 
+import threading
+import time
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, Iterator, List, Tuple
+from uuid import UUID
+
+import httpx
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.embeddings import Embeddings
+from langchain_core.outputs import ChatGenerationChunk, ChatResult
 from langchain_ollama import ChatOllama
 from langchain_ollama import OllamaEmbeddings
+from pydantic import Field
 
 from backend.core.settings import Settings
+from backend.services.admission import EMBED, GENERATE, AdmissionController, get_admission_controller, ollama_urls
+from backend.services.embedding_cache import CachedEmbeddings, EmbeddingCache
+from backend.services.metrics import LLM_CALLS, LLM_IN_FLIGHT, LLM_TOKENS_PER_SECOND, LLM_TTFT_SECONDS, STAGE_SECONDS
 
 
-def get_chat_model(settings: Settings) -> ChatOllama:
-	return ChatOllama(
-		model=settings.ollama_model,
-		base_url=settings.ollama_base_url,
+class LLMTimingHandler(BaseCallbackHandler):
+	"""Records in-flight calls, time to first token and token rate for every chat model call."""
+
+	run_inline = True
+
+	def __init__(self):
+		self._runs: Dict[UUID, List[Any]] = {}
+		self._lock = threading.Lock()
+
+	def on_chat_model_start(self, serialized: Dict[str, Any], messages: Any, *, run_id: UUID, **kwargs: Any) -> None:
+		self.on_llm_start(serialized, [], run_id=run_id)
+
+	def on_llm_start(self, serialized: Dict[str, Any], prompts: List[str], *, run_id: UUID, **kwargs: Any) -> None:
+		with self._lock:
+			# [started, first token at, tokens]
+			self._runs[run_id] = [time.perf_counter(), None, 0]
+		LLM_IN_FLIGHT.inc()
+
+	def on_llm_new_token(self, token: str, *, run_id: UUID, **kwargs: Any) -> None:
+		with self._lock:
+			run = self._runs.get(run_id)
+			if run is None:
+				return
+			if run[1] is None:
+				run[1] = time.perf_counter()
+				LLM_TTFT_SECONDS.observe(run[1] - run[0])
+			run[2] += 1
+
+	def _finish(self, run_id: UUID, outcome: str) -> None:
+		with self._lock:
+			run = self._runs.pop(run_id, None)
+		if run is None:
+			return
+		LLM_IN_FLIGHT.dec()
+		LLM_CALLS.inc(outcome=outcome)
+		now = time.perf_counter()
+		STAGE_SECONDS.observe(now - run[0], stage="llm.generate")
+		if run[1] is not None and run[2] > 1 and now > run[1]:
+			LLM_TOKENS_PER_SECOND.observe((run[2] - 1) / (now - run[1]))
+
+	def on_llm_end(self, response: Any, *, run_id: UUID, **kwargs: Any) -> None:
+		self._finish(run_id, "ok")
+
+	def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+		self._finish(run_id, "error")
+
+
+LLM_TIMING = LLMTimingHandler()
+
+
+def _client_kwargs(pool_size: int, keepalive_expiry: float, timeout: float) -> Dict[str, Any]:
+	return {
+		"timeout": timeout,
+		"limits": httpx.Limits(
+			max_connections=pool_size,
+			max_keepalive_connections=pool_size,
+			keepalive_expiry=keepalive_expiry,
+		),
+	}
+
+
+class RoutedChatOllama(ChatOllama):
+	"""ChatOllama that runs every call on the backend granted by the admission controller.
+
+	``routes`` holds one pooled ChatOllama per base URL; the slot is held until the
+	call (or the stream) finishes, so in-flight counts match what Ollama is doing.
+	"""
+
+	routes: Dict[str, Any] = Field(default_factory=dict, exclude=True)
+	admission: Any = Field(default=None, exclude=True)
+
+	def _generate(self, messages, stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+		with self.admission.slot(GENERATE) as backend:
+			return self.routes[backend.url]._generate(messages, stop, run_manager, **kwargs)
+
+	async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+		async with self.admission.aslot(GENERATE) as backend:
+			return await self.routes[backend.url]._agenerate(messages, stop, run_manager, **kwargs)
+
+	def _stream(self, messages, stop=None, run_manager=None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+		with self.admission.slot(GENERATE) as backend:
+			yield from self.routes[backend.url]._stream(messages, stop, run_manager, **kwargs)
+
+	async def _astream(self, messages, stop=None, run_manager=None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+		async with self.admission.aslot(GENERATE) as backend:
+			async for chunk in self.routes[backend.url]._astream(messages, stop, run_manager, **kwargs):
+				yield chunk
+
+
+class RoutedEmbeddings(Embeddings):
+	"""Embeddings spread over pooled per-backend OllamaEmbeddings under the admission controller."""
+
+	def __init__(self, routes: Dict[str, OllamaEmbeddings], admission: AdmissionController):
+		self.routes = routes
+		self.admission = admission
+
+	def embed_documents(self, texts: List[str]) -> List[List[float]]:
+		with self.admission.slot(EMBED) as backend:
+			return self.routes[backend.url].embed_documents(texts)
+
+	def embed_query(self, text: str) -> List[float]:
+		with self.admission.slot(EMBED) as backend:
+			return self.routes[backend.url].embed_query(text)
+
+	async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+		async with self.admission.aslot(EMBED) as backend:
+			return await self.routes[backend.url].aembed_documents(texts)
+
+	async def aembed_query(self, text: str) -> List[float]:
+		async with self.admission.aslot(EMBED) as backend:
+			return await self.routes[backend.url].aembed_query(text)
+
+	# OllamaEmbeddings embeds a query exactly like a document, so a batch of queries is one /api/embed call.
+	def embed_queries(self, texts: List[str]) -> List[List[float]]:
+		return self.embed_documents(texts)
+
+	async def aembed_queries(self, texts: List[str]) -> List[List[float]]:
+		return await self.aembed_documents(texts)
+
+
+@lru_cache
+def _chat_model(
+	model: str,
+	urls: Tuple[str, ...],
+	pool: Tuple[int, float, float],
+	admission: AdmissionController,
+	keep_alive: int,
+) -> RoutedChatOllama:
+	kwargs = _client_kwargs(*pool)
+	# Every request sets how long Ollama keeps the model loaded, so each one must carry keep_alive.
+	routes = {url: ChatOllama(model=model, base_url=url, temperature=0.2, keep_alive=keep_alive, client_kwargs=kwargs) for url in urls}
+	return RoutedChatOllama(
+		model=model,
+		base_url=urls[0],
 		temperature=0.2,
+		callbacks=[LLM_TIMING],
+		routes=routes,
+		admission=admission,
 	)
 
 
-def get_embedder(settings: Settings) -> OllamaEmbeddings:
-	return OllamaEmbeddings(
-		model=settings.ollama_embed_model,
-		base_url=settings.ollama_base_url,
-	)
+def _pool(settings: Settings) -> Tuple[int, float, float]:
+	return settings.ollama_pool_size, settings.ollama_keepalive_expiry, settings.ollama_timeout
+
+
+def get_chat_model(settings: Settings) -> ChatOllama:
+	return _chat_model(settings.ollama_model, ollama_urls(settings), _pool(settings), get_admission_controller(settings), settings.ollama_keep_alive)
 
 
+@lru_cache
+def _cached_embedder(
+	model: str,
+	urls: Tuple[str, ...],
+	pool: Tuple[int, float, float],
+	admission: AdmissionController,
+	cache_path: Path,
+	batch_size: int,
+	concurrency: int,
+	keep_alive: int,
+	query_cache_size: int,
+) -> CachedEmbeddings:
+	kwargs = _client_kwargs(*pool)
+	routes = {url: OllamaEmbeddings(model=model, base_url=url, keep_alive=keep_alive, client_kwargs=kwargs) for url in urls}
+	inner = RoutedEmbeddings(routes, admission)
+	return CachedEmbeddings(
+		inner, model, EmbeddingCache(cache_path), batch_size=batch_size, concurrency=concurrency, query_cache_size=query_cache_size
+	)
 
+
+def get_embedder(settings: Settings) -> CachedEmbeddings:
+	cache_path = settings.embed_cache_path or settings.data_dir / "embed_cache.sqlite"
+	return _cached_embedder(
+		settings.ollama_embed_model,
+		ollama_urls(settings),
+		_pool(settings),
+		get_admission_controller(settings),
+		cache_path.resolve(),
+		settings.embed_batch_size,
+		settings.embed_concurrency,
+		settings.ollama_keep_alive,
+		settings.embed_query_cache_size,
+	)
@@ -1,32 +1,163 @@
 from __future__ import annotations
 
 import re
-from typing import Dict, Any, Optional, List
+import threading
+import time
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Dict, Any, Optional, List, Tuple
 
-from langchain_core.messages import SystemMessage
+try:
+	import redis  # type: ignore
+except Exception:  # pragma: no cover
+	redis = None  # type: ignore
+
+from backend.core.settings import Settings
+from backend.services.metrics import CACHE_REQUESTS
+
+if TYPE_CHECKING:
+	from langchain_core.messages import SystemMessage
+
+
+DEFAULT_CASE_TYPES = "contract,tort,criminal,constitutional,property,tax"
+
+
+class CaseTypeMatcher:
+	"""One precompiled alternation over every case-type term.
+
+	``vocabulary`` is a comma-separated list of ``type`` or ``type=term|term``
+	entries (e.g. ``contract=contract|agreement|breach``); a bare type matches
+	itself. When several types occur, the one listed first wins.
+	"""
+
+	def __init__(self, vocabulary: str = DEFAULT_CASE_TYPES):
+		self.terms: Dict[str, Tuple[int, str]] = {}
+		for priority, entry in enumerate(e.strip() for e in vocabulary.split(",")):
+			if not entry:
+				continue
+			name, _, terms = entry.partition("=")
+			for term in (terms or name).split("|"):
+				key = " ".join(term.lower().split())
+				if key:
+					self.terms.setdefault(key, (priority, name.strip().lower()))
+		alternation = "|".join(
+			r"\s+".join(re.escape(w) for w in term.split()) for term in sorted(self.terms, key=len, reverse=True)
+		)
+		self.pattern = re.compile(rf"\b(?:{alternation})\b", re.IGNORECASE) if self.terms else None
+
+	def match(self, text: str) -> Optional[str]:
+		if self.pattern is None:
+			return None
+		best: Optional[Tuple[int, str]] = None
+		for m in self.pattern.finditer(text):
+			found = self.terms[" ".join(m.group(0).lower().split())]
+			if best is None or found < best:
+				best = found
+				if found[0] == 0:
+					break
+		return best[1] if best else None
+
+	def classify(self, text: str) -> Optional[str]:
+		"""The type with the most term occurrences in ``text``; ties go to the one listed first."""
+		if self.pattern is None:
+			return None
+		counts: Dict[Tuple[int, str], int] = {}
+		for m in self.pattern.finditer(text):
+			found = self.terms[" ".join(m.group(0).lower().split())]
+			counts[found] = counts.get(found, 0) + 1
+		if not counts:
+			return None
+		return min(counts, key=lambda found: (-counts[found], found[0]))[1]
 
 
 class MemoryManager:
-	def __init__(self) -> None:
-		self.user_prefs: Dict[str, Dict[str, Any]] = {}
+	"""Per-user preferences in an LRU + TTL in-process tier, written through to Redis when reachable.
+
+	With Redis, every worker and node shares ``memory:{user_id}`` hashes (expiring
+	after ``MEMORY_TTL``) and the local tier only keeps entries ``MEMORY_LOCAL_TTL``
+	seconds, which bounds how stale another worker's view can be. Without it, the
+	local tier is the store and holds entries for ``MEMORY_TTL``.
+	"""
+
+	def __init__(self, settings: Settings) -> None:
+		self.settings = settings
+		self.max_entries = settings.memory_cache_size
+		self.client = self._init_client()
+		self.local_ttl = settings.memory_local_ttl if self.client else settings.memory_ttl
+		self.matcher = CaseTypeMatcher(settings.case_types)
+		self.user_prefs: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+		self._lock = threading.Lock()
+
+	def _init_client(self):
+		if redis is None:
+			return None
+		try:
+			client = redis.Redis(
+				host=self.settings.redis_host,
+				port=self.settings.redis_port,
+				db=0,
+				decode_responses=True,
+				socket_timeout=self.settings.memory_redis_timeout,
+			)
+			client.ping()
+			return client
+		except Exception:
+			return None
+
+	def _remember(self, user_id: str, prefs: Dict[str, Any]) -> None:
+		with self._lock:
+			self.user_prefs[user_id] = (time.monotonic() + self.local_ttl, prefs)
+			self.user_prefs.move_to_end(user_id)
+			while len(self.user_prefs) > self.max_entries:
+				self.user_prefs.popitem(last=False)
+
+	def _prefs(self, user_id: str) -> Dict[str, Any]:
+		with self._lock:
+			entry = self.user_prefs.get(user_id)
+			if entry is not None:
+				expires, prefs = entry
+				if expires >= time.monotonic():
+					self.user_prefs.move_to_end(user_id)
+					CACHE_REQUESTS.inc(cache="memory", result="hit")
+					return prefs
+				del self.user_prefs[user_id]
+		CACHE_REQUESTS.inc(cache="memory", result="miss")
+		prefs: Dict[str, Any] = {}
+		if self.client:
+			try:
+				prefs = self.client.hgetall(f"memory:{user_id}")
+			except Exception:
+				prefs = {}
+		self._remember(user_id, prefs)
+		return prefs
+
+	def set_user_pref(self, user_id: str, key: str, value: Any) -> None:
+		prefs = {**self._prefs(user_id), key: value}
+		self._remember(user_id, prefs)
+		if self.client:
+			try:
+				pipe = self.client.pipeline()
+				pipe.hset(f"memory:{user_id}", key, value)
+				pipe.expire(f"memory:{user_id}", self.settings.memory_ttl)
+				pipe.execute()
+			except Exception:
+				pass
 
 	def update_case_type(self, user_id: str, text: str) -> Optional[str]:
-		types = ["contract", "tort", "criminal", "constitutional", "property", "tax"]
-		found = None
-		for t in types:
-			if re.search(rf"\b{re.escape(t)}\b", text, flags=re.IGNORECASE):
-				found = t
-				break
-		if found:
-			self.user_prefs.setdefault(user_id, {})["case_type"] = found
+		found = self.matcher.match(text)
+		if found and self.get_user_pref(user_id, "case_type") != found:
+			self.set_user_pref(user_id, "case_type", found)
 		return found
 
 	def get_user_pref(self, user_id: str, key: str, default=None):
-		return self.user_prefs.get(user_id, {}).get(key, default)
+		return self._prefs(user_id).get(key, default)
 
 	def build_history(self, user_id: str, query: str) -> List[SystemMessage]:
 		self.update_case_type(user_id, query)
-		case_type = self.get_user_pref(user_id, "case_type")
+		return self.history(self.get_user_pref(user_id, "case_type"))
+
+	def history(self, case_type: Optional[str]) -> List[SystemMessage]:
+		from langchain_core.messages import SystemMessage
+
 		history: List[SystemMessage] = []
 		if case_type:
 			history.append(
@@ -36,5 +167,6 @@ class MemoryManager:
 			)
 		return history
 
-
-
+	def stats(self) -> Dict[str, Any]:
+		with self._lock:
+			return {"backend": "redis" if self.client else "memory", "entries": len(self.user_prefs), "case_terms": len(self.matcher.terms)}
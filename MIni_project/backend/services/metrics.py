@@ -0,0 +1,173 @@
+from __future__ import annotations
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+def _escape(value: str) -> str:
+	return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(pairs: Sequence[Tuple[str, str]]) -> str:
+	if not pairs:
+		return ""
+	return "{" + ",".join(f'{k}="{_escape(str(v))}"' for k, v in pairs) + "}"
+
+
+def _number(value: float) -> str:
+	if value == float("inf"):
+		return "+Inf"
+	return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class _Metric:
+	kind = ""
+
+	def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+		self.name = name
+		self.help = help
+		self.labelnames = tuple(labelnames)
+		self._lock = threading.Lock()
+		REGISTRY.register(self)
+
+	def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+		return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+	def _samples(self) -> List[str]:
+		raise NotImplementedError
+
+	def render(self) -> str:
+		return "\n".join([f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}", *self._samples()])
+
+
+class Counter(_Metric):
+	kind = "counter"
+
+	def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+		super().__init__(name, help, labelnames)
+		self._values: Dict[Tuple[str, ...], float] = {} if self.labelnames else {(): 0.0}
+
+	def inc(self, amount: float = 1.0, **labels: str) -> None:
+		key = self._key(labels)
+		with self._lock:
+			self._values[key] = self._values.get(key, 0.0) + amount
+
+	def _samples(self) -> List[str]:
+		with self._lock:
+			items = sorted(self._values.items())
+		return [f"{self.name}{_labels(list(zip(self.labelnames, k)))} {_number(v)}" for k, v in items]
+
+
+class Gauge(Counter):
+	"""Settable value; ``set_function`` makes it read its value at scrape time instead."""
+
+	kind = "gauge"
+
+	def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+		super().__init__(name, help, labelnames)
+		self._function: Optional[Callable[[], float]] = None
+
+	def set(self, value: float, **labels: str) -> None:
+		with self._lock:
+			self._values[self._key(labels)] = float(value)
+
+	def dec(self, amount: float = 1.0, **labels: str) -> None:
+		self.inc(-amount, **labels)
+
+	def set_function(self, function: Callable[[], float]) -> None:
+		self._function = function
+
+	def _samples(self) -> List[str]:
+		if self._function is not None:
+			try:
+				self.set(self._function())
+			except Exception:
+				pass
+		return super()._samples()
+
+
+class Histogram(_Metric):
+	kind = "histogram"
+
+	def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+		super().__init__(name, help, labelnames)
+		self.buckets = tuple(sorted(buckets))
+		# Per label set: [count per bucket (non-cumulative, last is +Inf), sum]
+		self._values: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+	def observe(self, value: float, **labels: str) -> None:
+		key = self._key(labels)
+		i = bisect.bisect_left(self.buckets, value)
+		with self._lock:
+			entry = self._values.get(key)
+			if entry is None:
+				entry = self._values[key] = ([0] * (len(self.buckets) + 1), [0.0])
+			entry[0][i] += 1
+			entry[1][0] += value
+
+	def _samples(self) -> List[str]:
+		with self._lock:
+			items = sorted((k, (list(c), s[0])) for k, (c, s) in self._values.items())
+		lines: List[str] = []
+		for key, (counts, total) in items:
+			pairs = list(zip(self.labelnames, key))
+			cumulative = 0
+			for bound, count in zip((*self.buckets, float("inf")), counts):
+				cumulative += count
+				lines.append(f"{self.name}_bucket{_labels(pairs + [('le', _number(bound))])} {cumulative}")
+			lines.append(f"{self.name}_sum{_labels(pairs)} {_number(total)}")
+			lines.append(f"{self.name}_count{_labels(pairs)} {cumulative}")
+		return lines
+
+
+class Registry:
+	def __init__(self):
+		self._metrics: Dict[str, _Metric] = {}
+
+	def register(self, metric: _Metric) -> None:
+		if metric.name in self._metrics:
+			raise ValueError(f"Metric {metric.name} is already registered")
+		self._metrics[metric.name] = metric
+
+	def render(self) -> str:
+		return "\n".join(m.render() for m in self._metrics.values()) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = Histogram("rag_stage_seconds", "Wall time of each retrieval, generation and ingest stage.", ["stage"])
+LLM_TTFT_SECONDS = Histogram("rag_llm_time_to_first_token_seconds", "Time from LLM call start to its first token.")
+LLM_TOKENS_PER_SECOND = Histogram(
+	"rag_llm_tokens_per_second",
+	"Generated tokens per second after the first token.",
+	buckets=(1, 2, 5, 10, 20, 35, 50, 75, 100, 150, 250, 500),
+)
+LLM_IN_FLIGHT = Gauge("rag_llm_in_flight", "LLM calls currently running.")
+LLM_CALLS = Counter("rag_llm_calls_total", "Finished LLM calls by outcome.", ["outcome"])
+CACHE_REQUESTS = Counter("rag_cache_requests_total", "Cache lookups by cache and result.", ["cache", "result"])
+CORPUS_CHUNKS = Gauge("rag_corpus_chunks", "Chunks in the live corpus generation.")
+CORPUS_GENERATION = Gauge("rag_corpus_generation", "Number of the live corpus generation.")
+INGEST_QUEUE_DEPTH = Gauge("rag_ingest_queue_depth", "Ingest jobs queued or running.")
+INGEST_PAGES = Counter("rag_ingest_pages_total", "PDF pages committed by ingest jobs.")
+INGEST_CHUNKS = Counter("rag_ingest_chunks_total", "Chunks committed by ingest jobs.")
+STREAM_DISCONNECTS = Counter("rag_stream_disconnects_total", "Streams abandoned by the client before the answer finished.")
+RETRIEVAL_SCOPES = Counter("rag_retrieval_scopes_total", "Searches by the scope their hits came from.", ["scope"])
+
+
+@contextmanager
+def timed(stage: str) -> Iterator[None]:
+	started = time.perf_counter()
+	try:
+		yield
+	finally:
+		STAGE_SECONDS.observe(time.perf_counter() - started, stage=stage)
+
+
+def render() -> str:
+	return REGISTRY.render()
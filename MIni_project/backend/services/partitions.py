@@ -0,0 +1,339 @@
+from __future__ import annotations
+
+import datetime
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+from backend.services.memory import DEFAULT_CASE_TYPES, CaseTypeMatcher
+
+if TYPE_CHECKING:
+	from langchain_core.documents import Document
+
+
+PARTITION_KEYS = ("case_type", "court", "year", "source")
+TAG_CHARS = 4000
+SCOPE_CACHE_SIZE = 256
+
+_write_lock = threading.Lock()
+
+_UPLOAD_PREFIX_RE = re.compile(r"^upload_[0-9a-f]{8}_")
+_YEAR_RE = re.compile(r"\b(1[89]\d\d|20\d\d)\b")
+_COURT_RE = re.compile(
+	r"\b(?:(supreme)\s+court"
+	r"|high\s+court\s+of\s+(?:judicature\s+(?:at|for)\s+)?(?:the\s+)?([a-z]+)"
+	r"|([a-z]+)\s+high\s+court(?!\s+of\b)"
+	r"|(district|sessions|family)\s+court"
+	r"|court\s+of\s+(appeal))\b",
+	re.IGNORECASE,
+)
+_NOT_A_PLACE = {"the", "a", "an", "said", "learned", "ble", "honourable", "this", "that", "in", "of", "by", "before", "and", "to"}
+
+
+def source_name(source: Any) -> str:
+	"""The file name a chunk came from, without the ``upload_<job>_`` prefix added on ingest."""
+	return _UPLOAD_PREFIX_RE.sub("", Path(str(source)).name).lower()
+
+
+def detect_court(text: str) -> Optional[str]:
+	for m in _COURT_RE.finditer(text):
+		supreme, of_place, place, lower, appeal = m.groups()
+		if supreme:
+			return "supreme court"
+		if of_place or place:
+			if (of_place or place).lower() in _NOT_A_PLACE:
+				continue
+			return f"{(of_place or place).lower()} high court"
+		if lower:
+			return f"{lower.lower()} court"
+		if appeal:
+			return "court of appeal"
+	return None
+
+
+def detect_year(text: str) -> Optional[str]:
+	# A judgment postdates everything it cites, so the latest year on its first pages is the decision year.
+	now = datetime.date.today().year
+	years = [int(y) for y in _YEAR_RE.findall(text) if int(y) <= now]
+	return str(max(years)) if years else None
+
+
+def file_tags(text: str, matcher: CaseTypeMatcher) -> Dict[str, str]:
+	"""``case_type``, ``court`` and ``year`` of a file, read from the text of its first pages."""
+	head = text[:TAG_CHARS]
+	tags = {"case_type": matcher.classify(head), "court": detect_court(head), "year": detect_year(head)}
+	return {key: value for key, value in tags.items() if value}
+
+
+def _value(key: str, value: Any) -> str:
+	value = " ".join(str(value).lower().split())
+	return source_name(value) if key == "source" else value
+
+
+def partition_value(key: str, metadata: Mapping[str, Any]) -> Optional[str]:
+	value = metadata.get(key)
+	return None if value in (None, "") else _value(key, value)
+
+
+def normalize_filters(raw: Optional[Mapping[str, Any]]) -> Dict[str, Tuple[str, ...]]:
+	"""``{"court": "Delhi High Court", "year": [2019, 2020]}`` -> ``{key: (value, ...)}`` in partition form.
+
+	A key matches any of its values and every key must match. Unknown keys raise ``ValueError``.
+	"""
+	out: Dict[str, Tuple[str, ...]] = {}
+	for key, value in (raw or {}).items():
+		if key not in PARTITION_KEYS:
+			raise ValueError(f"Unknown filter {key!r}; expected one of {PARTITION_KEYS}")
+		values = value if isinstance(value, (list, tuple, set)) else [value]
+		normalized = tuple(sorted({_value(key, v) for v in values if v not in (None, "")}))
+		if normalized:
+			out[key] = normalized
+	return out
+
+
+def parse_filter_params(items: Sequence[str]) -> Dict[str, List[str]]:
+	"""Repeated ``key:value`` query parameters -> a raw filter for ``normalize_filters``."""
+	raw: Dict[str, List[str]] = {}
+	for item in items:
+		key, sep, value = item.partition(":")
+		if not sep:
+			raise ValueError(f"Filter {item!r} is not of the form key:value")
+		raw.setdefault(key.strip(), []).append(value)
+	return raw
+
+
+def preferred_partitions(query: str, case_type: Optional[str]) -> Dict[str, Tuple[str, ...]]:
+	"""Soft scope for a query: the user's detected case type and any court the query names."""
+	prefer: Dict[str, Tuple[str, ...]] = {}
+	if case_type:
+		prefer["case_type"] = (_value("case_type", case_type),)
+	court = detect_court(query)
+	if court:
+		prefer["court"] = (court,)
+	return prefer
+
+
+def _dirname(value: str) -> str:
+	slug = re.sub(r"[^a-z0-9]+", "-", value.lower()).strip("-")[:40] or "x"
+	return f"{slug}-{hashlib.sha1(value.encode('utf-8')).hexdigest()[:8]}"
+
+
+@dataclass(frozen=True)
+class Scope:
+	"""The chunks a search is restricted to, as ascending global chunk ``ids``."""
+
+	ids: np.ndarray
+
+
+class PartitionIndex:
+	"""Chunk-id lists per metadata partition (``PARTITION_KEYS``).
+
+	Layout under ``root``:
+	- ``manifest.json``   ``count`` (chunks covered), ``files_size`` (valid bytes of
+	  ``files.jsonl``) and ``partitions`` (key -> value -> ``{"dir", "count"}``); rewritten
+	  last, so a crashed append is redone from the recorded counts
+	- ``files.jsonl``     ``{"source", "tags"}`` per tagged file, appended once per file
+	- ``{key}/{dir}.i64`` raw int64 global chunk ids of one partition, ascending, memory-mapped
+
+	A filtered search weighs the BM25 postings of the scope's ids only and scans
+	only the partition's vector rows, so the index costs 8 bytes per chunk and key.
+	Resolved scopes are cached per filter until the next ``add``.
+	"""
+
+	def __init__(self, root: Path, vocabulary: str = DEFAULT_CASE_TYPES):
+		self.root = root
+		self.manifest_path = root / "manifest.json"
+		self.matcher = CaseTypeMatcher(vocabulary)
+		self.root.mkdir(parents=True, exist_ok=True)
+		self.files_path = root / "files.jsonl"
+		self.manifest = self._read_manifest()
+		self._files: Optional[Dict[str, Dict[str, str]]] = None
+		self._pending: Dict[str, Dict[str, str]] = {}
+		self._ids: Dict[Tuple[str, str], np.ndarray] = {}
+		self._scopes: "OrderedDict[Any, Scope]" = OrderedDict()
+		self._scope_lock = threading.Lock()
+
+	def _read_manifest(self) -> Dict[str, Any]:
+		if not self.manifest_path.exists():
+			return {"version": 3, "count": 0, "files_size": 0, "partitions": {}}
+		with open(self.manifest_path, "r", encoding="utf-8") as f:
+			return json.load(f)
+
+	def _read_files(self, manifest: Dict[str, Any]) -> Dict[str, Dict[str, str]]:
+		if "files" in manifest:
+			return dict(manifest["files"])
+		files: Dict[str, Dict[str, str]] = {}
+		if manifest.get("files_size"):
+			with open(self.files_path, "rb") as f:
+				data = f.read(manifest["files_size"])
+			for line in data.splitlines():
+				record = json.loads(line)
+				files[record["source"]] = record["tags"]
+		return files
+
+	@property
+	def files(self) -> Dict[str, Dict[str, str]]:
+		"""File tags by source, read on first use."""
+		if self._files is None:
+			self._files = self._read_files(self.manifest)
+		return self._files
+
+	def _append_files(self, manifest: Dict[str, Any], files: Mapping[str, Dict[str, str]]) -> None:
+		# Bytes past ``files_size`` are left over from a crashed append and are overwritten.
+		size = manifest.get("files_size", 0)
+		with open(self.files_path, "r+b" if self.files_path.exists() and size else "wb") as f:
+			f.seek(size)
+			for source, tags in files.items():
+				f.write((json.dumps({"source": source, "tags": tags}) + "\n").encode("utf-8"))
+			f.truncate()
+			f.flush()
+			os.fsync(f.fileno())
+			manifest["files_size"] = f.tell()
+
+	def _write_manifest(self, manifest: Dict[str, Any]) -> None:
+		tmp = self.manifest_path.with_suffix(".json.tmp")
+		with open(tmp, "w", encoding="utf-8") as f:
+			json.dump(manifest, f)
+			f.flush()
+			os.fsync(f.fileno())
+		os.replace(tmp, self.manifest_path)
+
+	@property
+	def count(self) -> int:
+		return int(self.manifest["count"])
+
+	def tag(self, docs: Sequence[Document]) -> None:
+		"""Sets ``case_type``, ``court`` and ``year`` in each chunk's metadata, in place.
+
+		Tags belong to the file: a file seen for the first time is tagged from its
+		lowest pages in ``docs``, later batches of it reuse those tags. Tags already
+		present in the metadata are kept.
+		"""
+		files = self.files
+		heads: Dict[str, List[Document]] = {}
+		for d in docs:
+			source = str(d.metadata.get("source") or "")
+			if source not in files and source not in self._pending:
+				heads.setdefault(source, []).append(d)
+		for source, group in heads.items():
+			text = ""
+			for d in sorted(group, key=lambda d: d.metadata.get("page") or 0):
+				text += d.page_content + "\n"
+				if len(text) >= TAG_CHARS:
+					break
+			self._pending[source] = file_tags(text, self.matcher)
+		for d in docs:
+			source = str(d.metadata.get("source") or "")
+			for key, value in files.get(source, self._pending.get(source, {})).items():
+				d.metadata.setdefault(key, value)
+
+	def add(self, docs: Sequence[Document], start: int) -> int:
+		"""Appends tagged ``docs`` (global chunk ids ``start..``) to their partitions."""
+		with _write_lock:
+			manifest = self._read_manifest()
+			skip = max(0, manifest["count"] - start)
+			docs = list(docs[skip:])
+			if not docs:
+				return manifest["count"]
+			first = start + skip
+			if first != manifest["count"]:
+				raise ValueError(f"Partition index covers {manifest['count']} chunks, cannot append at {first}")
+			if manifest.get("version", 1) < 2:
+				# Version 1 also kept a BM25 sub-index directory per partition; scopes now weigh the global index's postings.
+				for path in self.root.glob("*/*"):
+					if path.is_dir():
+						shutil.rmtree(path, ignore_errors=True)
+				manifest["version"] = 2
+			if "files" in manifest:
+				# Version 2 kept the file tags in the manifest, rewriting all of them on every append.
+				files = manifest.pop("files")
+				manifest["files_size"] = 0
+				self._append_files(manifest, files)
+				manifest["version"] = 3
+
+			groups: Dict[Tuple[str, str], List[int]] = {}
+			for i, d in enumerate(docs):
+				for key in PARTITION_KEYS:
+					value = partition_value(key, d.metadata)
+					if value:
+						groups.setdefault((key, value), []).append(i)
+			for (key, value), rows in groups.items():
+				entry = manifest["partitions"].setdefault(key, {}).setdefault(value, {"dir": _dirname(value), "count": 0})
+				(self.root / key).mkdir(exist_ok=True)
+				ids_path = self.root / key / f"{entry['dir']}.i64"
+				with open(ids_path, "r+b" if ids_path.exists() and entry["count"] else "wb") as f:
+					f.seek(entry["count"] * 8)
+					f.write((np.asarray(rows, dtype=np.int64) + first).tobytes())
+					f.truncate()
+					f.flush()
+					os.fsync(f.fileno())
+				entry["count"] += len(rows)
+
+			stale = manifest.get("files_size") != self.manifest.get("files_size")
+			if self._pending:
+				self._append_files(manifest, self._pending)
+			manifest["count"] = first + len(docs)
+			self._write_manifest(manifest)
+			self.manifest = manifest
+			if stale:
+				self._files = None
+			elif self._files is not None:
+				self._files.update(self._pending)
+			self._pending = {}
+			self._ids = {}
+			with self._scope_lock:
+				self._scopes.clear()
+		return self.count
+
+	def _part(self, key: str, value: str) -> Optional[np.ndarray]:
+		entry = self.manifest["partitions"].get(key, {}).get(value)
+		if entry is None or not entry["count"]:
+			return None
+		ids = self._ids.get((key, value))
+		if ids is None:
+			ids = self._ids[(key, value)] = np.memmap(self.root / key / f"{entry['dir']}.i64", dtype=np.int64, mode="r", shape=(entry["count"],))
+		return ids
+
+	def scope(self, filters: Mapping[str, Sequence[str]], limit: Optional[int] = None) -> Scope:
+		"""Chunks below ``limit`` matching every key of ``filters`` (any of its values).
+
+		Equal filters get the same (read-only) ``Scope`` until the next ``add``.
+		"""
+		key = (tuple(sorted((name, tuple(sorted(values))) for name, values in filters.items())), limit)
+		with self._scope_lock:
+			scope = self._scopes.get(key)
+			if scope is not None:
+				self._scopes.move_to_end(key)
+				return scope
+		scope = self._resolve(filters, limit)
+		with self._scope_lock:
+			scope = self._scopes.setdefault(key, scope)
+			while len(self._scopes) > SCOPE_CACHE_SIZE:
+				self._scopes.popitem(last=False)
+		return scope
+
+	def _resolve(self, filters: Mapping[str, Sequence[str]], limit: Optional[int]) -> Scope:
+		ids: Optional[np.ndarray] = None
+		for key, values in filters.items():
+			# A chunk has one value per key, so the lists of one key never overlap.
+			parts = [p for v in values if (p := self._part(key, v)) is not None]
+			matched = np.sort(np.concatenate(parts)) if parts else np.zeros(0, dtype=np.int64)
+			ids = matched if ids is None else np.intersect1d(ids, matched, assume_unique=True)
+		ids = np.zeros(0, dtype=np.int64) if ids is None else ids
+		if limit is not None:
+			ids = ids[ids < limit]
+		ids.flags.writeable = False
+		return Scope(ids=ids)
+
+	def values(self) -> Dict[str, Dict[str, int]]:
+		"""Chunk count per partition value, by key."""
+		return {key: {value: e["count"] for value, e in parts.items()} for key, parts in self.manifest["partitions"].items()}
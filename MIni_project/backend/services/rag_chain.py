@@ -1,16 +1,18 @@
 from __future__ import annotations
 
-from typing import Dict, Any, Iterable, Optional
+from typing import Dict, Any, AsyncIterator, Iterable, Iterator, List, Optional
 
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.output_parsers import StrOutputParser
-from langchain_core.runnables import RunnableParallel, RunnableLambda
+from langchain_core.runnables import Runnable, RunnableGenerator, RunnableParallel, RunnableLambda, RunnablePassthrough
 from langchain_core.messages import BaseMessage
 
 from backend.core.settings import Settings
+from backend.services.context import ContextPack, ContextPacker, estimate_tokens, get_context_packer
 from backend.services.llm import get_chat_model
+from backend.services.metrics import timed
 from backend.services.tools import citation_lookup
-from backend.services.retrieval import get_hybrid_retriever
+from backend.services.retrieval import Hit, get_hybrid_retriever
 
 
 def _system_message() -> str:
@@ -21,52 +23,121 @@ def _system_message() -> str:
 	)
 
 
-def build_query_chain(settings: Settings, data_dir) -> RunnableParallel:
-	retriever = get_hybrid_retriever(settings, data_dir)
-	prompt = ChatPromptTemplate.from_messages(
+def _prompt(instruction: str) -> ChatPromptTemplate:
+	"""Static instructions first, per-request text last.
+
+	The system message never changes and the case-type preference in ``history``
+	takes a handful of values, so consecutive prompts share a byte-identical
+	prefix that Ollama can serve from its KV cache; only the packed context and
+	the question after it need a fresh prefill.
+	"""
+	return ChatPromptTemplate.from_messages(
 		[
 			("system", _system_message()),
 			MessagesPlaceholder("history"),
-			("human", "Query: {query}\n\nContext:\n{context}\n\nIf useful, you may call tools."),
+			("human", "Context:\n{context}\n\nQuery: {query}\n\n" + instruction),
 		]
 	)
 
+
+def format_context(hits: List[Hit], packer: Optional[ContextPacker] = None) -> ContextPack:
+	"""Merges, de-duplicates, diversifies and budget-packs ``hits`` (see ``ContextPacker``)."""
+	with timed("prompt.context"):
+		if packer is None:
+			text = "\n---\n".join(h.document.page_content for h in hits)
+			return ContextPack(text=text, hits=list(hits), passages=len(hits), tokens=estimate_tokens(text))
+		return packer.pack(hits)
+
+
+def _pack_runnable(packer: ContextPacker) -> RunnableLambda:
+	"""Replaces ``hits`` with the hits that made it into the context, so sources match the prompt."""
+
+	def _pack(inputs: Dict[str, Any]) -> Dict[str, Any]:
+		pack = format_context(inputs["hits"], packer)
+		return {**inputs, "hits": pack.hits, "context": pack.text}
+
+	return RunnableLambda(_pack)
+
+
+def _hits_runnable(retriever: Any) -> RunnableLambda:
+	"""Sync calls use ``search``; ``ainvoke``/``astream`` use the non-blocking ``asearch``.
+	Optional ``filters`` and ``prefer`` inputs scope the search to metadata partitions."""
+
+	async def _ahits(inputs: Dict[str, Any]) -> List[Hit]:
+		return await retriever.asearch(inputs["query"], filters=inputs.get("filters"), prefer=inputs.get("prefer"))
+
+	return RunnableLambda(lambda inp: retriever.search(inp["query"], filters=inp.get("filters"), prefer=inp.get("prefer")), afunc=_ahits)
+
+
+def _answer_stream(answer: Runnable) -> RunnableGenerator:
+	"""Streams the packed inputs (``hits``, ``context``...) first, then ``{"answer": chunk}`` deltas.
+
+	``RunnablePassthrough.assign`` would pull the LLM stream from a helper task that
+	outlives a cancelled consumer until the next token arrives; pulling it inline
+	means a client disconnect cancels the Ollama request immediately.
+	"""
+
+	def _stream(inputs: Iterator[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+		for state in inputs:
+			yield state
+			for chunk in answer.stream(state):
+				yield {"answer": chunk}
+
+	async def _astream(inputs: AsyncIterator[Dict[str, Any]]) -> AsyncIterator[Dict[str, Any]]:
+		async for state in inputs:
+			yield state
+			async for chunk in answer.astream(state):
+				yield {"answer": chunk}
+
+	return RunnableGenerator(_stream, _astream)
+
+
+def build_query_chain(settings: Settings, data_dir, retriever: Optional[Any] = None) -> Runnable:
+	"""Chain returning ``{"answer", "hits", ...}`` so callers get the sources the answer was grounded on."""
+	if retriever is None:
+		retriever = get_hybrid_retriever(settings, data_dir)
+	prompt = _prompt("If useful, you may call tools.")
 	llm = get_chat_model(settings).bind_tools([citation_lookup])
 
-	def _get_context(inputs: Dict[str, Any]) -> str:
-		documents = retriever.invoke(inputs["query"])
-		return "\n---\n".join(d.page_content for d in documents)
-
-	return RunnableParallel(
-		context=RunnableLambda(_get_context),
-		query=RunnableLambda(lambda inp: inp["query"]),
-		history=RunnableLambda(lambda inp: inp.get("history", [])),
-	) | prompt | llm | StrOutputParser()
-
-
-def build_stream_chain(settings: Settings, data_dir, history: Optional[Iterable[BaseMessage]] = None):
-    retriever = get_hybrid_retriever(settings, data_dir)
-    prompt = ChatPromptTemplate.from_messages(
-        [
-            ("system", _system_message()),
-            MessagesPlaceholder("history"),
-            ("human", "Query: {query}\n\nContext:\n{context}\n\nStream your response."),
-        ]
-    )
-    llm = get_chat_model(settings).bind_tools([citation_lookup])
+	return (
+		RunnableParallel(
+			hits=_hits_runnable(retriever),
+			query=RunnableLambda(lambda inp: inp["query"]),
+			history=RunnableLambda(lambda inp: inp.get("history", [])),
+		)
+		| _pack_runnable(get_context_packer(settings, retriever))
+		| RunnablePassthrough.assign(answer=prompt | llm | StrOutputParser())
+	)
 
-    def _get_context(inputs: Dict[str, Any]) -> str:
-        docs = retriever.invoke(inputs["query"])
-        return "\n---\n".join(d.page_content for d in docs)
+
+def build_answer_chain(settings: Settings, data_dir, retriever: Optional[Any] = None) -> Runnable:
+	"""Streams an answer over hits the caller already has: takes ``{"hits", "query", "history"}``
+	and yields the packed inputs first, then ``{"answer": str}`` deltas."""
+	if retriever is None:
+		retriever = get_hybrid_retriever(settings, data_dir)
+	llm = get_chat_model(settings).bind_tools([citation_lookup])
+	return _pack_runnable(get_context_packer(settings, retriever)) | _answer_stream(_prompt("If useful, you may call tools.") | llm | StrOutputParser())
+
+
+def build_stream_chain(
+    settings: Settings,
+    data_dir,
+    history: Optional[Iterable[BaseMessage]] = None,
+    retriever: Optional[Any] = None,
+):
+    if retriever is None:
+        retriever = get_hybrid_retriever(settings, data_dir)
+    prompt = _prompt("Stream your response.")
+    llm = get_chat_model(settings).bind_tools([citation_lookup])
 
     chain = (
         RunnableParallel(
-            context=RunnableLambda(_get_context),
+            hits=_hits_runnable(retriever),
             query=RunnableLambda(lambda inp: inp["query"]),
             history=RunnableLambda(lambda inp: inp.get("history", [])),
         )
-        | prompt
-        | llm
+        | _pack_runnable(get_context_packer(settings, retriever))
+        | _answer_stream(prompt | llm)
     )
     return chain
 
@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+
+@dataclass
+class ResponseRecord:
+	id: str
+	query: str
+	user_id: str
+	generation: int
+	chunk_ids: List[int]
+	context: Optional[str] = None
+	answer: str = ""
+	created_at: float = field(default_factory=time.time)
+
+
+def new_response_id() -> str:
+	return uuid.uuid4().hex
+
+
+class ResponseStore:
+	"""Bounded LRU + TTL of recent answers by response id: the query, the chunk ids
+	the answer was grounded on and the packed prompt context.
+
+	Feedback healing starts from these instead of retrieving again. Records live in
+	this process only; an id that expired or was served by another worker is simply
+	not found.
+	"""
+
+	def __init__(self, max_entries: int, ttl: float):
+		self.max_entries = max_entries
+		self.ttl = ttl
+		self._records: "OrderedDict[str, Tuple[float, ResponseRecord]]" = OrderedDict()
+		self._lock = threading.Lock()
+
+	def put(self, record: ResponseRecord) -> None:
+		if self.max_entries <= 0:
+			return
+		with self._lock:
+			self._records[record.id] = (time.monotonic() + self.ttl, record)
+			self._records.move_to_end(record.id)
+			while len(self._records) > self.max_entries:
+				self._records.popitem(last=False)
+
+	def get(self, response_id: str) -> Optional[ResponseRecord]:
+		with self._lock:
+			entry = self._records.get(response_id)
+			if entry is None:
+				return None
+			expires, record = entry
+			if expires < time.monotonic():
+				del self._records[response_id]
+				return None
+			self._records.move_to_end(response_id)
+			return record
+
+	def set_answer(self, response_id: str, answer: str) -> None:
+		record = self.get(response_id)
+		if record is not None:
+			record.answer = answer
+
+	def stats(self) -> Dict[str, Any]:
+		with self._lock:
+			return {"entries": len(self._records), "max_entries": self.max_entries}
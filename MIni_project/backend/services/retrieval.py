@@ -1,88 +1,728 @@
 from __future__ import annotations
 
-import pickle
+import asyncio
+from contextlib import nullcontext
+from concurrent.futures import Executor, ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import lru_cache
 from pathlib import Path
-from typing import List, Tuple, Any
+from typing import Dict, Iterator, List, Any, Mapping, Optional, Sequence, Tuple
 
-from langchain_community.document_loaders import PyPDFLoader
+import numpy as np
+from pydantic import ConfigDict, SkipValidation
+from pypdf import PdfReader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
 from langchain_core.documents import Document
-from langchain_community.vectorstores import DocArrayInMemorySearch
-from langchain_community.retrievers import BM25Retriever
-from langchain_classic.retrievers.ensemble import EnsembleRetriever
+from langchain_core.retrievers import BaseRetriever
 
+from backend.core.log import get_logger
 from backend.core.settings import Settings
+from backend.services.admission import RetrievalTimeout
 from backend.services.llm import get_embedder
+from backend.services.vector_store import VectorStore, normalize_rows, top_k
+from backend.services.bm25_index import BM25Index
+from backend.services.chunk_store import ChunkStore
+from backend.services.metrics import CORPUS_CHUNKS, RETRIEVAL_SCOPES, timed
+from backend.services.partitions import PartitionIndex, Scope
+
+
+log = get_logger(__name__)
+
+
+RRF_K = 60
+BACKFILL_CHUNKS = 2048
+FUSION_METHODS = ("rrf", "minmax", "zscore")
+PARTITION_ROUTING = ("filter", "boost", "off")
+TAG_FIELDS = ("case_type", "court", "year")
+
+
+@dataclass(frozen=True)
+class Hit:
+	chunk_id: int
+	score: float
+	bm25: float
+	cosine: Optional[float]
+	document: Document
+
+	def to_source(self) -> Dict[str, Any]:
+		return {
+			"chunk_id": self.chunk_id,
+			"score": round(self.score, 6),
+			"bm25": round(self.bm25, 6),
+			"cosine": None if self.cosine is None else round(self.cosine, 6),
+			"page": self.document.metadata.get("page"),
+			"source": self.document.metadata.get("source"),
+			**{key: self.document.metadata[key] for key in TAG_FIELDS if key in self.document.metadata},
+		}
+
+
+def _ranks(scores: np.ndarray) -> np.ndarray:
+	ranks = np.empty(len(scores), dtype=np.float32)
+	ranks[np.argsort(-scores, kind="stable")] = np.arange(1, len(scores) + 1)
+	return ranks
+
+
+def _minmax(x: np.ndarray) -> np.ndarray:
+	span = float(x.max() - x.min())
+	return (x - x.min()) / span if span else np.zeros_like(x)
+
+
+def _zscore(x: np.ndarray) -> np.ndarray:
+	std = float(x.std())
+	return (x - x.mean()) / std if std else np.zeros_like(x)
+
+
+def fuse_scores(vector: np.ndarray, bm25: np.ndarray, weights: Tuple[float, float], method: str) -> np.ndarray:
+	w_vector, w_bm25 = weights
+	if method == "rrf":
+		return w_vector / (RRF_K + _ranks(vector)) + w_bm25 / (RRF_K + _ranks(bm25))
+	if method == "minmax":
+		return w_vector * _minmax(vector) + w_bm25 * _minmax(bm25)
+	if method == "zscore":
+		return w_vector * _zscore(vector) + w_bm25 * _zscore(bm25)
+	raise ValueError(f"Unknown fusion method {method!r}; expected one of {FUSION_METHODS}")
+
+
+# ``(label, scope, boost_ids)``: one scope a search tries, see ``HybridRetriever._attempts``.
+Attempt = Tuple[str, Optional[Scope], Optional[np.ndarray]]
+
+
+class HybridRetriever(BaseRetriever):
+	"""BM25 + cosine retrieval fused over one shared candidate set.
+
+	The union of the BM25 and vector top-``candidates`` is scored on both
+	signals as NumPy arrays, fused with ``fusion`` and cut to ``k`` hits.
+
+	``filters`` restrict a search to metadata partitions: BM25 weighs the
+	partition's postings only and cosine runs on its rows only. ``prefer`` (the
+	user's detected case type, a court named in the query) boosts the preferred
+	chunks (``partition_routing="boost"``), or narrows the search to them and
+	widens back to the whole scope unless they hold ``k`` hits and BM25 evidence
+	close to the scope's best (``"filter"``). The query is embedded and scored by
+	BM25 once per search, whichever scopes it tries.
+	"""
+
+	model_config = ConfigDict(arbitrary_types_allowed=True)
+
+	# A ChunkView decodes documents on access; validating would read them all.
+	docs: SkipValidation[Sequence[Document]]
+	index: BM25Index
+	store: Optional[VectorStore] = None
+	embedder: Any = None
+	k: int = 6
+	candidates: int = 50
+	weights: Tuple[float, float] = (0.55, 0.45)
+	fusion: str = "rrf"
+	nprobe: int = 0
+	executor: Optional[Executor] = None
+	embed_timeout: float = 10.0
+	search_timeout: float = 5.0
+	partitions: Optional[PartitionIndex] = None
+	partition_routing: str = "boost"
+	partition_boost: float = 0.1
+	partition_evidence: float = 0.75
+	batch_memory: int = 64 << 20
+
+	def _bm25_stage(self, query: str, scope: Optional[Scope] = None) -> np.ndarray:
+		"""BM25 indexed by chunk id, or aligned with ``scope.ids`` when scoped."""
+		with timed("retrieval.bm25"):
+			if scope is not None:
+				return self.index.scores(query, scope.ids)
+			return self.index.scores(query)[:len(self.docs)]
+
+	def _narrow(self, bm25: np.ndarray, base: Optional[Scope], scope: Optional[Scope]) -> Tuple[np.ndarray, np.ndarray, Optional[np.ndarray]]:
+		"""``(scores, candidates, score_ids)`` of ``scope`` from the BM25 of ``base``, which contains it;
+		scores are indexed by chunk id, or aligned with ``score_ids`` when scoped."""
+		if scope is None:
+			scores, ids = bm25, None
+		elif scope is base:
+			scores, ids = bm25, scope.ids
+		else:
+			ids = scope.ids
+			scores = bm25[ids] if base is None else bm25[np.searchsorted(base.ids, ids)]
+		cand = top_k(scores, self.candidates)
+		cand = cand[scores[cand] > 0]
+		return scores, cand if ids is None else ids[cand], ids
+
+	def _widen(self, hits: List[Hit], k: int, scores: np.ndarray, bm25: np.ndarray) -> bool:
+		"""Whether a narrowed attempt should give way to the next, wider one: it has fewer than
+		``k`` hits, or its best BM25 is below ``partition_evidence`` of the wider scope's."""
+		if len(hits) < k:
+			return True
+		best = float(bm25.max()) if len(bm25) else 0.0
+		return best > 0 and (float(scores.max()) if len(scores) else 0.0) < self.partition_evidence * best
+
+	def _vector_stage(self, q: np.ndarray, scope: Optional[Scope] = None) -> np.ndarray:
+		with timed("retrieval.vector"):
+			if scope is not None:
+				return self.store.nearest(q, self.candidates, scope.ids[scope.ids < self.store.count])[0]
+			n = len(self.docs)
+			return np.asarray([i for i, _ in self.store.search(q, self.candidates, nprobe=self.nprobe) if i < n], dtype=np.int64)
+
+	def _combine(
+		self,
+		k: int,
+		bm25: np.ndarray,
+		cand: np.ndarray,
+		q: Optional[np.ndarray],
+		vec_ids: Optional[np.ndarray],
+		bm25_ids: Optional[np.ndarray] = None,
+		boost: Optional[np.ndarray] = None,
+	) -> List[Hit]:
+		cosine: Optional[np.ndarray] = None
+		if q is not None and vec_ids is not None:
+			with timed("retrieval.cosine"):
+				cand = np.union1d(cand, vec_ids)
+				# Vector rows are appended in chunk-id order, so row == chunk id for every stored chunk.
+				in_store = cand < self.store.count
+				cosine = np.full(len(cand), -1.0, dtype=np.float32)
+				cosine[in_store] = self.store.scores(q, cand[in_store])
+		if not len(cand):
+			return []
+
+		with timed("retrieval.fuse"):
+			if bm25_ids is None:
+				cand_bm25 = bm25[cand]
+			else:
+				pos = np.minimum(np.searchsorted(bm25_ids, cand), max(0, len(bm25_ids) - 1))
+				cand_bm25 = np.where(bm25_ids[pos] == cand, bm25[pos], 0.0).astype(np.float32) if len(bm25_ids) else np.zeros(len(cand), dtype=np.float32)
+			if cosine is None:
+				fused = cand_bm25
+			else:
+				fused = fuse_scores(cosine, cand_bm25, self.weights, self.fusion)
+			if boost is not None and len(boost):
+				span = float(fused.max() - fused.min()) or 1.0
+				fused = fused + self.partition_boost * span * np.isin(cand, boost)
+			order = top_k(fused, k)
+		return [
+			Hit(
+				chunk_id=int(cand[i]),
+				score=float(fused[i]),
+				bm25=float(cand_bm25[i]),
+				cosine=None if cosine is None else float(cosine[i]),
+				document=self.docs[int(cand[i])],
+			)
+			for i in order
+		]
+
+	def _attempt(
+		self,
+		k: int,
+		bm25: np.ndarray,
+		base: Optional[Scope],
+		scope: Optional[Scope],
+		boost: Optional[np.ndarray],
+		vec: Optional[Tuple[np.ndarray, np.ndarray]],
+	) -> Tuple[List[Hit], np.ndarray]:
+		"""Hits of one attempt from the search's BM25 over ``base`` and the ``(q, vector_ids)`` of
+		its scope, with the attempt's BM25 scores for ``_widen``."""
+		scores, cand, ids = self._narrow(bm25, base, scope)
+		q, vec_ids = vec if vec is not None else (None, None)
+		return self._combine(k, scores, cand, q, vec_ids, ids, boost), scores
+
+	@property
+	def _has_vectors(self) -> bool:
+		return self.store is not None and self.store.count > 0
+
+	def vectors(self, chunk_ids: Sequence[int]) -> Optional[np.ndarray]:
+		"""Unit-norm embeddings of ``chunk_ids``, or None when any of them has no stored vector."""
+		ids = np.asarray(chunk_ids, dtype=np.int64)
+		if not self._has_vectors or (ids >= self.store.count).any():
+			return None
+		return normalize_rows(np.asarray(self.store.matrix()[ids], dtype=np.float32))
+
+	def _attempts(
+		self,
+		filters: Optional[Mapping[str, Sequence[str]]],
+		prefer: Optional[Mapping[str, Sequence[str]]],
+	) -> List[Attempt]:
+		"""``(label, scope, boost_ids)`` to try in order, narrowest first; the last is the widest
+		scope, and every other is contained in it. A search stops early unless ``_widen``."""
+		if self.partitions is None or not (filters or prefer):
+			return [("corpus", None, None)]
+		filters = dict(filters or {})
+		n = len(self.docs)
+		base = self.partitions.scope(filters, n) if filters else None
+		label = "filter" if filters else "corpus"
+		prefer = {key: values for key, values in (prefer or {}).items() if key not in filters}
+		if not prefer or self.partition_routing == "off":
+			return [(label, base, None)]
+		if self.partition_routing == "boost":
+			return [("boosted", base, self.partitions.scope(prefer, n).ids)]
+		return [("preferred", self.partitions.scope({**filters, **prefer}, n), None), (label, base, None)]
+
+	def search(
+		self,
+		query: str,
+		k: Optional[int] = None,
+		filters: Optional[Mapping[str, Sequence[str]]] = None,
+		prefer: Optional[Mapping[str, Sequence[str]]] = None,
+	) -> List[Hit]:
+		k = k or self.k
+		with timed("retrieval.search"):
+			attempts = self._attempts(filters, prefer)
+			base = attempts[-1][1]
+			bm25 = self._bm25_stage(query, base)
+			q = None
+			if self._has_vectors:
+				try:
+					with timed("retrieval.embed_query"):
+						q = normalize_rows(np.asarray(self.embedder.embed_query(query), dtype=np.float32))
+				except Exception as exc:
+					log.warning("retrieval.vector_failed", error=str(exc))
+			for step, (label, scope, boost) in enumerate(attempts):
+				vec = None
+				if q is not None:
+					try:
+						vec = q, self._vector_stage(q, scope)
+					except Exception as exc:
+						log.warning("retrieval.vector_failed", error=str(exc))
+				hits, scores = self._attempt(k, bm25, base, scope, boost, vec)
+				if step + 1 == len(attempts) or not self._widen(hits, k, scores, bm25):
+					break
+			RETRIEVAL_SCOPES.inc(scope=label)
+			return hits
+
+	async def _run(self, fn: Any, *args: Any) -> Any:
+		return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+
+	async def _aembed(self, query: str) -> np.ndarray:
+		with timed("retrieval.embed_query"):
+			vec = await asyncio.wait_for(self.embedder.aembed_query(query), self.embed_timeout)
+		return normalize_rows(np.asarray(vec, dtype=np.float32))
+
+	async def asearch(
+		self,
+		query: str,
+		k: Optional[int] = None,
+		filters: Optional[Mapping[str, Sequence[str]]] = None,
+		prefer: Optional[Mapping[str, Sequence[str]]] = None,
+	) -> List[Hit]:
+		"""Event-loop friendly ``search``: the query is embedded over the async client while
+		BM25 is scored on ``executor``, and vector scoring follows on the same pool.
+
+		A stage that fails or exceeds its timeout drops that signal (the worker thread
+		finishes in the background); if both fail, ``RetrievalTimeout`` is raised.
+		"""
+		k = k or self.k
+		with timed("retrieval.search"):
+			attempts = self._attempts(filters, prefer)
+			base = attempts[-1][1]
+			bm25_job = asyncio.wait_for(self._run(self._bm25_stage, query, base), self.search_timeout)
+			if self._has_vectors:
+				bm25, q = await asyncio.gather(bm25_job, self._aembed(query), return_exceptions=True)
+			else:
+				bm25, q = (await asyncio.gather(bm25_job, return_exceptions=True))[0], None
+			if isinstance(q, BaseException):
+				log.warning("retrieval.vector_failed", error=repr(q))
+				q = None
+			if isinstance(bm25, BaseException):
+				log.warning("retrieval.bm25_failed", error=repr(bm25))
+				if q is None:
+					raise RetrievalTimeout(f"Retrieval failed for every signal: {bm25!r}")
+				bm25 = np.zeros(len(self.docs) if base is None else len(base.ids), dtype=np.float32)
+			for step, (label, scope, boost) in enumerate(attempts):
+				hits, scores = await self._run(self._attempt, k, bm25, base, scope, boost, await self._avector(q, scope))
+				if step + 1 == len(attempts) or not self._widen(hits, k, scores, bm25):
+					break
+			RETRIEVAL_SCOPES.inc(scope=label)
+			return hits
+
+	async def _avector(self, q: Optional[np.ndarray], scope: Optional[Scope]) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+		if q is None:
+			return None
+		try:
+			return q, await asyncio.wait_for(self._run(self._vector_stage, q, scope), self.search_timeout)
+		except Exception as exc:
+			log.warning("retrieval.vector_failed", error=repr(exc))
+			return None
+
+	def _batch_search(self, queries: Sequence[str], k: int, qs: Optional[np.ndarray], plans: Sequence[List[Attempt]]) -> List[Tuple[str, List[Hit]]]:
+		"""``(label, hits)`` for every query, from one BM25 pass per widest scope over its queries.
+
+		The BM25 rows of a pass are dense, so the queries of one scope are taken in blocks
+		of at most ``batch_memory`` bytes of scores. Attempts run in rounds: queries that
+		``_widen`` move to their next attempt, and the queries of a round that share a
+		scope share one vector scan.
+		"""
+		out: List[Optional[Tuple[str, List[Hit]]]] = [None] * len(queries)
+		bases: Dict[int, List[int]] = {}
+		for i, plan in enumerate(plans):
+			bases.setdefault(id(plan[-1][1]), []).append(i)
+		blocks: List[List[int]] = []
+		for members in bases.values():
+			base = plans[members[0]][-1][1]
+			rows = max(1, self.batch_memory // (4 * max(1, len(self.docs) if base is None else len(base.ids))))
+			blocks.extend(members[start:start + rows] for start in range(0, len(members), rows))
+		for members in blocks:
+			base = plans[members[0]][-1][1]
+			with timed("retrieval.bm25"):
+				if base is None:
+					bm25 = self.index.scores_batch([queries[i] for i in members])[:, :len(self.docs)]
+				else:
+					bm25 = self.index.scores_batch([queries[i] for i in members], base.ids)
+			row = {i: j for j, i in enumerate(members)}
+			pending, step = list(members), 0
+			while pending:
+				groups: Dict[int, List[int]] = {}
+				for i in pending:
+					groups.setdefault(id(plans[i][step][1]), []).append(i)
+				pending = []
+				for group in groups.values():
+					scope = plans[group[0]][step][1]
+					vec_ids = self._batch_vectors(qs, group, scope) if qs is not None else {}
+					for i in group:
+						label, _, boost = plans[i][step]
+						vec = (qs[i], vec_ids[i]) if i in vec_ids else None
+						hits, scores = self._attempt(k, bm25[row[i]], base, scope, boost, vec)
+						out[i] = (label, hits)
+						if step + 1 < len(plans[i]) and self._widen(hits, k, scores, bm25[row[i]]):
+							pending.append(i)
+				step += 1
+		return out  # type: ignore[return-value]
+
+	def _batch_vectors(self, qs: np.ndarray, members: List[int], scope: Optional[Scope]) -> Dict[int, np.ndarray]:
+		"""Vector candidates of the ``members`` rows of ``qs`` in ``scope``; empty if the scan fails."""
+		try:
+			with timed("retrieval.vector"):
+				if scope is not None:
+					rows = scope.ids[scope.ids < self.store.count]
+					found = [r for r, _ in self.store.nearest_many(qs[members], self.candidates, rows)]
+				elif self.store.ivf is not None and self.nprobe and self.nprobe < self.store.ivf.nlist:
+					found = [self._vector_stage(qs[i]) for i in members]
+				else:
+					ids, n = self.store.ids(), len(self.docs)
+					found = [f[f < n] for f in (ids[r] for r, _ in self.store.nearest_many(qs[members], self.candidates))]
+		except Exception as exc:
+			log.warning("retrieval.vector_failed", error=str(exc))
+			return {}
+		return dict(zip(members, found))
+
+	def _batch_plan(
+		self,
+		queries: Sequence[str],
+		filters: Optional[Sequence[Optional[Mapping[str, Sequence[str]]]]],
+		prefers: Optional[Sequence[Optional[Mapping[str, Sequence[str]]]]],
+	) -> List[List[Attempt]]:
+		"""``_attempts`` per query; queries with the same filters and preferences share the same scope objects."""
+		plans: Dict[Any, List[Attempt]] = {}
+		out: List[List[Attempt]] = []
+		for i in range(len(queries)):
+			f, p = filters[i] if filters else None, prefers[i] if prefers else None
+			key = tuple(tuple(sorted((name, tuple(values)) for name, values in (m or {}).items())) for m in (f, p))
+			if key not in plans:
+				plans[key] = self._attempts(f, p)
+			out.append(plans[key])
+		return out
+
+	def _embed_queries(self, texts: List[str]) -> Optional[np.ndarray]:
+		if not self._has_vectors:
+			return None
+		try:
+			with timed("retrieval.embed_query"):
+				batch = getattr(self.embedder, "embed_queries", None)
+				vecs = batch(texts) if batch is not None else [self.embedder.embed_query(t) for t in texts]
+			return normalize_rows(np.asarray(vecs, dtype=np.float32))
+		except Exception as exc:
+			log.warning("retrieval.vector_failed", error=str(exc))
+			return None
+
+	async def _aembed_queries(self, texts: List[str]) -> Optional[np.ndarray]:
+		if not self._has_vectors:
+			return None
+		try:
+			with timed("retrieval.embed_query"):
+				batch = getattr(self.embedder, "aembed_queries", None)
+				job = batch(texts) if batch is not None else asyncio.gather(*(self.embedder.aembed_query(t) for t in texts))
+				vecs = await asyncio.wait_for(job, self.embed_timeout)
+			return normalize_rows(np.asarray(vecs, dtype=np.float32))
+		except Exception as exc:
+			log.warning("retrieval.vector_failed", error=repr(exc))
+			return None
+
+	def search_batch(
+		self,
+		queries: Sequence[str],
+		k: Optional[int] = None,
+		filters: Optional[Sequence[Optional[Mapping[str, Sequence[str]]]]] = None,
+		prefers: Optional[Sequence[Optional[Mapping[str, Sequence[str]]]]] = None,
+		batch_size: int = 64,
+	) -> List[List[Hit]]:
+		"""``search`` for many queries; see ``asearch_batch``."""
+		k = k or self.k
+		plans = self._batch_plan(queries, filters, prefers)
+		out: List[List[Hit]] = []
+		with timed("retrieval.search_batch"):
+			for start in range(0, len(queries), batch_size):
+				texts = list(queries[start:start + batch_size])
+				for label, hits in self._batch_search(texts, k, self._embed_queries(texts), plans[start:start + batch_size]):
+					out.append(hits)
+					RETRIEVAL_SCOPES.inc(scope=label)
+		return out
+
+	async def asearch_batch(
+		self,
+		queries: Sequence[str],
+		k: Optional[int] = None,
+		filters: Optional[Sequence[Optional[Mapping[str, Sequence[str]]]]] = None,
+		prefers: Optional[Sequence[Optional[Mapping[str, Sequence[str]]]]] = None,
+		batch_size: int = 64,
+	) -> List[List[Hit]]:
+		"""``asearch`` for many queries (``filters[i]``/``prefers[i]`` apply to ``queries[i]``), hits in input order.
+
+		Queries go ``batch_size`` at a time: one embedding call for the batch, BM25 reading
+		each distinct term's postings once, and one matrix-matrix product per block of
+		vector rows for every group of queries with the same scope (``_batch_search``).
+		A batch may take as long as its queries would one by one (``search_timeout`` each).
+		"""
+		k = k or self.k
+		plans = self._batch_plan(queries, filters, prefers)
+		out: List[List[Hit]] = []
+		with timed("retrieval.search_batch"):
+			for start in range(0, len(queries), batch_size):
+				texts = list(queries[start:start + batch_size])
+				qs = await self._aembed_queries(texts)
+				job = self._run(self._batch_search, texts, k, qs, plans[start:start + batch_size])
+				for label, hits in await asyncio.wait_for(job, self.search_timeout * len(texts)):
+					out.append(hits)
+					RETRIEVAL_SCOPES.inc(scope=label)
+		return out
+
+	async def arescore(self, query: str, chunk_ids: Sequence[int], k: Optional[int] = None) -> List[Hit]:
+		"""Fuses BM25 and cosine for ``query`` over ``chunk_ids`` only, skipping both candidate searches."""
+		with timed("retrieval.rescore"):
+			cand = np.unique(np.asarray(chunk_ids, dtype=np.int64))
+			cand = cand[(cand >= 0) & (cand < len(self.docs))]
+			bm25_job = asyncio.wait_for(self._run(lambda: self.index.scores(query)[:len(self.docs)]), self.search_timeout)
+			q = None
+			if self._has_vectors:
+				bm25, vec = await asyncio.gather(bm25_job, asyncio.wait_for(self.embedder.aembed_query(query), self.embed_timeout), return_exceptions=True)
+				if isinstance(vec, BaseException):
+					log.warning("retrieval.vector_failed", error=repr(vec))
+				else:
+					q = normalize_rows(np.asarray(vec, dtype=np.float32))
+				if isinstance(bm25, BaseException):
+					raise bm25
+			else:
+				bm25 = await bm25_job
+			vec_ids = None if q is None else np.zeros(0, dtype=np.int64)
+			return await self._run(self._combine, k or self.k, bm25, cand, q, vec_ids)
+
+	async def _aget_relevant_documents(self, query: str, *, run_manager: Any) -> List[Document]:
+		return [_hit_document(h) for h in await self.asearch(query)]
+
+	def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+		return [_hit_document(h) for h in self.search(query)]
+
+
+def _hit_document(hit: Hit) -> Document:
+	return Document(page_content=hit.document.page_content, metadata={**hit.document.metadata, "chunk_id": hit.chunk_id, "score": hit.score})
+
+
+def _splitter() -> RecursiveCharacterTextSplitter:
+	return RecursiveCharacterTextSplitter(chunk_size=900, chunk_overlap=150)
+
+
+def count_pdf_pages(file_path: str) -> int:
+	return len(PdfReader(file_path).pages)
+
+
+def iter_pdf_pages(file_path: str, start: int = 0, stop: Optional[int] = None) -> Iterator[Document]:
+	"""Yield one Document per page in ``[start, stop)`` without materialising the rest of the file."""
+	reader = PdfReader(file_path)
+	total = len(reader.pages)
+	labels = reader.page_labels
+	for i in range(start, min(stop if stop is not None else total, total)):
+		yield Document(
+			page_content=reader.pages[i].extract_text() or "",
+			metadata={"source": file_path, "page": i, "total_pages": total, "page_label": labels[i] if i < len(labels) else str(i + 1)},
+		)
+
+
+def iter_pdf_chunks(file_path: str, start: int = 0, stop: Optional[int] = None) -> Iterator[Document]:
+	# Chunks never span pages, so splitting page by page gives the same chunks as splitting the whole file.
+	splitter = _splitter()
+	for page in iter_pdf_pages(file_path, start, stop):
+		yield from splitter.split_documents([page])
+
+
+def chunk_pdf_pages(file_path: str, start: int, stop: int) -> List[Document]:
+	return list(iter_pdf_chunks(file_path, start, stop))
 
 
 def load_pdf_and_chunk(file_path: str) -> List[Document]:
-	loader = PyPDFLoader(file_path)
-	raw_docs = loader.load()
-	splitter = RecursiveCharacterTextSplitter(chunk_size=900, chunk_overlap=150)
-	return splitter.split_documents(raw_docs)
+	return list(iter_pdf_chunks(file_path))
+
+
+def get_vector_store(settings: Settings, data_dir: Path) -> VectorStore:
+	return VectorStore(data_dir.resolve() / "vectors", settings.ollama_embed_model, settings.vector_storage, settings.vector_rescore)
 
 
-def build_or_load_docarray(docs: List[Document], settings: Settings) -> Tuple[DocArrayInMemorySearch, bool]:
+def embed_new_chunks(docs: Sequence[Document], start: int, settings: Settings, data_dir: Path, writer: Any = None) -> VectorStore:
+	"""Embed ``docs`` (global chunk ids ``start..``) and append them to the vector store.
+
+	Rows the store already holds are skipped, so this also backfills a store that
+	fell behind the chunk list (e.g. when Ollama was down during an ingest). Chunks
+	are embedded ``BACKFILL_CHUNKS`` at a time outside ``writer`` (the chunk store's
+	writer lock), which is only held to append each slice.
+	"""
+	store = get_vector_store(settings, data_dir)
 	embedder = get_embedder(settings)
-	vdb = DocArrayInMemorySearch.from_documents(docs, embedding=embedder)
-	return vdb, True
+	while store.count < start + len(docs):
+		first = max(store.count, start)
+		pending = docs[first - start:first - start + BACKFILL_CHUNKS]
+		vectors = embedder.embed_documents([d.page_content for d in pending])
+		with writer if writer is not None else nullcontext():
+			# An ingest or another process may have appended rows while this slice was embedded.
+			store = get_vector_store(settings, data_dir)
+			skip = store.count - first
+			if skip < len(pending):
+				store.append(range(first + skip, first + len(pending)), vectors[skip:], [d.metadata for d in pending[skip:]])
+	return store
+
+
+def get_bm25_index(data_dir: Path) -> BM25Index:
+	return BM25Index(data_dir.resolve() / "bm25")
+
+
+def index_new_chunks(docs: Sequence[Document], start: int, data_dir: Path) -> BM25Index:
+	index = get_bm25_index(data_dir)
+	skip = max(0, index.count - start)
+	index.add([d.page_content for d in docs[skip:]], start + skip)
+	return index
+
 
+def get_partition_index(settings: Settings, data_dir: Path) -> PartitionIndex:
+	return PartitionIndex(data_dir.resolve() / "partitions", settings.case_types)
 
-def build_or_load_bm25(docs: List[Document], data_dir: Path) -> Tuple[BM25Retriever, int]:
-	# Ensure absolute path
+
+def index_new_partitions(docs: Sequence[Document], start: int, settings: Settings, data_dir: Path) -> PartitionIndex:
+	"""Tags and partitions the chunks of ``docs`` (global ids ``start..``) the partition index does not cover yet."""
+	partitions = get_partition_index(settings, data_dir)
+	skip = max(0, partitions.count - start)
+	pending = docs[skip:]
+	if len(pending):
+		partitions.tag(pending)
+		partitions.add(pending, start + skip)
+	return partitions
+
+
+def get_chunk_store(data_dir: Path) -> ChunkStore:
 	data_dir = data_dir.resolve()
-	data_dir.mkdir(parents=True, exist_ok=True)
-	bm25_pickle = data_dir / "bm25_docs.pkl"
-	if bm25_pickle.exists():
-		with open(bm25_pickle, "rb") as f:
-			stored = pickle.load(f)
-		retriever = BM25Retriever.from_documents(stored)
-		retriever.k = 6
-		return retriever, len(stored)
-
-	with open(bm25_pickle, "wb") as f:
-		pickle.dump(docs, f)
-	retriever = BM25Retriever.from_documents(docs)
-	retriever.k = 6
-	return retriever, len(docs)
+	return ChunkStore(data_dir / "chunks", legacy_pickle=data_dir / "bm25_docs.pkl")
+
+
+def embed_documents(docs: List[Document], settings: Settings) -> List[List[float]]:
+	return get_embedder(settings).embed_documents([d.page_content for d in docs])
+
+
+def commit_chunks(
+	docs: List[Document],
+	settings: Settings,
+	data_dir: Path,
+	vectors: Optional[List[List[float]]] = None,
+	marks: Optional[Dict[str, Any]] = None,
+) -> Tuple[int, int]:
+	"""Append ``docs`` to the chunk store, BM25 index, partition index and (if given) vector store as one unit.
+
+	Chunks are tagged with their file's case type, court and year first, so the
+	tags are stored with them. Embedding happens before this call so the writer
+	lock is only held for disk writes. ``marks`` are written to the chunk manifest
+	together with the chunks (see ``ChunkStore.append``). Returns the first global
+	chunk id and the new corpus size.
+	"""
+	store = get_chunk_store(data_dir)
+	with store.writer():
+		count = store.count
+		partitions = get_partition_index(settings, data_dir)
+		index = get_bm25_index(data_dir)
+		# Only a corpus ingested before partitions existed, or a legacy corpus that was imported but
+		# never indexed, needs the stored chunks; then just the missing range is read.
+		behind = store.open_view() if min(partitions.count, index.count) < count else None
+		if behind is not None and partitions.count < count:
+			partitions = index_new_partitions(behind, 0, settings, data_dir)
+		partitions.tag(docs)
+		with timed("ingest.chunk_store"):
+			start = store.append(docs, marks)
+		with timed("ingest.bm25"):
+			if behind is not None and index.count < start:
+				index.add([d.page_content for d in behind[index.count:start]], index.count)
+			index.add([d.page_content for d in docs], start)
+		with timed("ingest.partitions"):
+			partitions.add(docs, start)
+		if vectors is not None:
+			with timed("ingest.vectors"):
+				vstore = get_vector_store(settings, data_dir)
+				if vstore.count == start:
+					vstore.append(range(start, start + len(docs)), vectors, [d.metadata for d in docs])
+	return start, start + len(docs)
+
+
+@lru_cache
+def _scoring_pool(threads: int) -> ThreadPoolExecutor:
+	return ThreadPoolExecutor(max_workers=max(1, threads), thread_name_prefix="retrieval")
 
 
 def get_hybrid_retriever(settings: Settings, data_dir: Path) -> Any:
-	# Ensure absolute path
 	data_dir = data_dir.resolve()
-	bm25_pickle = data_dir / "bm25_docs.pkl"
-	print(f"Data dir: {data_dir}")
-	print(f"BM25 pickle path: {bm25_pickle}")
-	print(f"Exists: {bm25_pickle.exists()}")
-	
-	if not bm25_pickle.exists():
-		print("Pickle not found")
-		raise RuntimeError(f"BM25 docs not found at {bm25_pickle}. Please ingest first.")
-	
+	store = get_chunk_store(data_dir)
+	manifest = store.read_manifest()
+	log.info("corpus.open", root=str(store.root), generation=manifest["generation"], chunks=manifest["count"])
+	if not manifest["count"]:
+		raise RuntimeError(f"No chunks found in {store.root}. Please ingest first.")
+
 	try:
-		print("Attempting to load pickle")
-		with open(bm25_pickle, "rb") as f:
-			docs = pickle.load(f)
-		print(f"Loaded {len(docs)} documents")
+		with timed("corpus.load_chunks"):
+			docs = store.open_view(manifest)
 	except Exception as exc:
-		print(f"Load exception: {exc}")
-		raise RuntimeError(f"Failed to load BM25 pickle from {bm25_pickle}: {exc}")
+		log.exception("corpus.load_failed", root=str(store.root))
+		raise RuntimeError(f"Failed to load chunks from {store.root}: {exc}")
+	CORPUS_CHUNKS.set(len(docs))
 
-	print("Creating BM25 retriever")
-	bm25 = BM25Retriever.from_documents(docs)
-	bm25.k = 6
+	with timed("corpus.bm25"):
+		index = get_bm25_index(data_dir)
+		if index.count < len(docs):
+			with store.writer():
+				index = index_new_chunks(docs, 0, data_dir)
+	log.debug("corpus.bm25_loaded", docs=index.count)
+
+	with timed("corpus.partitions"):
+		partitions = get_partition_index(settings, data_dir)
+		if partitions.count < len(docs):
+			with store.writer():
+				partitions = index_new_partitions(docs, 0, settings, data_dir)
+	retriever = HybridRetriever(
+		docs=docs,
+		index=index,
+		k=settings.retrieval_k,
+		candidates=settings.hybrid_candidates,
+		weights=(settings.hybrid_vector_weight, settings.hybrid_bm25_weight),
+		fusion=settings.hybrid_fusion,
+		nprobe=settings.vector_nprobe,
+		executor=_scoring_pool(settings.retrieval_threads),
+		embed_timeout=settings.retrieval_embed_timeout,
+		search_timeout=settings.retrieval_search_timeout,
+		partitions=partitions,
+		partition_routing=settings.partition_routing,
+		partition_boost=settings.partition_boost,
+		partition_evidence=settings.partition_evidence,
+		batch_memory=settings.query_batch_memory_mb << 20,
+	)
 
-	print("Attempting to create vector store")
 	try:
-		vector = DocArrayInMemorySearch.from_documents(docs, embedding=get_embedder(settings))
-		print("Vector store created successfully")
-		return EnsembleRetriever(
-			retrievers=[vector.as_retriever(search_kwargs={"k": 6}), bm25],
-			weights=[0.55, 0.45],
-		)
+		with timed("corpus.vectors"):
+			vstore = get_vector_store(settings, data_dir)
+			if vstore.count < len(docs):
+				vstore = embed_new_chunks(docs, 0, settings, data_dir, store.writer())
+			if vstore.codes_count < vstore.count:
+				with store.writer():
+					vstore.ensure_codes()
+			if settings.vector_nprobe:
+				vstore.ensure_ivf(settings.ivf_nlist, settings.ivf_min_rows)
+		log.info("corpus.vectors_loaded", vectors=vstore.count, ivf=vstore.ivf is not None, storage=vstore.storage)
+		retriever.store = vstore
+		retriever.embedder = get_embedder(settings)
 	except Exception as e:
-		print(f"Vector creation failed: {str(e)}")
-		return bm25
-
-
-
+		log.warning("corpus.vectors_failed", error=str(e))
+	return retriever
@@ -0,0 +1,549 @@
+from __future__ import annotations
+
+import json
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+_write_lock = threading.Lock()
+
+STORAGE_KINDS = ("float32", "float16", "int8", "binary")
+_CODE_DTYPES = {"float16": np.float16, "int8": np.int8, "binary": np.uint8}
+
+
+def normalize_rows(arr: np.ndarray) -> np.ndarray:
+	arr = np.ascontiguousarray(arr, dtype=np.float32)
+	norms = np.linalg.norm(arr, axis=-1, keepdims=True)
+	return arr / np.where(norms == 0, 1.0, norms)
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+	"""Indices of the ``k`` largest scores, best first, in O(n + k log k)."""
+	k = min(k, len(scores))
+	if k <= 0:
+		return np.zeros(0, dtype=np.int64)
+	top = np.argpartition(-scores, k - 1)[:k]
+	return top[np.argsort(-scores[top], kind="stable")]
+
+
+def code_width(kind: str, dim: int) -> int:
+	"""Bytes per row of ``kind`` codes."""
+	return {"float32": dim * 4, "float16": dim * 2, "int8": dim, "binary": (dim + 7) // 8}[kind]
+
+
+def encode_rows(rows: np.ndarray, kind: str, scale: Optional[np.ndarray] = None) -> np.ndarray:
+	"""Unit-norm float32 ``rows`` as ``kind`` codes: halves, per-dimension scaled int8, or sign bits."""
+	if kind == "float16":
+		return rows.astype(np.float16)
+	if kind == "int8":
+		return np.clip(np.rint(rows / scale), -127, 127).astype(np.int8)
+	if kind == "binary":
+		return np.packbits(rows > 0, axis=1)
+	raise ValueError(f"Unknown vector storage {kind!r}; expected one of {STORAGE_KINDS}")
+
+
+class IVFIndex:
+	"""Inverted-file ANN index: spherical k-means centroids plus per-list row ids (CSR).
+
+	Search scores the query against all centroids, scans the rows of the
+	``nprobe`` closest lists exactly and returns their top-k. Higher ``nprobe``
+	trades latency for recall; ``nprobe == nlist`` is an exact search.
+	"""
+
+	def __init__(self, centroids: np.ndarray, order: np.ndarray, offsets: np.ndarray, count: int):
+		self.centroids = centroids
+		self.order = order
+		self.offsets = offsets
+		self.count = count
+
+	@property
+	def nlist(self) -> int:
+		return len(self.centroids)
+
+	@classmethod
+	def build(cls, matrix: np.ndarray, nlist: int, iters: int = 10, seed: int = 0, sample: int = 50_000) -> "IVFIndex":
+		n = len(matrix)
+		nlist = max(1, min(nlist, n))
+		rng = np.random.default_rng(seed)
+		train = np.asarray(matrix[np.sort(rng.choice(n, size=min(n, max(sample, nlist * 40)), replace=False))])
+		centroids = train[rng.choice(len(train), size=nlist, replace=False)].copy()
+		for _ in range(iters):
+			assign = cls._assign(train, centroids)
+			sums = np.zeros_like(centroids)
+			np.add.at(sums, assign, train)
+			empty = np.bincount(assign, minlength=nlist) == 0
+			sums[empty] = train[rng.choice(len(train), size=int(empty.sum()))]
+			centroids = normalize_rows(sums)
+		assign = cls._assign(matrix, centroids)
+		order = np.argsort(assign, kind="stable").astype(np.int64)
+		offsets = np.concatenate([[0], np.cumsum(np.bincount(assign, minlength=nlist))]).astype(np.int64)
+		return cls(centroids, order, offsets, n)
+
+	@staticmethod
+	def _assign(matrix: np.ndarray, centroids: np.ndarray, block: int = 16_384) -> np.ndarray:
+		out = np.empty(len(matrix), dtype=np.int64)
+		for i in range(0, len(matrix), block):
+			out[i:i + block] = np.argmax(np.asarray(matrix[i:i + block]) @ centroids.T, axis=1)
+		return out
+
+	def candidates(self, q: np.ndarray, nprobe: int) -> np.ndarray:
+		lists = top_k(self.centroids @ q, max(1, nprobe))
+		return np.concatenate([self.order[self.offsets[c]:self.offsets[c + 1]] for c in lists])
+
+	def save(self, root: Path) -> None:
+		"""Write ``ivf-{count}/`` as plain ``.npy`` files so ``load`` can memory-map them."""
+		path = root / f"ivf-{self.count:012d}"
+		tmp = root / f"{path.name}.tmp{os.getpid()}"
+		shutil.rmtree(tmp, ignore_errors=True)
+		tmp.mkdir(parents=True)
+		for name in ("centroids", "order", "offsets"):
+			np.save(tmp / f"{name}.npy", getattr(self, name))
+		try:
+			os.replace(tmp, path)
+		except OSError:
+			# Another worker published the same index first.
+			shutil.rmtree(tmp, ignore_errors=True)
+		for old in root.glob("ivf-*"):
+			# Readers still mapping an old index keep it alive on POSIX; on Windows it is retried next save.
+			if old.name != path.name and ".tmp" not in old.name:
+				shutil.rmtree(old, ignore_errors=True)
+		(root / "ivf.npz").unlink(missing_ok=True)
+
+	@classmethod
+	def load(cls, root: Path) -> Optional["IVFIndex"]:
+		built = sorted(p for p in root.glob("ivf-*") if p.is_dir() and ".tmp" not in p.name)
+		if built:
+			path = built[-1]
+			arrays = [np.load(path / f"{name}.npy", mmap_mode="r") for name in ("centroids", "order", "offsets")]
+			return cls(*arrays, int(path.name[len("ivf-"):]))
+		legacy = root / "ivf.npz"
+		if not legacy.exists():
+			return None
+		with np.load(legacy) as data:
+			return cls(data["centroids"], data["order"], data["offsets"], int(data["count"]))
+
+
+class VectorStore:
+	"""Append-only float32 matrix on disk with a row sidecar.
+
+	Layout under ``root``:
+	- ``matrix.f32``  raw row-major float32 vectors, opened with ``np.memmap``
+	- ``ids.i64``     raw int64 chunk id per row, opened with ``np.memmap``
+	- ``rows.jsonl``  one ``{"id", "source", "page"}`` record per matrix row
+	- ``meta.json``   ``model``, ``dim``, ``count``, ``rows_bytes``, ``normalized`` and ``codes``
+	  (storage kind -> rows encoded); rewritten last, so anything past ``count`` rows (e.g. from
+	  a crashed append) is ignored.
+	- ``ivf-{count}/`` optional IVF index over the first ``count`` rows, memory-mapped like the matrix
+	- ``codes-{storage}.bin`` optional compact copy of the rows (``float16``, ``int8`` or
+	  ``binary``); ``int8`` also keeps its per-dimension scale in ``codes-int8.scale.npy``
+
+	Rows are L2-normalised on append, so cosine similarity is a plain dot product. With a
+	compact ``storage``, searches scan the codes and rescore the top ``k * rescore`` rows
+	from the float32 matrix, so only those rows of it are read.
+	"""
+
+	def __init__(self, root: Path, model: str, storage: str = "float32", rescore: int = 4):
+		if storage not in STORAGE_KINDS:
+			raise ValueError(f"Unknown vector storage {storage!r}; expected one of {STORAGE_KINDS}")
+		self.root = root
+		self.model = model
+		self.storage = storage
+		self.rescore = max(1, rescore)
+		self.matrix_path = root / "matrix.f32"
+		self.rows_path = root / "rows.jsonl"
+		self.ids_path = root / "ids.i64"
+		self.meta_path = root / "meta.json"
+		self.root.mkdir(parents=True, exist_ok=True)
+		self.meta = self._read_meta()
+		if self.meta.get("model") != model:
+			self.meta = {"model": model, "dim": 0, "count": 0, "rows_bytes": 0, "normalized": True}
+		# Stores written before rows were normalised keep the slower per-row-norm search.
+		self.meta.setdefault("normalized", not self.meta.get("count"))
+		self._matrix: Optional[np.ndarray] = None
+		self._ids: Optional[np.ndarray] = None
+		self._codes: Optional[np.ndarray] = None
+		self._scale: Optional[np.ndarray] = None
+		self.ivf: Optional[IVFIndex] = None
+
+	@property
+	def count(self) -> int:
+		return int(self.meta.get("count", 0))
+
+	@property
+	def dim(self) -> int:
+		return int(self.meta.get("dim", 0))
+
+	def _read_meta(self) -> Dict[str, Any]:
+		if not self.meta_path.exists():
+			return {}
+		with open(self.meta_path, "r", encoding="utf-8") as f:
+			return json.load(f)
+
+	def _write_meta(self, meta: Dict[str, Any]) -> None:
+		tmp = self.meta_path.with_suffix(".json.tmp")
+		with open(tmp, "w", encoding="utf-8") as f:
+			json.dump(meta, f)
+			f.flush()
+			os.fsync(f.fileno())
+		os.replace(tmp, self.meta_path)
+
+	def append(self, ids: Sequence[int], vectors: Sequence[Sequence[float]], metadatas: Sequence[Dict[str, Any]]) -> int:
+		arr = normalize_rows(np.asarray(vectors, dtype=np.float32))
+		if arr.size == 0:
+			return self.count
+		if arr.ndim != 2 or arr.shape[0] != len(ids):
+			raise ValueError(f"Expected {len(ids)} vectors, got array of shape {arr.shape}")
+
+		with _write_lock:
+			meta = dict(self.meta)
+			if meta["count"] and arr.shape[1] != meta["dim"]:
+				raise ValueError(f"Embedding dim {arr.shape[1]} does not match store dim {meta['dim']}")
+			meta["dim"] = int(arr.shape[1])
+
+			row_bytes = meta["dim"] * 4
+			mode = "r+b" if self.matrix_path.exists() and meta["count"] else "wb"
+			with open(self.matrix_path, mode) as f:
+				f.seek(meta["count"] * row_bytes)
+				f.write(np.ascontiguousarray(arr).tobytes())
+				f.truncate()
+				f.flush()
+				os.fsync(f.fileno())
+
+			lines = "".join(
+				json.dumps({"id": int(i), "source": m.get("source"), "page": m.get("page")}) + "\n"
+				for i, m in zip(ids, metadatas)
+			).encode("utf-8")
+			mode = "r+b" if self.rows_path.exists() and meta["rows_bytes"] else "wb"
+			with open(self.rows_path, mode) as f:
+				f.seek(meta["rows_bytes"])
+				f.write(lines)
+				f.truncate()
+				f.flush()
+				os.fsync(f.fileno())
+
+			# Stores created before ids.i64 existed get it backfilled from rows.jsonl on their next append.
+			ids_arr = np.asarray(list(ids), dtype=np.int64)
+			have = meta.get("ids_count", 0)
+			if have != meta["count"]:
+				ids_arr = np.concatenate([self.ids()[:meta["count"]], ids_arr])
+				have = 0
+			with open(self.ids_path, "r+b" if self.ids_path.exists() and have else "wb") as f:
+				f.seek(have * 8)
+				f.write(ids_arr.tobytes())
+				f.truncate()
+				f.flush()
+				os.fsync(f.fileno())
+
+			meta["count"] += arr.shape[0]
+			meta["ids_count"] = meta["count"]
+			meta["rows_bytes"] += len(lines)
+			self._write_meta(meta)
+			self.meta = meta
+			self._matrix = None
+			self._ids = None
+		if self.storage != "float32":
+			self.ensure_codes()
+		return self.count
+
+	def matrix(self) -> np.ndarray:
+		if self._matrix is None:
+			if not self.count:
+				self._matrix = np.zeros((0, self.dim), dtype=np.float32)
+			else:
+				self._matrix = np.memmap(self.matrix_path, dtype=np.float32, mode="r", shape=(self.count, self.dim))
+		return self._matrix
+
+	def ids(self) -> np.ndarray:
+		if self._ids is None and self.count and self.meta.get("ids_count") == self.count:
+			self._ids = np.memmap(self.ids_path, dtype=np.int64, mode="r", shape=(self.count,))
+		if self._ids is None:
+			ids: List[int] = []
+			if self.count:
+				with open(self.rows_path, "rb") as f:
+					data = f.read(self.meta["rows_bytes"])
+				ids = [json.loads(line)["id"] for line in data.splitlines() if line]
+			self._ids = np.asarray(ids, dtype=np.int64)
+		return self._ids
+
+	def _reload_meta(self) -> None:
+		# Another process may have appended since this store was opened; never write back an older count.
+		disk = self._read_meta()
+		if disk.get("model") == self.model and disk.get("count", 0) >= self.count:
+			self.meta = {**disk, "normalized": disk.get("normalized", self.meta["normalized"])}
+			self._matrix = None
+			self._ids = None
+
+	def codes_path(self, kind: str) -> Path:
+		return self.root / f"codes-{kind}.bin"
+
+	def _scale_path(self) -> Path:
+		return self.root / "codes-int8.scale.npy"
+
+	@property
+	def codes_count(self) -> int:
+		return int(self.meta.get("codes", {}).get(self.storage, 0)) if self.storage != "float32" else self.count
+
+	def ensure_codes(self, rebuild: bool = False, block: int = 65_536) -> int:
+		"""Encodes the rows missing from the ``storage`` codes file; ``rebuild`` re-encodes every row
+		(refitting the int8 scale, which is otherwise fitted once on the rows present at first encode)."""
+		if self.storage == "float32":
+			return self.count
+		with _write_lock:
+			self._reload_meta()
+			meta = dict(self.meta)
+			codes = dict(meta.get("codes", {}))
+			have = 0 if rebuild else min(int(codes.get(self.storage, 0)), meta["count"])
+			if have >= meta["count"]:
+				return have
+			matrix = self._search_matrix()
+			scale = None
+			if self.storage == "int8":
+				if have and self._scale_path().exists():
+					scale = np.load(self._scale_path())
+				else:
+					sample = np.asarray(matrix[:: max(1, len(matrix) // 50_000)])
+					scale = np.maximum(np.abs(sample).max(axis=0), 1e-6).astype(np.float32) / 127
+					np.save(self._scale_path(), scale)
+			width = code_width(self.storage, meta["dim"])
+			path = self.codes_path(self.storage)
+			with open(path, "r+b" if path.exists() and have else "wb") as f:
+				f.seek(have * width)
+				for i in range(have, meta["count"], block):
+					f.write(encode_rows(np.asarray(matrix[i:i + block], dtype=np.float32), self.storage, scale).tobytes())
+				f.truncate()
+				f.flush()
+				os.fsync(f.fileno())
+			codes[self.storage] = meta["count"]
+			meta["codes"] = codes
+			self._write_meta(meta)
+			self.meta = meta
+			self._codes = None
+			self._scale = None
+		return self.count
+
+	def drop_codes(self, kind: str) -> None:
+		with _write_lock:
+			self._reload_meta()
+			meta = dict(self.meta)
+			meta["codes"] = {k: v for k, v in meta.get("codes", {}).items() if k != kind}
+			self._write_meta(meta)
+			self.meta = meta
+			self.codes_path(kind).unlink(missing_ok=True)
+			if kind == "int8":
+				self._scale_path().unlink(missing_ok=True)
+
+	def codes(self) -> Optional[np.ndarray]:
+		"""The memory-mapped ``storage`` codes (``codes_count`` rows), or None for float32 storage."""
+		if self.storage == "float32" or not self.codes_count:
+			return None
+		if self._codes is None:
+			shape = (self.codes_count, code_width(self.storage, self.dim) // np.dtype(_CODE_DTYPES[self.storage]).itemsize)
+			self._codes = np.memmap(self.codes_path(self.storage), dtype=_CODE_DTYPES[self.storage], mode="r", shape=shape)
+			if self.storage == "int8":
+				self._scale = np.load(self._scale_path())
+		return self._codes
+
+	def nbytes(self) -> Dict[str, int]:
+		"""Bytes a full scan reads: the float32 matrix and each encoded codes file."""
+		out = {"float32": self.count * self.dim * 4}
+		for kind, rows in self.meta.get("codes", {}).items():
+			out[kind] = int(rows) * code_width(kind, self.dim)
+		return out
+
+	def ensure_ivf(self, nlist: int = 0, min_rows: int = 20_000, rebuild_ratio: float = 0.2) -> Optional[IVFIndex]:
+		"""Load the newest ``ivf-*`` index, (re)building it when missing or when too many rows arrived since."""
+		if self.count < min_rows:
+			self.ivf = None
+			return None
+		ivf = IVFIndex.load(self.root)
+		if ivf is None or ivf.count > self.count or (self.count - ivf.count) > rebuild_ratio * ivf.count:
+			nlist = nlist or int(4 * np.sqrt(self.count))
+			ivf = IVFIndex.build(self._search_matrix(), nlist)
+			ivf.save(self.root)
+		self.ivf = ivf
+		return ivf
+
+	def _search_matrix(self) -> np.ndarray:
+		matrix = self.matrix()
+		return matrix if self.meta["normalized"] else normalize_rows(matrix)
+
+	def scores(self, q: np.ndarray, rows: Optional[np.ndarray] = None) -> np.ndarray:
+		matrix = self.matrix() if rows is None else self.matrix()[rows]
+		scores = np.asarray(matrix @ q)
+		if not self.meta["normalized"]:
+			norms = np.linalg.norm(matrix, axis=1)
+			scores = scores / np.where(norms == 0, 1.0, norms)
+		return scores
+
+	def _code_scores(self, q: np.ndarray, rows: Optional[np.ndarray], block: int = 4096) -> np.ndarray:
+		# Small blocks keep the float32 copy of each block in cache; int8 then scans about as fast as float32.
+		codes = self.codes()
+		n = len(codes) if rows is None else len(rows)
+		# int8 codes are x / scale per dimension, so folding the scale into q keeps the scan on raw codes.
+		qq = q * self._scale if self.storage == "int8" else q
+		out = np.empty(n, dtype=np.float32)
+		for i in range(0, n, block):
+			chunk = np.asarray(codes[i:i + block] if rows is None else codes[rows[i:i + block]])
+			if self.storage == "binary":
+				# Sum of q over the set bits ranks rows like their dot product with sign(x).
+				chunk = np.unpackbits(chunk, axis=1, count=self.dim)
+			out[i:i + block] = chunk.astype(np.float32) @ qq
+		return out
+
+	def nearest(self, q: np.ndarray, k: int, rows: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+		"""``(rows, cosines)`` of the ``k`` best of ``rows`` (every row when None) for unit-norm ``q``, best first.
+
+		With compact codes, ``k * rescore`` rows are preselected on the codes and rescored exactly;
+		rows past ``codes_count`` (appended by a writer without codes) are always rescored.
+		"""
+		if self.codes() is None:
+			scores = self.scores(q, rows)
+			top = top_k(scores, k)
+			return (top if rows is None else rows[top]), scores[top]
+		n = self.codes_count
+		if rows is None:
+			coded, tail = None, np.arange(n, self.count)
+		else:
+			coded, tail = rows[rows < n], rows[rows >= n]
+		pre = top_k(self._code_scores(q, coded), k * self.rescore)
+		# Ascending rows read the float32 matrix front to back.
+		cand = np.sort(np.concatenate([pre if coded is None else coded[pre], tail]))
+		scores = self.scores(q, cand)
+		top = top_k(scores, k)
+		return cand[top], scores[top]
+
+	def nearest_many(self, qs: np.ndarray, k: int, rows: Optional[np.ndarray] = None, block: int = 16_384) -> List[Tuple[np.ndarray, np.ndarray]]:
+		"""``nearest`` over ``rows`` (every row when None) for each unit-norm row of ``qs``, scanning the
+		matrix (or the codes) once: each block of rows is scored for all queries with one matrix-matrix product."""
+		codes = self.codes()
+		scan = self.codes_count if codes is not None else self.count
+		keep = k * self.rescore if codes is not None else k
+		if rows is None:
+			picked, tail = None, np.arange(scan, self.count)
+		else:
+			picked, tail = rows[rows < scan], rows[rows >= scan]
+		total = scan if picked is None else len(picked)
+		if codes is not None and self.storage == "int8":
+			qq = qs * self._scale
+		else:
+			qq = qs
+		best_rows = np.zeros((len(qs), 0), dtype=np.int64)
+		best_scores = np.zeros((len(qs), 0), dtype=np.float32)
+		for i in range(0, total, block):
+			at = np.arange(i, min(i + block, total), dtype=np.int64) if picked is None else picked[i:i + block]
+			sel = slice(i, i + block) if picked is None else at
+			if codes is None:
+				chunk = np.asarray(self.matrix()[sel])
+				scores = (chunk @ qs.T).T
+				if not self.meta["normalized"]:
+					norms = np.linalg.norm(chunk, axis=1)
+					scores = scores / np.where(norms == 0, 1.0, norms)
+			else:
+				chunk = np.asarray(codes[sel])
+				if self.storage == "binary":
+					chunk = np.unpackbits(chunk, axis=1, count=self.dim)
+				scores = (chunk.astype(np.float32) @ qq.T).T
+			best_rows = np.concatenate([best_rows, np.broadcast_to(at, scores.shape)], axis=1)
+			best_scores = np.concatenate([best_scores, scores], axis=1)
+			if best_scores.shape[1] > keep:
+				top = np.argpartition(-best_scores, keep - 1, axis=1)[:, :keep]
+				best_rows = np.take_along_axis(best_rows, top, axis=1)
+				best_scores = np.take_along_axis(best_scores, top, axis=1)
+		out: List[Tuple[np.ndarray, np.ndarray]] = []
+		for q, found, scores in zip(qs, best_rows, best_scores):
+			if codes is not None:
+				# Rescore the preselected rows (and any rows past the codes) exactly, as ``nearest`` does.
+				found = np.sort(np.concatenate([found, tail]))
+				scores = self.scores(q, found)
+			top = top_k(scores, k)
+			out.append((found[top], scores[top]))
+		return out
+
+	def search(self, query: Sequence[float], k: int, nprobe: Optional[int] = None) -> List[Tuple[int, float]]:
+		if not self.count:
+			return []
+		q = normalize_rows(np.asarray(query, dtype=np.float32))
+		ivf = self.ivf
+		if ivf is not None and nprobe and nprobe < ivf.nlist:
+			# Rows appended after the IVF build are scanned exactly.
+			rows, scores = self.nearest(q, k, np.concatenate([ivf.candidates(q, nprobe), np.arange(ivf.count, self.count)]))
+		else:
+			rows, scores = self.nearest(q, k)
+		ids = self.ids()
+		return [(int(ids[r]), float(sc)) for r, sc in zip(rows, scores)]
+
+
+def benchmark_recall(store: VectorStore, k: int = 10, queries: int = 200, nprobes: Sequence[int] = (1, 2, 4, 8, 16, 32), seed: int = 0) -> List[Dict[str, float]]:
+	"""Recall@k and mean latency of IVF search against exact search on perturbed stored rows."""
+	rng = np.random.default_rng(seed)
+	matrix = store.matrix()
+	picks = rng.choice(store.count, size=min(queries, store.count), replace=False)
+	qs = np.asarray(matrix[picks]) + rng.normal(scale=0.05, size=(len(picks), store.dim)).astype(np.float32)
+
+	started = time.perf_counter()
+	truth = [{i for i, _ in store.search(q, k)} for q in qs]
+	exact_ms = (time.perf_counter() - started) * 1000 / len(qs)
+
+	results: List[Dict[str, float]] = [{"nprobe": 0, "recall": 1.0, "ms_per_query": round(exact_ms, 3)}]
+	for nprobe in nprobes:
+		if store.ivf is None or nprobe >= store.ivf.nlist:
+			break
+		started = time.perf_counter()
+		found = [{i for i, _ in store.search(q, k, nprobe=nprobe)} for q in qs]
+		ms = (time.perf_counter() - started) * 1000 / len(qs)
+		recall = float(np.mean([len(f & t) / max(1, len(t)) for f, t in zip(found, truth)]))
+		results.append({"nprobe": nprobe, "recall": round(recall, 4), "ms_per_query": round(ms, 3)})
+	return results
+
+
+def benchmark_quantization(
+	store: VectorStore,
+	kinds: Sequence[str] = ("float16", "int8", "binary"),
+	rescores: Sequence[int] = (1, 4, 10),
+	k: int = 10,
+	queries: int = 200,
+	seed: int = 0,
+) -> List[Dict[str, Any]]:
+	"""Bytes scanned per full search against recall@k lost, for each compact storage and rescore factor.
+
+	Ground truth is the exact float32 top-k of perturbed stored rows; codes missing
+	for a kind are encoded into ``store.root`` first.
+	"""
+	rng = np.random.default_rng(seed)
+	exact = VectorStore(store.root, store.model)
+	matrix = exact.matrix()
+	picks = rng.choice(exact.count, size=min(queries, exact.count), replace=False)
+	qs = normalize_rows(np.asarray(matrix[picks]) + rng.normal(scale=0.05, size=(len(picks), exact.dim)).astype(np.float32))
+
+	started = time.perf_counter()
+	truth = [set(exact.nearest(q, k)[0].tolist()) for q in qs]
+	exact_ms = (time.perf_counter() - started) * 1000 / len(qs)
+	full = exact.nbytes()["float32"]
+	results: List[Dict[str, Any]] = [
+		{"storage": "float32", "rescore": 0, "bytes": full, "saved_pct": 0.0, "recall": 1.0, "ms_per_query": round(exact_ms, 3)}
+	]
+	for kind in kinds:
+		for rescore in rescores:
+			quant = VectorStore(store.root, store.model, kind, rescore)
+			quant.ensure_codes()
+			started = time.perf_counter()
+			found = [set(quant.nearest(q, k)[0].tolist()) for q in qs]
+			ms = (time.perf_counter() - started) * 1000 / len(qs)
+			recall = float(np.mean([len(f & t) / max(1, len(t)) for f, t in zip(found, truth)]))
+			size = quant.nbytes()[kind]
+			results.append({
+				"storage": kind,
+				"rescore": rescore,
+				"bytes": size,
+				"saved_pct": round(100 * (1 - size / full), 1),
+				"recall": round(recall, 4),
+				"recall_lost": round(1 - recall, 4),
+				"ms_per_query": round(ms, 3),
+			})
+	return results
@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import httpx
+
+from backend.core.log import get_logger
+from backend.core.settings import Settings
+from backend.services.admission import ollama_urls
+from backend.services.metrics import timed
+
+
+log = get_logger(__name__)
+
+PENDING, RUNNING, DONE, DEGRADED, SKIPPED = "pending", "running", "done", "degraded", "skipped"
+
+
+class Warmup:
+	"""Startup work run from the app lifespan, after the server is already accepting connections.
+
+	Steps, in order: ``index`` opens the corpus generation (maps chunks, vectors
+	and BM25 segments and builds the chains), ``ollama`` checks every backend
+	answers ``/api/version``, ``chat_model`` and ``embed_model`` load the models
+	with ``OLLAMA_KEEP_ALIVE`` so the first query does not pay for it, and
+	``search`` runs one query to fault in the index pages. A failed step is
+	recorded and the rest still run; the state becomes ``done`` or ``degraded``.
+	A degraded warm-up re-runs the steps that failed or never ran after
+	``WARMUP_RETRY`` seconds, doubling up to ``WARMUP_RETRY_MAX``, until it is done.
+	"""
+
+	def __init__(self, settings: Settings, registry: Any):
+		self.settings = settings
+		self.registry = registry
+		self.state = PENDING
+		self.steps: Dict[str, Dict[str, Any]] = {}
+		self.started_at: Optional[float] = None
+		self.seconds: Optional[float] = None
+		self.retries = 0
+
+	@property
+	def finished(self) -> bool:
+		return self.state in (DONE, DEGRADED, SKIPPED)
+
+	@property
+	def ready(self) -> bool:
+		return self.state in (DONE, SKIPPED)
+
+	def skip(self) -> None:
+		self.state = SKIPPED
+
+	async def _step(self, name: str, fn: Callable[[], Awaitable[Optional[str]]]) -> bool:
+		started = time.perf_counter()
+		try:
+			with timed(f"warmup.{name}"):
+				status = await fn() or "ok"
+		except Exception as exc:
+			self.steps[name] = {"status": "failed", "ms": round((time.perf_counter() - started) * 1000, 1), "error": str(exc)}
+			log.warning("warmup.step_failed", step=name, error=str(exc))
+			return False
+		self.steps[name] = {"status": status, "ms": round((time.perf_counter() - started) * 1000, 1)}
+		return True
+
+	async def _once(self, name: str, fn: Callable[[], Awaitable[Optional[str]]]) -> bool:
+		"""``_step`` unless an earlier pass already ran it successfully."""
+		if self.steps.get(name, {}).get("status", "failed") != "failed":
+			return True
+		return await self._step(name, fn)
+
+	async def _pass(self) -> None:
+		indexed = await self._once("index", self._index)
+		async with httpx.AsyncClient(timeout=self.settings.ollama_timeout) as client:
+			if await self._once("ollama", lambda: self._ollama(client)):
+				await self._once("chat_model", lambda: self._pin(client, "/api/generate", {"model": self.settings.ollama_model}))
+				await self._once(
+					"embed_model",
+					lambda: self._pin(client, "/api/embed", {"model": self.settings.ollama_embed_model, "input": "warm-up"}),
+				)
+		if indexed and self.steps["index"]["status"] == "ok":
+			await self._once("search", self._search)
+
+	async def run(self) -> None:
+		self.state = RUNNING
+		self.started_at = time.time()
+		started = time.perf_counter()
+		delay = self.settings.warmup_retry
+		while True:
+			await self._pass()
+			self.seconds = round(time.perf_counter() - started, 3)
+			self.state = DONE if all(s["status"] != "failed" for s in self.steps.values()) else DEGRADED
+			log.info("warmup.finished", state=self.state, seconds=self.seconds, retries=self.retries, steps={k: s["status"] for k, s in self.steps.items()})
+			if self.state == DONE:
+				return
+			await asyncio.sleep(delay)
+			delay = min(delay * 2, self.settings.warmup_retry_max)
+			self.retries += 1
+
+	async def _index(self) -> Optional[str]:
+		if not self.registry.store.read_manifest()["count"]:
+			return "empty"
+		await asyncio.to_thread(self.registry.current)
+		return None
+
+	async def _ollama(self, client: httpx.AsyncClient) -> None:
+		for url in ollama_urls(self.settings):
+			resp = await client.get(f"{url}/api/version")
+			resp.raise_for_status()
+
+	async def _pin(self, client: httpx.AsyncClient, path: str, body: Dict[str, Any]) -> None:
+		# A request without a prompt only loads the model; keep_alive decides how long it stays loaded.
+		for url in ollama_urls(self.settings):
+			resp = await client.post(f"{url}{path}", json={**body, "keep_alive": self.settings.ollama_keep_alive})
+			resp.raise_for_status()
+
+	async def _search(self) -> None:
+		gen = self.registry.current()
+		await gen.retriever.asearch("warm-up")
+
+	def stats(self) -> Dict[str, Any]:
+		return {"state": self.state, "seconds": self.seconds, "retries": self.retries, "steps": dict(self.steps)}
@@ -0,0 +1,58 @@
+from __future__ import annotations
+
+import argparse
+import json
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from backend.core.settings import get_settings
+from backend.services.vector_store import STORAGE_KINDS, VectorStore, benchmark_quantization, benchmark_recall
+
+
+def _synthetic_store(root: Path, rows: int, dim: int, clusters: int, seed: int) -> VectorStore:
+	rng = np.random.default_rng(seed)
+	centers = rng.normal(size=(clusters, dim)).astype(np.float32)
+	store = VectorStore(root, "synthetic")
+	for start in range(0, rows, 50_000):
+		n = min(50_000, rows - start)
+		vectors = centers[rng.integers(0, clusters, size=n)] + rng.normal(scale=0.6, size=(n, dim)).astype(np.float32)
+		store.append(range(start, start + n), vectors, [{}] * n)
+	return store
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser(
+		description="Recall@k and latency of IVF vector search, or with --storage of compact vector codes, against exact search."
+	)
+	parser.add_argument("--synthetic", type=int, default=0, help="Benchmark N synthetic rows instead of the data dir's store")
+	parser.add_argument("--dim", type=int, default=768)
+	parser.add_argument("--k", type=int, default=10)
+	parser.add_argument("--queries", type=int, default=200)
+	parser.add_argument("--nlist", type=int, default=0, help="IVF lists (default 4*sqrt(N))")
+	parser.add_argument("--nprobe", type=int, nargs="*", default=[1, 2, 4, 8, 16, 32, 64])
+	parser.add_argument("--storage", nargs="*", choices=STORAGE_KINDS[1:], default=None, help="Compare compact storages instead of IVF")
+	parser.add_argument("--rescore", type=int, nargs="*", default=[1, 4, 10], help="Rescore factors for --storage")
+	args = parser.parse_args()
+
+	with tempfile.TemporaryDirectory() as tmp:
+		if args.synthetic:
+			store = _synthetic_store(Path(tmp), args.synthetic, args.dim, clusters=max(8, args.synthetic // 500), seed=0)
+		else:
+			settings = get_settings()
+			store = VectorStore(settings.data_dir.resolve() / "vectors", settings.ollama_embed_model)
+		if args.storage is not None:
+			results = benchmark_quantization(store, args.storage or STORAGE_KINDS[1:], args.rescore, k=args.k, queries=args.queries)
+			print(json.dumps({"rows": store.count, "dim": store.dim, "k": args.k, "results": results}, indent=2))
+			return
+		started = time.perf_counter()
+		store.ensure_ivf(args.nlist, min_rows=1)
+		build_s = time.perf_counter() - started
+		results = benchmark_recall(store, k=args.k, queries=args.queries, nprobes=args.nprobe)
+		print(json.dumps({"rows": store.count, "dim": store.dim, "nlist": store.ivf.nlist, "build_seconds": round(build_s, 2), "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,46 @@
+from __future__ import annotations
+
+import argparse
+import json
+import time
+
+from backend.core.settings import get_settings
+from backend.services.retrieval import get_chunk_store
+from backend.services.vector_store import STORAGE_KINDS, VectorStore
+
+
+def main() -> None:
+	parser = argparse.ArgumentParser(description="Encode the data dir's vector store as compact codes for VECTOR_STORAGE.")
+	parser.add_argument("--storage", choices=STORAGE_KINDS, default=None, help="Target storage (default: VECTOR_STORAGE)")
+	parser.add_argument("--rebuild", action="store_true", help="Re-encode every row, refitting the int8 scale")
+	parser.add_argument("--drop-others", action="store_true", help="Delete codes of the other storages")
+	args = parser.parse_args()
+
+	settings = get_settings()
+	data_dir = settings.data_dir.resolve()
+	storage = args.storage or settings.vector_storage
+	# Same lock as ingest, so no rows are appended while they are encoded.
+	with get_chunk_store(data_dir).writer():
+		store = VectorStore(data_dir / "vectors", settings.ollama_embed_model, storage)
+		started = time.perf_counter()
+		store.ensure_codes(rebuild=args.rebuild)
+		seconds = time.perf_counter() - started
+		if args.drop_others:
+			for kind in STORAGE_KINDS[1:]:
+				if kind != storage:
+					store.drop_codes(kind)
+	sizes = store.nbytes()
+	print(json.dumps({
+		"rows": store.count,
+		"dim": store.dim,
+		"storage": storage,
+		"seconds": round(seconds, 2),
+		"bytes": sizes,
+		"saved_pct": round(100 * (1 - sizes.get(storage, sizes["float32"]) / max(1, sizes["float32"])), 1),
+	}, indent=2))
+	if storage != settings.vector_storage:
+		print(f"Set VECTOR_STORAGE={storage} for the server to search these codes.")
+
+
+if __name__ == "__main__":
+	main()
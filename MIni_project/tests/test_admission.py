@@ -0,0 +1,148 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from backend.services.admission import EMBED, GENERATE, AdmissionController, Overloaded
+
+
+def _controller(urls=("http://a",), generate=1, embed=1, queue_size=2, timeout=1.0):
+	return AdmissionController(list(urls), {GENERATE: generate, EMBED: embed}, queue_size, timeout)
+
+
+def _in_flight(controller, kind=GENERATE):
+	return [b.in_flight[kind] for b in controller.backends]
+
+
+def test_slots_go_to_the_least_loaded_backend():
+	controller = _controller(urls=("http://a", "http://b"), generate=2)
+	taken = [controller.acquire(GENERATE) for _ in range(4)]
+	assert [b.url for b in taken] == ["http://a", "http://b", "http://a", "http://b"]
+	assert _in_flight(controller) == [2, 2]
+	controller.release(GENERATE, taken[1])
+	assert controller.acquire(GENERATE).url == "http://b"
+
+
+def test_kinds_have_separate_limits():
+	controller = _controller(queue_size=0)
+	controller.acquire(GENERATE)
+	assert controller.acquire(EMBED).url == "http://a"
+	with pytest.raises(Overloaded):
+		controller.acquire(GENERATE)
+
+
+def test_a_full_queue_sheds_with_429():
+	controller = _controller(queue_size=0)
+	controller.acquire(GENERATE)
+	with pytest.raises(Overloaded) as info:
+		controller.acquire(GENERATE)
+	assert info.value.status_code == 429 and info.value.reason == "queue_full"
+	assert info.value.retry_after >= 1
+
+
+def test_a_wait_past_the_timeout_sheds_with_503_and_leaves_the_queue():
+	controller = _controller(timeout=0.05)
+	controller.acquire(GENERATE)
+	started = time.monotonic()
+	with pytest.raises(Overloaded) as info:
+		controller.acquire(GENERATE)
+	assert info.value.status_code == 503 and info.value.reason == "queue_timeout"
+	assert time.monotonic() - started < 1.0
+	assert controller.stats()["queued"][GENERATE] == 0
+
+
+def test_release_hands_the_slot_to_the_oldest_waiter():
+	controller = _controller(queue_size=2, timeout=5.0)
+	backend = controller.acquire(GENERATE)
+	order = []
+
+	def wait(name):
+		with controller.slot(GENERATE):
+			order.append(name)
+			time.sleep(0.01)
+
+	threads = []
+	for name in ("first", "second"):
+		threads.append(threading.Thread(target=wait, args=(name,)))
+		threads[-1].start()
+		while controller.stats()["queued"][GENERATE] < len(threads):
+			time.sleep(0.001)
+	controller.release(GENERATE, backend)
+	for t in threads:
+		t.join()
+	assert order == ["first", "second"]
+	assert _in_flight(controller) == [0]
+
+
+def test_retry_after_follows_how_long_slots_are_held():
+	controller = _controller(urls=("http://a", "http://b"), queue_size=0)
+	for _ in range(2):
+		controller.release(GENERATE, controller.acquire(GENERATE), held=11.0)
+	# 0.8 * (0.8 * 1 + 0.2 * 11) + 0.2 * 11 = 4.6 seconds per slot, over two slots.
+	controller.acquire(GENERATE)
+	controller.acquire(GENERATE)
+	with pytest.raises(Overloaded) as info:
+		controller.acquire(GENERATE)
+	assert info.value.retry_after == 3
+
+
+def test_async_waiters_are_granted_and_cancelled_waiters_return_the_slot():
+	async def scenario():
+		controller = _controller(timeout=5.0)
+		backend = await controller.aacquire(GENERATE)
+		waiter = asyncio.create_task(controller.aacquire(GENERATE))
+		await asyncio.sleep(0.01)
+		assert controller.stats()["queued"][GENERATE] == 1
+		controller.release(GENERATE, backend)
+		assert (await waiter) is backend
+		assert _in_flight(controller) == [1]
+
+		cancelled = asyncio.create_task(controller.aacquire(GENERATE))
+		await asyncio.sleep(0.01)
+		cancelled.cancel()
+		with pytest.raises(asyncio.CancelledError):
+			await cancelled
+		assert controller.stats()["queued"][GENERATE] == 0
+		controller.release(GENERATE, backend)
+		assert _in_flight(controller) == [0]
+
+		async with controller.aslot(GENERATE) as held:
+			assert held is backend and _in_flight(controller) == [1]
+		assert _in_flight(controller) == [0]
+
+	asyncio.run(scenario())
+
+
+def test_async_waits_time_out_with_503():
+	async def scenario():
+		controller = _controller(timeout=0.05)
+		await controller.aacquire(GENERATE)
+		with pytest.raises(Overloaded) as info:
+			await controller.aacquire(GENERATE)
+		assert info.value.status_code == 503
+		assert controller.stats()["queued"][GENERATE] == 0
+
+	asyncio.run(scenario())
+
+
+def test_slots_never_exceed_the_limit_under_contention():
+	controller = _controller(urls=("http://a", "http://b"), generate=2, queue_size=64, timeout=10.0)
+	peak = [0]
+	lock = threading.Lock()
+
+	def work():
+		with controller.slot(GENERATE):
+			with lock:
+				peak[0] = max(peak[0], sum(_in_flight(controller)))
+				assert all(n <= 2 for n in _in_flight(controller))
+			time.sleep(0.002)
+
+	threads = [threading.Thread(target=work) for _ in range(32)]
+	for t in threads:
+		t.start()
+	for t in threads:
+		t.join()
+	assert peak[0] <= 4
+	assert _in_flight(controller) == [0, 0]
+	assert controller.stats()["queued"][GENERATE] == 0
@@ -0,0 +1,103 @@
+import zlib
+
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+
+from backend.core.settings import Settings
+from backend.services import retrieval
+from backend.services.vector_store import normalize_rows
+
+
+DIM = 64
+
+
+class _Embedder:
+	def embed_documents(self, texts):
+		out = np.zeros((len(texts), DIM), dtype=np.float32)
+		for row, text in zip(out, texts):
+			for word in text.split():
+				row[zlib.crc32(word.encode()) % DIM] += 1.0
+		return out.tolist()
+
+
+@pytest.fixture
+def settings(tmp_path, monkeypatch):
+	monkeypatch.setenv("DATA_DIR", str(tmp_path / "data"))
+	monkeypatch.setattr(retrieval, "get_embedder", lambda settings: _Embedder())
+	settings = Settings()
+	settings.data_dir.mkdir(parents=True)
+	return settings
+
+
+def _batch(start, n):
+	# Each chunk has a term of its own, so BM25 finds exactly it.
+	return [
+		Document(page_content=f"tok{i} judgment of the court on page {i}", metadata={"source": f"file{i // 25}.pdf", "page": i % 25})
+		for i in range(start, start + n)
+	]
+
+
+def _commit(settings, docs, embed=True):
+	vectors = _Embedder().embed_documents([d.page_content for d in docs]) if embed else None
+	return retrieval.commit_chunks(docs, settings, settings.data_dir, vectors)
+
+
+def _assert_aligned(settings, count, vectors=None):
+	data_dir = settings.data_dir
+	view = retrieval.get_chunk_store(data_dir).open_view()
+	index = retrieval.get_bm25_index(data_dir)
+	partitions = retrieval.get_partition_index(settings, data_dir)
+	store = retrieval.get_vector_store(settings, data_dir)
+	assert len(view) == index.count == partitions.count == count
+	for i in range(count):
+		assert view[i].page_content.startswith(f"tok{i} ")
+		assert index.search(f"tok{i}", 1)[0][0] == i
+	for f in range(0, count, 25):
+		source = f"file{f // 25}.pdf"
+		assert partitions.scope({"source": (source,)}).ids.tolist() == list(range(f, min(f + 25, count)))
+	rows = count if vectors is None else vectors
+	np.testing.assert_array_equal(store.ids(), np.arange(rows))
+	expected = normalize_rows(np.asarray(_Embedder().embed_documents([view[i].page_content for i in range(rows)])))
+	np.testing.assert_allclose(store.matrix(), expected, rtol=1e-6)
+
+
+def test_row_equals_chunk_id_in_every_store_across_merges(settings):
+	rng = np.random.default_rng(0)
+	count = 0
+	for _ in range(40):
+		n = int(rng.integers(1, 12))
+		start, end = _commit(settings, _batch(count, n))
+		assert (start, end) == (count, count + n)
+		count = end
+	store = retrieval.get_chunk_store(settings.data_dir)
+	index = retrieval.get_bm25_index(settings.data_dir)
+	assert len(store.read_manifest()["segments"]) < 40 and len(index.segments) < 40
+	_assert_aligned(settings, count)
+
+
+def test_indexes_that_fell_behind_the_chunk_store_catch_up_on_the_next_commit(settings):
+	count = _commit(settings, _batch(0, 30))[1]
+	# A process died after appending chunks but before indexing them.
+	lagging = _batch(count, 20)
+	retrieval.get_chunk_store(settings.data_dir).append(lagging)
+	retrieval.get_vector_store(settings, settings.data_dir).append(
+		range(count, count + 20), _Embedder().embed_documents([d.page_content for d in lagging]), [d.metadata for d in lagging]
+	)
+	assert retrieval.get_bm25_index(settings.data_dir).count == count
+	count = _commit(settings, _batch(count + 20, 15))[1]
+	_assert_aligned(settings, count)
+
+
+def test_missing_vectors_are_backfilled_in_chunk_id_order(settings):
+	count = _commit(settings, _batch(0, 20))[1]
+	for _ in range(3):
+		# Embedding was down for these commits.
+		count = _commit(settings, _batch(count, 10), embed=False)[1]
+	_assert_aligned(settings, count, vectors=20)
+	# A vector store that fell behind no longer takes appends from later commits.
+	count = _commit(settings, _batch(count, 5))[1]
+	_assert_aligned(settings, count, vectors=20)
+	store = retrieval.get_chunk_store(settings.data_dir)
+	retrieval.embed_new_chunks(store.open_view(), 0, settings, settings.data_dir, store.writer())
+	_assert_aligned(settings, count)
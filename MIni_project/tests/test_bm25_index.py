@@ -0,0 +1,118 @@
+import numpy as np
+import pytest
+
+from backend.services.bm25_index import BM25Index, tokenize
+
+
+TEXTS = [
+	"the appellant filed a civil appeal against the decree",
+	"breach of contract and damages for the breach",
+	"criminal appeal against conviction for murder",
+	"negligence causing injury, damages awarded",
+	"land title dispute over the temple property",
+	"tax assessment appeal dismissed",
+	"the decree was upheld and the appeal dismissed",
+	"contract signed under coercion is voidable",
+] * 5
+QUERIES = ["appeal decree", "breach damages", "temple land title", "contract", "unknownterm", "the the appeal"]
+
+
+def _one_shot(tmp_path):
+	index = BM25Index(tmp_path / "one")
+	index.add(TEXTS, 0)
+	return index
+
+
+def _incremental(tmp_path, step=3):
+	index = BM25Index(tmp_path / "inc")
+	for start in range(0, len(TEXTS), step):
+		index.add(TEXTS[start:start + step], start)
+	return index
+
+
+def test_tokenize_lowercases_and_drops_long_terms():
+	assert tokenize("Breach, of CONTRACT " + "x" * 49) == ["breach", "of", "contract"]
+
+
+def test_incremental_adds_score_like_one_index(tmp_path):
+	one, inc = _one_shot(tmp_path), _incremental(tmp_path)
+	assert inc.count == one.count == len(TEXTS)
+	assert len(inc.segments) > 1
+	for q in QUERIES:
+		np.testing.assert_array_equal(inc.scores(q), one.scores(q))
+
+
+def test_segments_merge_to_decreasing_sizes(tmp_path):
+	index = _incremental(tmp_path, step=1)
+	sizes = [s["docs"] for s in index.manifest["segments"]]
+	assert sizes == sorted(sizes, reverse=True) and len(set(sizes)) == len(sizes)
+	assert sum(sizes) == len(TEXTS)
+	assert [s["start"] for s in index.manifest["segments"]] == [sum(sizes[:i]) for i in range(len(sizes))]
+
+
+def test_retired_segments_are_collected_on_the_next_add(tmp_path):
+	index = _incremental(tmp_path, step=1)
+	index.add(["one more appeal"], index.count)
+	live = {s["name"] for s in index.manifest["segments"]}
+	assert {p.name for p in index.root.glob("seg-*")} == live
+
+
+def test_reopened_index_scores_the_same(tmp_path):
+	index = _incremental(tmp_path)
+	reopened = BM25Index(index.root)
+	for q in QUERIES:
+		np.testing.assert_array_equal(reopened.scores(q), index.scores(q))
+
+
+def test_add_skips_covered_docs_and_rejects_gaps(tmp_path):
+	index = BM25Index(tmp_path / "bm25")
+	index.add(TEXTS[:4], 0)
+	assert index.add(TEXTS[:6], 0) == 6
+	assert index.add(TEXTS[:6], 0) == 6
+	with pytest.raises(ValueError):
+		index.add(TEXTS[10:12], 10)
+	np.testing.assert_array_equal(index.scores("appeal"), _one_shot_scores(tmp_path, TEXTS[:6], "appeal"))
+
+
+def _one_shot_scores(tmp_path, texts, query):
+	index = BM25Index(tmp_path / "ref")
+	index.add(texts, 0)
+	return index.scores(query)
+
+
+def test_scores_rank_matching_docs(tmp_path):
+	index = _one_shot(tmp_path)
+	scores = index.scores("breach damages")
+	assert scores[1] == scores.max() > 0
+	assert scores[4] == 0
+	assert [i for i, _ in index.search("breach damages", 3)][0] % 8 == 1
+
+
+def test_scoped_scores_equal_the_corpus_scores(tmp_path):
+	index = _incremental(tmp_path)
+	rng = np.random.default_rng(0)
+	for size in (1, 5, 20, len(TEXTS)):
+		ids = np.sort(rng.choice(len(TEXTS), size=size, replace=False))
+		for q in QUERIES:
+			np.testing.assert_array_equal(index.scores(q, ids), index.scores(q)[ids])
+	assert index.scores("appeal", np.zeros(0, dtype=np.int64)).shape == (0,)
+
+
+def test_batch_scores_equal_per_query_scores(tmp_path):
+	index = _incremental(tmp_path)
+	batch = index.scores_batch(QUERIES)
+	assert batch.shape == (len(QUERIES), len(TEXTS))
+	for row, q in zip(batch, QUERIES):
+		np.testing.assert_array_equal(row, index.scores(q))
+	ids = np.arange(3, len(TEXTS), 4)
+	scoped = index.scores_batch(QUERIES, ids)
+	for row, q in zip(scoped, QUERIES):
+		np.testing.assert_array_equal(row, index.scores(q, ids))
+
+
+def test_empty_index(tmp_path):
+	index = BM25Index(tmp_path / "empty")
+	assert index.count == 0
+	assert index.scores("appeal").shape == (0,)
+	assert index.search("appeal", 5) == []
+	assert index.scores_batch(["a", "b"]).shape == (2, 0)
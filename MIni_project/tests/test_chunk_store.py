@@ -0,0 +1,107 @@
+import json
+import pickle
+
+import pytest
+from langchain_core.documents import Document
+
+from backend.services.chunk_store import ChunkStore
+
+
+def _docs(n, tag="d"):
+	return [Document(page_content=f"{tag} {i}", metadata={"source": f"{tag}.pdf", "page": i}) for i in range(n)]
+
+
+def _texts(view):
+	return [d.page_content for d in view]
+
+
+@pytest.fixture
+def store(tmp_path):
+	return ChunkStore(tmp_path / "chunks")
+
+
+def test_append_returns_contiguous_ids(store):
+	assert store.append(_docs(3, "a")) == 0
+	assert store.append(_docs(2, "b")) == 3
+	assert store.append([]) == 5
+	view = store.open_view()
+	assert _texts(view) == ["a 0", "a 1", "a 2", "b 0", "b 1"]
+	assert view[4].metadata == {"source": "b.pdf", "page": 1}
+	assert view[-1].page_content == "b 1"
+	with pytest.raises(IndexError):
+		view[5]
+
+
+def test_generation_counts_appends(store):
+	assert store.generation == 0
+	store.append(_docs(1))
+	store.append(_docs(1))
+	assert store.generation == 2
+	assert store.open_view().generation == 2
+
+
+def test_merges_keep_order_and_log_segments(store):
+	expected = []
+	for i in range(37):
+		docs = _docs(1 + i % 3, f"c{i}")
+		store.append(docs)
+		expected += [d.page_content for d in docs]
+	manifest = store.read_manifest()
+	sizes = [s["docs"] for s in manifest["segments"]]
+	assert sizes == sorted(sizes, reverse=True) and len(set(sizes)) == len(sizes)
+	assert len(sizes) <= 7
+	assert [s["start"] for s in manifest["segments"]] == [sum(sizes[:i]) for i in range(len(sizes))]
+	assert _texts(store.open_view()) == expected
+	assert _texts(store.iter_documents()) == expected
+
+
+def test_merged_segments_are_deleted_on_the_next_append(store):
+	for i in range(8):
+		store.append(_docs(1, f"m{i}"))
+	store.append(_docs(1, "last"))
+	live = {s["name"] for s in store.read_manifest()["segments"]}
+	on_disk = {p.name for p in store.root.glob("seg-*.jsonl")}
+	assert on_disk == live
+
+
+def test_view_of_an_old_manifest_survives_a_merge(store):
+	store.append(_docs(1, "x"))
+	old = store.read_manifest()
+	old_view = store.open_view(old)
+	store.append(_docs(1, "y"))  # merges "x" into a new segment, retiring the old file
+	assert _texts(old_view) == ["x 0"]
+	store.append(_docs(2, "z"))  # deletes the retired file
+	view = store.open_view(old)  # falls back to the current manifest
+	assert _texts(view)[:2] == ["x 0", "y 0"]
+
+
+def test_segment_without_offset_sidecar_is_scanned(store):
+	store.append(_docs(4, "s"))
+	for index in store.root.glob("*.idx.npy"):
+		index.unlink()
+	assert _texts(ChunkStore(store.root).open_view()) == ["s 0", "s 1", "s 2", "s 3"]
+
+
+def test_marks_are_written_with_the_chunks(store):
+	store.append(_docs(2), marks={"job:a": {"pages": 16}})
+	store.append(_docs(1), marks={"job:b": 1})
+	assert store.marks() == {"job:a": {"pages": 16}, "job:b": 1}
+	with open(store.manifest_path, encoding="utf-8") as f:
+		assert json.load(f)["count"] == 3
+	store.clear_marks("job:a", "unknown")
+	assert store.marks() == {"job:b": 1}
+
+
+def test_writer_lock_is_reentrant(store):
+	with store.writer():
+		with store.writer():
+			store.append(_docs(1))
+	assert store.count == 1
+
+
+def test_legacy_pickle_is_imported(tmp_path):
+	legacy = tmp_path / "bm25_docs.pkl"
+	with open(legacy, "wb") as f:
+		pickle.dump(_docs(3, "legacy"), f)
+	store = ChunkStore(tmp_path / "chunks", legacy_pickle=legacy)
+	assert _texts(store.open_view()) == ["legacy 0", "legacy 1", "legacy 2"]
@@ -0,0 +1,153 @@
+import asyncio
+
+import pytest
+
+from backend.services.coalesce import Broadcast, Coalescer
+
+
+async def _tokens(items, gate=None, delay=0.0):
+	for item in items:
+		if gate is not None:
+			await gate.wait()
+		await asyncio.sleep(delay)
+		yield item
+
+
+async def _collect(stream):
+	return [item async for item in stream]
+
+
+def test_identical_concurrent_runs_compute_once():
+	async def scenario():
+		coalescer = Coalescer()
+		calls = []
+
+		async def compute():
+			calls.append(1)
+			await asyncio.sleep(0.01)
+			return "answer"
+
+		results = await asyncio.gather(*(coalescer.run("q", compute) for _ in range(5)))
+		assert [r for r, _ in results] == ["answer"] * 5
+		assert [leader for _, leader in results].count(True) == 1
+		assert len(calls) == 1 and coalescer.stats()["queries_in_flight"] == 0
+		# A later request with the same key computes again.
+		assert await coalescer.run("q", compute) == ("answer", True)
+		assert len(calls) == 2
+
+	asyncio.run(scenario())
+
+
+def test_a_cancelled_caller_does_not_cancel_the_shared_computation():
+	async def scenario():
+		coalescer = Coalescer()
+		release = asyncio.Event()
+
+		async def compute():
+			await release.wait()
+			return 42
+
+		leader = asyncio.create_task(coalescer.run("q", compute))
+		await asyncio.sleep(0)
+		follower = asyncio.create_task(coalescer.run("q", compute))
+		await asyncio.sleep(0)
+		leader.cancel()
+		release.set()
+		assert await follower == (42, False)
+
+	asyncio.run(scenario())
+
+
+def test_errors_reach_every_caller():
+	async def scenario():
+		coalescer = Coalescer()
+
+		async def compute():
+			await asyncio.sleep(0.01)
+			raise RuntimeError("ollama down")
+
+		results = await asyncio.gather(*(coalescer.run("q", compute) for _ in range(3)), return_exceptions=True)
+		assert all(isinstance(r, RuntimeError) for r in results)
+		assert coalescer.stats()["queries_in_flight"] == 0
+
+	asyncio.run(scenario())
+
+
+def test_late_subscribers_replay_the_prefix_then_follow_live():
+	async def scenario():
+		coalescer = Coalescer()
+		starts = []
+
+		def start():
+			starts.append(1)
+			return _tokens(["a", "b", "c", "d"], delay=0.01)
+
+		first, leader = coalescer.stream("k", start)
+		assert leader
+		early = asyncio.create_task(_collect(first))
+		await asyncio.sleep(0.025)
+		second, leader = coalescer.stream("k", start)
+		assert not leader
+		assert await asyncio.gather(early, _collect(second)) == [["a", "b", "c", "d"]] * 2
+		assert len(starts) == 1
+		assert coalescer.stats()["streams_in_flight"] == 0
+
+	asyncio.run(scenario())
+
+
+def test_upstream_errors_are_raised_after_the_emitted_chunks():
+	async def scenario():
+		async def failing():
+			yield "a"
+			raise RuntimeError("stream broke")
+
+		broadcast = Broadcast(failing())
+		seen = []
+		with pytest.raises(RuntimeError, match="stream broke"):
+			async for item in broadcast.subscribe():
+				seen.append(item)
+		assert seen == ["a"] and broadcast.done
+
+	asyncio.run(scenario())
+
+
+def test_the_upstream_is_cancelled_when_the_last_subscriber_leaves():
+	async def scenario():
+		coalescer = Coalescer()
+		gate = asyncio.Event()
+		closed = []
+
+		async def source():
+			try:
+				yield "a"
+				await gate.wait()
+				yield "b"
+			finally:
+				closed.append(1)
+
+		stream, _ = coalescer.stream("k", source)
+		assert await stream.__anext__() == "a"
+		await stream.aclose()
+		await asyncio.sleep(0.01)
+		assert closed == [1]
+		assert coalescer.stats()["streams_in_flight"] == 0
+		# The next request for the key starts a fresh stream.
+		_, leader = coalescer.stream("k", lambda: _tokens(["x"]))
+		assert leader
+
+	asyncio.run(scenario())
+
+
+def test_idle_streams_keep_running_when_asked_to():
+	async def scenario():
+		gate = asyncio.Event()
+		broadcast = Broadcast(_tokens(["a", "b"], gate=gate), cancel_when_idle=False)
+		stream = broadcast.subscribe()
+		gate.set()
+		assert await stream.__anext__() == "a"
+		await stream.aclose()
+		await asyncio.sleep(0.01)
+		assert broadcast.done and broadcast.error is None and broadcast.chunks == ["a", "b"]
+		assert await _collect(broadcast.subscribe()) == ["a", "b"]
+
+	asyncio.run(scenario())
@@ -0,0 +1,60 @@
+import numpy as np
+from langchain_core.documents import Document
+
+from backend.services.context import ContextPacker, estimate_tokens, join_overlapping, merge_adjacent
+from backend.services.retrieval import Hit
+
+
+def _hit(chunk_id, text, score, page=0, source="a.pdf"):
+	return Hit(chunk_id=chunk_id, score=score, bm25=score, cosine=None, document=Document(page_content=text, metadata={"source": source, "page": page}))
+
+
+def test_join_overlapping_drops_the_repeated_text():
+	a = "The appellant filed a civil appeal against the decree of the trial court"
+	b = "against the decree of the trial court, which the High Court upheld."
+	assert join_overlapping(a, b) == a + ", which the High Court upheld."
+	assert join_overlapping("first chunk of text here", "unrelated second chunk text") == "first chunk of text here\nunrelated second chunk text"
+
+
+def test_adjacent_chunks_of_a_page_merge_into_one_passage():
+	hits = [_hit(5, "e", 0.1), _hit(3, "c", 0.9), _hit(4, "d", 0.5), _hit(6, "f", 0.2, page=1), _hit(9, "g", 0.3, source="b.pdf")]
+	passages = merge_adjacent(hits)
+	assert [[h.chunk_id for h in p.hits] for p in passages] == [[3, 4, 5], [6], [9]]
+	assert passages[0].score == 0.9 and passages[0].text == "c\nd\ne"
+
+
+def test_near_duplicate_passages_are_dropped():
+	text = "the court held that the contract was void for want of consideration and dismissed the suit"
+	hits = [_hit(0, text, 0.9), _hit(10, text + " entirely", 0.8, page=3), _hit(20, "bail was granted to the accused pending trial", 0.5, page=7)]
+	pack = ContextPacker(budget=1000).pack(hits)
+	assert pack.passages == 2
+	assert [h.chunk_id for h in pack.hits] == [0, 20]
+
+
+def test_mmr_prefers_a_diverse_passage_over_a_similar_one():
+	hits = [_hit(0, "first", 1.0), _hit(10, "second", 0.9, page=1), _hit(20, "third", 0.8, page=2)]
+	vectors = {0: [1.0, 0.0], 10: [0.99, 0.1], 20: [0.0, 1.0]}
+
+	def lookup(ids):
+		return np.asarray([vectors[i] for i in ids], dtype=np.float32)
+
+	diverse = ContextPacker(budget=1000, lambda_=0.5, vectors=lookup).pack(hits)
+	assert [h.chunk_id for h in diverse.hits] == [0, 20, 10]
+	relevant = ContextPacker(budget=1000, lambda_=1.0, vectors=lookup).pack(hits)
+	assert [h.chunk_id for h in relevant.hits] == [0, 10, 20]
+
+
+def test_packing_respects_the_token_budget():
+	hits = [_hit(i * 10, f"passage {i} " + "word " * 40, 1.0 - i / 10, page=i) for i in range(6)]
+	packer = ContextPacker(budget=120, dedup_threshold=1.1)
+	pack = packer.pack(hits)
+	assert 0 < pack.passages < 6
+	assert pack.tokens <= 120
+	assert pack.tokens == sum(estimate_tokens(block) for block in pack.text.split("\n\n"))
+	assert pack.text.startswith("[1] a.pdf, p. 1\npassage 0")
+
+
+def test_the_best_passage_is_cut_rather_than_returning_nothing():
+	pack = ContextPacker(budget=5).pack([_hit(0, "x" * 500, 1.0)])
+	assert pack.passages == 1 and pack.tokens == 5 and len(pack.text) == 20
+	assert ContextPacker(budget=5).pack([]).passages == 0
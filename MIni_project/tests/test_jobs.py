@@ -0,0 +1,175 @@
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pytest
+from pypdf import PdfReader, PdfWriter
+
+from backend.core.settings import Settings
+from backend.services import retrieval
+from backend.services.jobs import PAGE_BATCH, IngestJobQueue
+
+
+PAGES = 40
+SAMPLE = "data/upload_Ram_Mandir_Judgment.pdf"
+
+
+def _fake_embed(docs, settings):
+	return [[float(len(d.page_content)), float(d.metadata.get("page") or 0) + 1.0, 1.0] for d in docs]
+
+
+@pytest.fixture
+def settings(tmp_path, monkeypatch):
+	monkeypatch.setenv("DATA_DIR", str(tmp_path / "data"))
+	monkeypatch.setattr(retrieval, "embed_documents", _fake_embed)
+	settings = Settings()
+	settings.data_dir.mkdir(parents=True)
+	return settings
+
+
+@pytest.fixture
+def pdf(settings):
+	writer = PdfWriter()
+	page = PdfReader(SAMPLE).pages[0]
+	for _ in range(PAGES):
+		writer.add_page(page)
+	path = settings.data_dir / "upload_sample.pdf"
+	writer.write(str(path))
+	return path
+
+
+@pytest.fixture
+def chunks(pdf):
+	return len(retrieval.chunk_pdf_pages(str(pdf), 0, PAGES))
+
+
+@pytest.fixture
+def queue(settings):
+	# Jobs are processed on the test thread; only the parse pool is started.
+	queue = IngestJobQueue(settings)
+	queue._procs = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn"))
+	yield queue
+	queue.stop()
+
+
+def _drain(queue, job_id, timeout=60.0):
+	deadline = time.monotonic() + timeout
+	while queue.get(job_id)["status"] in ("queued", "running"):
+		assert time.monotonic() < deadline
+		time.sleep(0.05)
+	return queue.get(job_id)
+
+
+def _committed(queue, job_id):
+	return queue._execute("SELECT pages_committed FROM jobs WHERE id = ?", (job_id,)).fetchone()[0]
+
+
+def _assert_aligned(settings, chunks):
+	data_dir = settings.data_dir
+	store = retrieval.get_chunk_store(data_dir)
+	assert store.count == chunks
+	assert retrieval.get_bm25_index(data_dir).count == chunks
+	assert retrieval.get_partition_index(settings, data_dir).count == chunks
+	vectors = retrieval.get_vector_store(settings, data_dir)
+	np.testing.assert_array_equal(vectors.ids(), np.arange(chunks))
+	view = store.open_view()
+	expected = np.asarray(_fake_embed([view[i] for i in range(chunks)], settings), dtype=np.float32)
+	expected /= np.linalg.norm(expected, axis=1, keepdims=True)
+	np.testing.assert_allclose(vectors.matrix(), expected, rtol=1e-6)
+
+
+def test_claims_take_queued_jobs_once_and_expired_leases_again(queue, pdf):
+	first = queue.submit("a.pdf", pdf)
+	second = queue.submit("b.pdf", pdf)
+	assert queue._claim()["id"] == first
+	assert queue._claim()["id"] == second
+	assert queue._claim() is None
+	assert queue.depth() == 2
+	queue._execute("UPDATE jobs SET lease_until = 0 WHERE id = ?", (second,))
+	assert queue._claim()["id"] == second
+	assert queue._claim() is None
+
+
+def test_a_job_commits_every_range_to_every_store(queue, settings, pdf, chunks):
+	job_id = queue.submit("sample.pdf", pdf)
+	queue._process(queue._claim())
+	job = queue.get(job_id)
+	assert job["status"] == "done"
+	assert job["pages_parsed"] == job["pages_total"] == PAGES
+	assert job["chunks"] == job["chunks_embedded"] == job["result"]["chunks"] == job["result"]["bm25_docs"] == chunks
+	assert not retrieval.get_chunk_store(settings.data_dir).read_manifest().get("marks")
+	_assert_aligned(settings, chunks)
+
+
+def test_a_job_resumes_after_the_last_committed_range(queue, settings, pdf, chunks, monkeypatch):
+	job_id = queue.submit("sample.pdf", pdf)
+	update = queue._update
+	commits = []
+
+	def crash_after_second_commit(job_id, **fields):
+		# The worker dies after the chunk store committed the range but before the row recorded it.
+		if "pages_committed" in fields and "result" in fields:
+			commits.append(fields["pages_committed"])
+			if len(commits) == 2:
+				raise SystemExit("worker died")
+		update(job_id, **fields)
+
+	monkeypatch.setattr(queue, "_update", crash_after_second_commit)
+	with pytest.raises(SystemExit):
+		queue._process(queue._claim())
+	monkeypatch.setattr(queue, "_update", update)
+	assert _committed(queue, job_id) == PAGE_BATCH
+	marks = retrieval.get_chunk_store(settings.data_dir).read_manifest()["marks"]
+	assert marks[f"ingest_job:{job_id}"]["pages_committed"] == 2 * PAGE_BATCH
+
+	assert queue._claim() is None
+	queue._execute("UPDATE jobs SET lease_until = 0 WHERE id = ?", (job_id,))
+	queue._process(queue._claim())
+	job = queue.get(job_id)
+	assert job["status"] == "done"
+	assert job["chunks"] == job["result"]["chunks"] == chunks
+	_assert_aligned(settings, chunks)
+
+
+def test_a_failed_job_keeps_its_upload_and_retries_from_its_last_range(settings, pdf, chunks, monkeypatch):
+	commit = retrieval.commit_chunks
+	calls = []
+
+	def fail_second_commit(*args, **kwargs):
+		calls.append(1)
+		if len(calls) == 2:
+			raise OSError("disk full")
+		return commit(*args, **kwargs)
+
+	monkeypatch.setattr(retrieval, "commit_chunks", fail_second_commit)
+	queue = IngestJobQueue(settings)
+	queue.start()
+	try:
+		job_id = queue.submit("sample.pdf", pdf)
+		job = _drain(queue, job_id)
+		assert job["status"] == "failed" and job["error"] == "disk full"
+		assert _committed(queue, job_id) == PAGE_BATCH and pdf.exists()
+		assert queue.retry("unknown") is None
+		assert queue.retry(job_id)["status"] == "queued"
+		job = _drain(queue, job_id)
+		assert job["status"] == "done" and job["chunks"] == chunks
+		assert not pdf.exists()
+		with pytest.raises(ValueError):
+			queue.retry(job_id)
+	finally:
+		queue.stop()
+	_assert_aligned(settings, chunks)
+
+
+def test_sweep_deletes_only_expired_failed_uploads(queue, settings):
+	upload = settings.data_dir / "upload_broken.pdf"
+	upload.write_bytes(b"not a pdf")
+	job_id = queue.submit("broken.pdf", upload)
+	queue._update(job_id, status="failed", error="broken")
+	assert queue.sweep() == 0 and upload.exists()
+	queue._execute("UPDATE jobs SET updated_at = ? WHERE id = ?", (time.time() - settings.ingest_failed_ttl - 1, job_id))
+	assert queue.sweep() == 1 and not upload.exists()
+	with pytest.raises(ValueError):
+		queue.retry(job_id)
+	assert queue.get(job_id)["status"] == "failed"
@@ -0,0 +1,180 @@
+import json
+
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+
+from backend.services.bm25_index import BM25Index
+from backend.services.partitions import (
+	PartitionIndex,
+	detect_court,
+	detect_year,
+	normalize_filters,
+	parse_filter_params,
+	source_name,
+)
+from backend.services.retrieval import HybridRetriever
+
+
+def _doc(text, **metadata):
+	return Document(page_content=text, metadata=metadata)
+
+
+def _corpus():
+	docs = []
+	for i in range(30):
+		case_type = ("contract", "tax", "criminal")[i % 3]
+		court = "Delhi High Court" if i < 15 else "Supreme Court"
+		docs.append(_doc(f"chunk {i} {case_type}", source=f"upload_0123abcd_file{i // 5}.pdf", page=i, case_type=case_type, court=court, year=str(2000 + i % 2)))
+	return docs
+
+
+@pytest.fixture
+def index(tmp_path):
+	index = PartitionIndex(tmp_path / "partitions")
+	docs = _corpus()
+	for start in range(0, len(docs), 7):
+		index.add(docs[start:start + 7], start)
+	return index
+
+
+def _expected(docs, **filters):
+	return [i for i, d in enumerate(docs) if all(str(d.metadata[k]).lower() in values for k, values in filters.items())]
+
+
+def test_detectors():
+	assert detect_court("IN THE HIGH COURT OF DELHI AT NEW DELHI") == "delhi high court"
+	assert detect_court("before the Bombay High Court") == "bombay high court"
+	assert detect_court("the learned High Court of the said state") is None
+	assert detect_court("Supreme Court of India") == "supreme court"
+	assert detect_year("decided 1998, citing a 1950 case, judgment of 2019 ") == "2019"
+	assert detect_year("no years here") is None
+	assert source_name("/data/upload_0123abcd_Ram.PDF") == "ram.pdf"
+
+
+def test_filters_normalize_and_reject_unknown_keys():
+	assert normalize_filters({"court": "Delhi  High Court", "year": [2020, 2019, None]}) == {"court": ("delhi high court",), "year": ("2019", "2020")}
+	assert normalize_filters({"source": "/x/upload_0123abcd_A.pdf", "court": ""}) == {"source": ("a.pdf",)}
+	with pytest.raises(ValueError):
+		normalize_filters({"judge": "x"})
+	assert parse_filter_params(["year:2019", "year:2020", "court:supreme court"]) == {"year": ["2019", "2020"], "court": ["supreme court"]}
+	with pytest.raises(ValueError):
+		parse_filter_params(["year2019"])
+
+
+def test_scopes_and_across_keys_or_within_a_key(index):
+	docs = _corpus()
+	assert index.count == 30
+	assert index.scope({"case_type": ("tax",)}).ids.tolist() == _expected(docs, case_type={"tax"})
+	both = index.scope({"case_type": ("tax", "criminal")}).ids.tolist()
+	assert both == _expected(docs, case_type={"tax", "criminal"})
+	mixed = index.scope({"case_type": ("tax", "criminal"), "court": ("supreme court",), "year": ("2001",)}).ids.tolist()
+	assert mixed == _expected(docs, case_type={"tax", "criminal"}, court={"supreme court"}, year={"2001"})
+	assert index.scope({"source": ("file2.pdf",)}).ids.tolist() == list(range(10, 15))
+	assert index.scope({"case_type": ("tax",)}, limit=10).ids.tolist() == [1, 4, 7]
+	assert index.scope({"case_type": ("unknown",)}).ids.tolist() == []
+	assert index.values()["court"] == {"delhi high court": 15, "supreme court": 15}
+
+
+def test_id_lists_survive_a_reopen(index):
+	reopened = PartitionIndex(index.root)
+	assert reopened.count == 30
+	for value in ("contract", "tax", "criminal"):
+		filters = {"case_type": (value,)}
+		np.testing.assert_array_equal(reopened.scope(filters).ids, index.scope(filters).ids)
+
+
+def test_add_skips_covered_chunks_and_rejects_gaps(index):
+	docs = _corpus()
+	assert index.add(docs[20:], 20) == 30
+	assert index.scope({"case_type": ("tax",)}).ids.tolist() == _expected(docs, case_type={"tax"})
+	with pytest.raises(ValueError):
+		index.add(docs[:1], 31)
+
+
+def test_scopes_are_cached_read_only_until_the_next_add(index):
+	scope = index.scope({"case_type": ("tax", "criminal"), "court": ("supreme court",)})
+	assert index.scope({"court": ("supreme court",), "case_type": ("criminal", "tax")}) is scope
+	assert index.scope({"case_type": ("tax", "criminal"), "court": ("supreme court",)}, limit=20) is not scope
+	with pytest.raises(ValueError):
+		scope.ids[0] = 0
+	index.add([_doc("more tax", source="new.pdf", case_type="tax", court="Supreme Court")], 30)
+	fresh = index.scope({"case_type": ("tax", "criminal"), "court": ("supreme court",)})
+	assert fresh is not scope and fresh.ids[-1] == 30
+
+
+def test_file_tags_come_from_the_first_pages_and_are_appended(tmp_path):
+	index = PartitionIndex(tmp_path / "partitions")
+	head = _doc("IN THE HIGH COURT OF DELHI. Breach of contract, judgment 2019.", source="a.pdf", page=0)
+	later = _doc("The tax was assessed later in 2021.", source="a.pdf", page=5)
+	index.tag([later, head])
+	index.add([head, later], 0)
+	assert head.metadata["court"] == later.metadata["court"] == "delhi high court"
+	assert later.metadata["case_type"] == "contract" and later.metadata["year"] == "2021"
+	again = _doc("A criminal appeal", source="a.pdf", page=9)
+	index.tag([again])
+	assert again.metadata["case_type"] == "contract"
+	lines = (index.root / "files.jsonl").read_text(encoding="utf-8").splitlines()
+	assert [json.loads(line)["source"] for line in lines] == ["a.pdf"]
+	assert index.manifest["files_size"] == (index.root / "files.jsonl").stat().st_size
+	assert PartitionIndex(index.root).files["a.pdf"]["court"] == "delhi high court"
+
+
+def test_version_2_manifests_move_file_tags_to_files_jsonl(tmp_path):
+	root = tmp_path / "partitions"
+	root.mkdir()
+	manifest = {"version": 2, "count": 0, "partitions": {}, "files": {"old.pdf": {"court": "supreme court"}}}
+	(root / "manifest.json").write_text(json.dumps(manifest), encoding="utf-8")
+	index = PartitionIndex(root)
+	assert index.files["old.pdf"] == {"court": "supreme court"}
+	index.add([_doc("text", source="old.pdf")], 0)
+	assert index.manifest["version"] == 3 and "files" not in index.manifest
+	reopened = PartitionIndex(root)
+	assert reopened.files == {"old.pdf": {"court": "supreme court"}}
+	assert reopened.scope({"court": ("supreme court",)}).ids.tolist() == []
+
+
+def _retriever(tmp_path, routing):
+	docs = [
+		_doc("the appeal was dismissed", case_type="contract"),
+		_doc("appeal against the tax assessment", case_type="tax"),
+		_doc("tax appeal", case_type="tax"),
+		_doc("murder appeal conviction upheld appeal", case_type="criminal"),
+		_doc("contract breach appeal appeal appeal", case_type="contract"),
+		_doc("unrelated property dispute", case_type="property"),
+	]
+	index = BM25Index(tmp_path / "bm25")
+	index.add([d.page_content for d in docs], 0)
+	partitions = PartitionIndex(tmp_path / "partitions")
+	partitions.add(docs, 0)
+	return HybridRetriever(docs=docs, index=index, partitions=partitions, partition_routing=routing, k=2)
+
+
+def test_filter_routing_keeps_preferred_hits_with_enough_evidence(tmp_path):
+	retriever = _retriever(tmp_path, "filter")
+	hits = retriever.search("tax assessment", prefer={"case_type": ("tax",)})
+	assert {h.chunk_id for h in hits} == {1, 2}
+
+
+def test_filter_routing_widens_when_the_preferred_partition_lacks_evidence(tmp_path):
+	retriever = _retriever(tmp_path, "filter")
+	# The criminal partition has one hit, and the corpus has stronger appeal matches.
+	hits = retriever.search("appeal", prefer={"case_type": ("criminal",)})
+	assert len(hits) == 2 and {h.chunk_id for h in hits} != {3}
+	hits = retriever.search("contract breach appeal", k=1, prefer={"case_type": ("tax",)})
+	assert [h.chunk_id for h in hits] == [4]
+
+
+def test_boost_routing_ranks_preferred_chunks_first_without_dropping_others(tmp_path):
+	retriever = _retriever(tmp_path, "boost")
+	plain = retriever.search("appeal", k=5)
+	boosted = retriever.search("appeal", k=5, prefer={"case_type": ("tax",)})
+	assert {h.chunk_id for h in boosted} == {h.chunk_id for h in plain}
+	assert [h.chunk_id for h in boosted].index(2) < [h.chunk_id for h in plain].index(2)
+
+
+def test_filters_restrict_every_routing(tmp_path):
+	for routing in ("filter", "boost", "off"):
+		retriever = _retriever(tmp_path / routing, routing)
+		hits = retriever.search("appeal", k=5, filters={"case_type": ("tax",)}, prefer={"court": ("supreme court",)})
+		assert {h.chunk_id for h in hits} == {1, 2}
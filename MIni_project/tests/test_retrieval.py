@@ -0,0 +1,128 @@
+import asyncio
+import zlib
+
+import numpy as np
+import pytest
+from langchain_core.documents import Document
+
+from backend.services.bm25_index import BM25Index
+from backend.services.retrieval import RRF_K, HybridRetriever, _ranks, fuse_scores
+from backend.services.vector_store import VectorStore
+
+
+DIM = 32
+TEXTS = [
+	"the appellant filed a civil appeal against the decree",
+	"breach of contract and damages for the breach",
+	"criminal appeal against conviction for murder",
+	"negligence causing injury and damages awarded",
+	"land title dispute over the temple property",
+	"tax assessment appeal dismissed by the tribunal",
+	"the decree was upheld and the appeal dismissed",
+	"contract signed under coercion is voidable",
+	"bail granted pending the criminal appeal",
+	"injunction against construction on disputed land",
+]
+QUERIES = ["appeal decree", "breach damages", "temple land", "criminal bail", "tribunal", "no match here"]
+
+
+class _Embedder:
+	"""Bag of hashed words: texts sharing words have a positive cosine."""
+
+	def embed_query(self, text):
+		vec = np.zeros(DIM, dtype=np.float32)
+		for word in text.lower().split():
+			vec[zlib.crc32(word.encode()) % DIM] += 1.0
+		vec[0] += 0.1
+		return vec.tolist()
+
+	def embed_documents(self, texts):
+		return [self.embed_query(t) for t in texts]
+
+	async def aembed_query(self, text):
+		return self.embed_query(text)
+
+
+@pytest.fixture
+def retriever(tmp_path):
+	docs = [Document(page_content=t, metadata={"source": "a.pdf", "page": i}) for i, t in enumerate(TEXTS)]
+	index = BM25Index(tmp_path / "bm25")
+	index.add(TEXTS, 0)
+	store = VectorStore(tmp_path / "vectors", "fake")
+	embedder = _Embedder()
+	# The last two chunks have no vectors yet, as after an ingest with Ollama down.
+	store.append(range(8), embedder.embed_documents(TEXTS[:8]), [d.metadata for d in docs[:8]])
+	return HybridRetriever(docs=docs, index=index, store=store, embedder=embedder, k=4, candidates=5)
+
+
+def test_ranks_are_one_based_and_stable_on_ties():
+	np.testing.assert_array_equal(_ranks(np.array([0.5, 2.0, 0.5, -1.0])), [2, 1, 3, 4])
+
+
+def test_rrf_fuses_weighted_reciprocal_ranks():
+	vector, bm25 = np.array([0.9, 0.1, 0.5]), np.array([0.0, 3.0, 1.0])
+	fused = fuse_scores(vector, bm25, (0.6, 0.4), "rrf")
+	expected = 0.6 / (RRF_K + np.array([1, 3, 2])) + 0.4 / (RRF_K + np.array([3, 1, 2]))
+	np.testing.assert_allclose(fused, expected, rtol=1e-6)
+
+
+def test_minmax_and_zscore_normalise_each_signal():
+	vector, bm25 = np.array([1.0, 2.0, 3.0]), np.array([4.0, 4.0, 10.0])
+	np.testing.assert_allclose(fuse_scores(vector, bm25, (0.5, 0.5), "minmax"), [0.0, 0.25, 1.0])
+	z = fuse_scores(vector, bm25, (1.0, 0.0), "zscore")
+	np.testing.assert_allclose(z, (vector - 2.0) / vector.std())
+	# A constant signal carries no ranking information.
+	np.testing.assert_array_equal(fuse_scores(vector, np.full(3, 7.0), (0.0, 1.0), "minmax"), np.zeros(3))
+	np.testing.assert_array_equal(fuse_scores(vector, np.full(3, 7.0), (0.0, 1.0), "zscore"), np.zeros(3))
+	with pytest.raises(ValueError):
+		fuse_scores(vector, bm25, (0.5, 0.5), "sum")
+
+
+def test_hits_carry_both_signals_and_the_fused_order(retriever):
+	for query in QUERIES:
+		hits = retriever.search(query)
+		assert len(hits) == 4
+		scores = [h.score for h in hits]
+		assert scores == sorted(scores, reverse=True)
+		q = np.asarray(retriever.embedder.embed_query(query), dtype=np.float32)
+		q /= np.linalg.norm(q)
+		bm25 = retriever.index.scores(query)
+		for hit in hits:
+			assert hit.document is retriever.docs[hit.chunk_id]
+			assert hit.bm25 == pytest.approx(bm25[hit.chunk_id])
+			if hit.chunk_id < 8:
+				assert hit.cosine == pytest.approx(float(np.asarray(retriever.store.matrix()[hit.chunk_id]) @ q), abs=1e-6)
+			else:
+				assert hit.cosine == -1.0
+	# A chunk without a vector is still found by BM25.
+	assert 8 in [h.chunk_id for h in retriever.search("criminal bail")]
+
+
+def test_bm25_only_without_vectors(retriever):
+	retriever.store = None
+	hits = retriever.search("breach damages")
+	assert [h.chunk_id for h in hits][:2] == [1, 3]
+	assert all(h.cosine is None and h.score == h.bm25 > 0 for h in hits)
+
+
+def test_async_and_batch_searches_match_search(retriever):
+	expected = [[(h.chunk_id, h.score) for h in retriever.search(q)] for q in QUERIES]
+
+	async def search_all():
+		return [await retriever.asearch(q) for q in QUERIES], await retriever.asearch_batch(QUERIES, batch_size=4)
+
+	single, batch = asyncio.run(search_all())
+	for hits in (single, batch, retriever.search_batch(QUERIES, batch_size=4)):
+		assert [[(h.chunk_id, pytest.approx(h.score)) for h in hs] for hs in hits] == expected
+
+
+def test_batch_search_is_the_same_within_any_memory_budget(retriever):
+	expected = [[h.chunk_id for h in hits] for hits in retriever.search_batch(QUERIES)]
+	retriever.batch_memory = 1
+	assert [[h.chunk_id for h in hits] for hits in retriever.search_batch(QUERIES)] == expected
+
+
+def test_rescore_fuses_only_the_given_chunks(retriever):
+	hits = asyncio.run(retriever.arescore("appeal decree", [6, 0, 0, 99, 4], k=5))
+	assert sorted(h.chunk_id for h in hits) == [0, 4, 6]
+	assert hits[0].chunk_id in (0, 6)
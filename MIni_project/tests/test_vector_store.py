@@ -0,0 +1,157 @@
+import numpy as np
+import pytest
+
+from backend.services.vector_store import VectorStore, code_width, normalize_rows, top_k
+
+
+DIM = 16
+
+
+def _vectors(n, seed=0):
+	return np.random.default_rng(seed).standard_normal((n, DIM)).astype(np.float32)
+
+
+def _fill(store, n, step=10, seed=0):
+	vecs = _vectors(n, seed)
+	for start in range(0, n, step):
+		rows = range(start, min(start + step, n))
+		store.append(list(rows), vecs[start:start + step], [{"source": "doc.pdf", "page": i} for i in rows])
+	return normalize_rows(vecs)
+
+
+def _exact(unit, q, k, rows=None):
+	scores = unit @ q if rows is None else unit[rows] @ q
+	top = top_k(scores, k)
+	return top if rows is None else rows[top]
+
+
+def test_top_k_is_sorted_and_bounded():
+	scores = np.array([0.1, 0.9, 0.5, 0.9, -1.0])
+	assert top_k(scores, 3).tolist() == [1, 3, 2]
+	assert top_k(scores, 10).tolist() == [1, 3, 2, 0, 4]
+	assert top_k(scores, 0).shape == (0,)
+
+
+def test_appends_keep_rows_ids_and_metadata_aligned(tmp_path):
+	store = VectorStore(tmp_path / "vectors", "model")
+	unit = _fill(store, 95)
+	assert store.count == 95 and store.dim == DIM
+	np.testing.assert_array_equal(store.ids(), np.arange(95))
+	np.testing.assert_allclose(store.matrix(), unit, rtol=1e-6)
+	reopened = VectorStore(store.root, "model")
+	np.testing.assert_array_equal(reopened.ids(), np.arange(95))
+	pages = (store.root / "rows.jsonl").read_text(encoding="utf-8").splitlines()
+	assert len(pages) == 95 and '"page": 94' in pages[-1]
+
+
+def test_ids_are_backfilled_for_stores_without_an_id_file(tmp_path):
+	store = VectorStore(tmp_path / "vectors", "model")
+	_fill(store, 30)
+	store.ids_path.unlink()
+	del store.meta["ids_count"]
+	store._write_meta(store.meta)
+	legacy = VectorStore(store.root, "model")
+	np.testing.assert_array_equal(legacy.ids(), np.arange(30))
+	legacy.append([30], _vectors(1, seed=9), [{}])
+	assert legacy.meta["ids_count"] == 31
+	np.testing.assert_array_equal(VectorStore(store.root, "model").ids(), np.arange(31))
+
+
+def test_append_rejects_mismatched_shapes(tmp_path):
+	store = VectorStore(tmp_path / "vectors", "model")
+	_fill(store, 10)
+	with pytest.raises(ValueError):
+		store.append([10], np.ones((1, DIM + 1)), [{}])
+	with pytest.raises(ValueError):
+		store.append([10, 11], np.ones((1, DIM)), [{}, {}])
+	assert store.count == 10
+
+
+def test_another_model_starts_an_empty_store(tmp_path):
+	store = VectorStore(tmp_path / "vectors", "model")
+	_fill(store, 10)
+	assert VectorStore(store.root, "other").count == 0
+
+
+def test_float32_nearest_is_exact(tmp_path):
+	store = VectorStore(tmp_path / "vectors", "model")
+	unit = _fill(store, 200)
+	qs = normalize_rows(_vectors(5, seed=1))
+	rows = np.arange(3, 200, 7)
+	for q in qs:
+		found, scores = store.nearest(q, 10)
+		np.testing.assert_array_equal(found, _exact(unit, q, 10))
+		np.testing.assert_allclose(scores, unit[found] @ q, rtol=1e-5)
+		np.testing.assert_array_equal(store.nearest(q, 5, rows)[0], _exact(unit, q, 5, rows))
+	for q, (found, _) in zip(qs, store.nearest_many(qs, 10, block=64)):
+		np.testing.assert_array_equal(found, _exact(unit, q, 10))
+	for q, (found, _) in zip(qs, store.nearest_many(qs, 5, rows, block=8)):
+		np.testing.assert_array_equal(found, _exact(unit, q, 5, rows))
+
+
+@pytest.mark.parametrize("storage", ["float16", "int8", "binary"])
+def test_codes_cover_every_row_and_rescore_exactly(tmp_path, storage):
+	# A rescore window as large as the store makes the code scan a pure preselection.
+	store = VectorStore(tmp_path / "vectors", "model", storage=storage, rescore=200)
+	unit = _fill(store, 200)
+	assert store.codes_count == 200
+	assert store.codes_path(storage).stat().st_size == 200 * code_width(storage, DIM)
+	qs = normalize_rows(_vectors(4, seed=2))
+	for q, (many, _) in zip(qs, store.nearest_many(qs, 10, block=32)):
+		found, scores = store.nearest(q, 10)
+		np.testing.assert_array_equal(found, _exact(unit, q, 10))
+		np.testing.assert_array_equal(many, found)
+		np.testing.assert_allclose(scores, unit[found] @ q, rtol=1e-5)
+
+
+@pytest.mark.parametrize("storage", ["float16", "int8"])
+def test_codes_find_the_nearest_row_with_the_default_rescore(tmp_path, storage):
+	store = VectorStore(tmp_path / "vectors", "model", storage=storage)
+	unit = _fill(store, 300)
+	for row in (0, 150, 299):
+		assert store.nearest(unit[row], 1)[0][0] == row
+
+
+def test_rows_past_the_codes_are_always_rescored(tmp_path):
+	store = VectorStore(tmp_path / "vectors", "model", storage="int8")
+	_fill(store, 100)
+	# A float32 writer appends without encoding.
+	writer = VectorStore(store.root, "model")
+	extra = normalize_rows(_vectors(5, seed=3))
+	writer.append(list(range(100, 105)), extra, [{}] * 5)
+	reader = VectorStore(store.root, "model", storage="int8")
+	assert reader.count == 105 and reader.codes_count == 100
+	for i, q in enumerate(extra):
+		assert reader.nearest(q, 1)[0][0] == 100 + i
+		assert reader.nearest_many(q[None, :], 1)[0][0][0] == 100 + i
+	assert reader.ensure_codes() == 105 and reader.codes_count == 105
+
+
+def test_drop_codes_falls_back_to_the_matrix(tmp_path):
+	store = VectorStore(tmp_path / "vectors", "model", storage="binary")
+	unit = _fill(store, 50)
+	store.drop_codes("binary")
+	assert store.codes() is None and not store.codes_path("binary").exists()
+	assert store.nearest(unit[7], 1)[0][0] == 7
+
+
+def test_search_maps_rows_to_chunk_ids(tmp_path):
+	store = VectorStore(tmp_path / "vectors", "model")
+	vecs = _vectors(20)
+	store.append(list(range(100, 120)), vecs, [{}] * 20)
+	assert store.search(vecs[4], 1)[0][0] == 104
+	assert VectorStore(tmp_path / "empty", "model").search(vecs[0], 3) == []
+
+
+def test_ivf_with_every_list_probed_is_exact(tmp_path):
+	store = VectorStore(tmp_path / "vectors", "model")
+	unit = _fill(store, 400, step=100)
+	ivf = store.ensure_ivf(nlist=8, min_rows=100)
+	assert ivf.nlist == 8 and ivf.count == 400
+	assert sorted(np.asarray(ivf.order).tolist()) == list(range(400))
+	store.append(list(range(400, 410)), _vectors(10, seed=4), [{}] * 10)
+	unit = normalize_rows(np.asarray(store.matrix()))
+	q = unit[405]
+	assert store.search(q, 1, nprobe=1)[0][0] == 405
+	full = [i for i, _ in store.search(q, 10, nprobe=8)]
+	assert full == _exact(unit, q, 10).tolist()
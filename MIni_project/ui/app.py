@@ -1,3 +1,4 @@
+import json
 import os
 import time
 import requests
@@ -27,14 +28,29 @@ with st.sidebar:
 		if not uploaded:
 			st.warning("Upload at least one PDF.")
 		else:
+			jobs = {}
 			for file in uploaded:
 				files = {"file": (file.name, file.getvalue(), "application/pdf")}
-				with st.spinner(f"Ingesting {file.name} ..."):
-					r = requests.post(f"{BACKEND}/ingest", files=files, timeout=300)
-					if r.ok:
-						st.success(f"{file.name} -> {r.json()}")
-					else:
-						st.error(f"Failed: {r.text}")
+				r = requests.post(f"{BACKEND}/ingest", files=files, timeout=300)
+				if r.ok:
+					jobs[file.name] = r.json()["id"]
+				else:
+					st.error(f"Failed: {r.text}")
+			for name, job_id in jobs.items():
+				status = st.empty()
+				while True:
+					job = requests.get(f"{BACKEND}/ingest/{job_id}", timeout=30).json()
+					if job["status"] == "done":
+						status.success(f"{name} -> {job['result']}")
+						break
+					if job["status"] == "failed":
+						status.error(f"{name} failed: {job['error']}")
+						break
+					status.info(
+						f"{name}: {job['status']} ({job['pages_parsed']} pages parsed, "
+						f"{job['chunks_embedded']}/{job['chunks']} chunks embedded)"
+					)
+					time.sleep(1)
 
 st.subheader("Search Cases")
 query = st.text_input("Your question", placeholder="e.g., Breach damages in contract disputes?")
@@ -44,26 +60,60 @@ with col1:
 with col2:
 	user_id = st.text_input("User ID", value="default_user")
 
+try:
+	pr = requests.get(f"{BACKEND}/partitions", timeout=10)
+	partitions = pr.json() if pr.ok else {}
+except Exception:
+	partitions = {}
+filters = {}
+for fcol, key, label in zip(st.columns(3), ("case_type", "court", "year"), ("Case type", "Court", "Year")):
+	with fcol:
+		choice = st.multiselect(label, sorted(partitions.get(key, {})))
+		if choice:
+			filters[key] = choice
+
 if st.button("Search") and query.strip():
 	if stream:
 		placeholder = st.empty()
+		details = st.empty()
 		accum = ""
+		sources = []
 		try:
-			with requests.get(f"{BACKEND}/query_stream", params={"query": query, "user_id": user_id}, stream=True, timeout=300) as r:
+			params = {"query": query, "user_id": user_id, "format": "ndjson", "filter": [f"{k}:{v}" for k, vs in filters.items() for v in vs]}
+			with requests.get(f"{BACKEND}/query_stream", params=params, stream=True, timeout=300) as r:
 				r.raise_for_status()
-				for chunk in r.iter_content(chunk_size=None):
-					if chunk:
-						accum += chunk.decode("utf-8", errors="ignore")
+				for line in r.iter_lines(decode_unicode=True):
+					if not line:
+						continue
+					event = json.loads(line)
+					if event["event"] == "sources":
+						sources = event["sources"]
+						st.session_state["last_response_id"] = event.get("response_id")
+					elif event["event"] == "token":
+						accum += event["text"]
 						placeholder.markdown(accum)
+					elif event["event"] == "error":
+						st.error(event["error"])
+					elif event["event"] == "stats":
+						details.caption(
+							f"First token {event['ttft_ms']} ms · {event['tokens']} tokens "
+							f"({event['tokens_per_second']} tok/s) · {event['cache']}"
+						)
+			if sources:
+				with st.expander(f"Sources ({len(sources)})"):
+					for src in sources:
+						page = src["page"] + 1 if src.get("page") is not None else "?"
+						st.write(f"{os.path.basename(src['source'] or '')}, p. {page} (score {src['score']})")
 			st.session_state["last_answer"] = accum
 		except Exception as e:
 			st.error(str(e))
 	else:
-		r = requests.post(f"{BACKEND}/query", json={"query": query, "user_id": user_id}, timeout=300)
+		r = requests.post(f"{BACKEND}/query", json={"query": query, "user_id": user_id, "filter": filters or None}, timeout=300)
 		if r.ok:
 			data = r.json()
 			st.write(data.get("answer", ""))
 			st.session_state["last_answer"] = data.get("answer", "")
+			st.session_state["last_response_id"] = data.get("response_id")
 		else:
 			st.error(r.text)
 
@@ -73,12 +123,27 @@ if st.button("Submit Rating"):
 	if "last_answer" not in st.session_state:
 		st.warning("Ask a question first.")
 	else:
-		r = requests.post(f"{BACKEND}/feedback", json={"query": query, "rating": rating, "user_id": user_id}, timeout=300)
+		payload = {"query": query, "rating": rating, "user_id": user_id, "response_id": st.session_state.get("last_response_id")}
+		r = requests.post(f"{BACKEND}/feedback", json=payload, timeout=30)
 		if r.ok:
 			data = r.json()
 			if data.get("healed"):
 				st.info("Low rating detected. Healed response:")
-				st.write(data.get("answer", ""))
+				placeholder = st.empty()
+				healed = ""
+				with requests.get(f"{BACKEND}{data['stream']}", params={"format": "ndjson"}, stream=True, timeout=300) as hr:
+					for line in hr.iter_lines(decode_unicode=True):
+						if not line:
+							continue
+						event = json.loads(line)
+						if event["event"] == "token":
+							healed += event["text"]
+							placeholder.markdown(healed)
+						elif event["event"] == "sources":
+							st.session_state["last_response_id"] = event.get("response_id")
+						elif event["event"] == "error":
+							st.error(event["error"])
+				st.session_state["last_answer"] = healed
 			else:
 				st.success("Feedback recorded. Thank you!")
 		else: